@@ -0,0 +1,98 @@
+"""Measure cold-start import time of the app and check it against a budget.
+
+Runs a fresh interpreter with ``-X importtime`` that imports the app and
+computes balances and a settlement on the demo data, then reports the
+cumulative import time of the app module, the slowest top-level imports,
+and whether any of the lazily imported optional libraries were loaded.
+Exits non-zero if the budget is exceeded or a lazy module leaked in.
+
+Run from the repository root:
+
+    python benchmarks/bench_import_time.py [--budget-ms 1200] [--runs 3]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+DEFAULT_BUDGET_MS = 1200
+# Modules the demo-data path must not import
+LAZY_MODULES = ["gspread", "google.oauth2", "google.auth.transport.requests", "plotly.express", "plotly.graph_objects"]
+
+CHECK_LOADED = """
+print("LOADED=" + ",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+# Streamlit's own import already pulls in some of these (its plotly theme
+# loads plotly.graph_objects); only modules beyond that count against the app
+STREAMLIT_ONLY = "import sys\nimport streamlit\n" + CHECK_LOADED
+
+DEMO_PATH = """
+import sys
+import group_expenses_app as app
+from expense_core import calculate_balances, calculate_settlement
+expenses, payments = app.generate_demo_data()
+balances, _, _ = calculate_balances(expenses, payments)
+calculate_settlement(balances)
+""" + CHECK_LOADED
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code.format(lazy=LAZY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    loaded = result.stdout.rsplit("LOADED=", 1)[-1].strip()
+    return result.stderr, {m for m in loaded.split(",") if m}
+
+
+def measure():
+    """One cold run; returns (app cumulative us, direct imports, lazily loaded modules)."""
+    stderr, loaded = run(DEMO_PATH)
+    app_us, children, top_level = None, [], []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        # Children are printed before their parent, so collect depth-1 imports
+        # until the app module's own line closes them off
+        if name == "group_expenses_app":
+            app_us, top_level = cumulative, children
+        elif depth == 1:
+            children = []
+        elif depth == 3:
+            children.append((cumulative, name))
+    return app_us, top_level, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    best_us, top_level, loaded = min(runs, key=lambda r: r[0])
+    best_ms = best_us / 1000
+    loaded = sorted(loaded - run(STREAMLIT_ONLY)[1])
+
+    print(f"group_expenses_app import: {best_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("slowest direct imports:")
+    for cumulative, name in sorted(top_level, reverse=True)[:8]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+    if loaded:
+        print(f"lazy modules imported on the demo path: {', '.join(loaded)}")
+
+    ok = best_ms <= args.budget_ms and not loaded
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Compare greedy and exact settlement by transfer count and runtime.
+
+Above EXACT_SETTLEMENT_MAX_MEMBERS non-zero balances the exact mode only
+pairs off equal and opposite balances before falling back to greedy.
+
+Run from the repository root:
+
+    python benchmarks/bench_settlement.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from expense_core import EXACT_SETTLEMENT_MAX_MEMBERS, calculate_settlement  # noqa: E402
+
+GROUP_SIZES = [5, 11, 16, 20, 24, 100, 1_000, 10_000, 100_000]
+REPEATS = 3
+
+
+def synthetic_balances(n, seed=0):
+    """Balances for n members built from small zero-sum sub-groups, like real trips."""
+    rng = random.Random(seed)
+    cents = [0] * n
+    members = list(range(n))
+    for _ in range(n):
+        group = rng.sample(members, min(n, rng.randint(2, 4)))
+        payer, others = group[0], group[1:]
+        for other in others:
+            amount = rng.randint(1, 500) * 100
+            cents[payer] += amount
+            cents[other] -= amount
+    return {f"Member {i}": {"balance": c / 100} for i, c in enumerate(cents)}
+
+
+def timed(fn, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    print(f"exact solver limit: {EXACT_SETTLEMENT_MAX_MEMBERS} non-zero balances")
+    print(f"{'members':>8} {'greedy':>7} {'greedy ms':>10} {'exact':>7} {'exact ms':>10}")
+    for n in GROUP_SIZES:
+        balances = synthetic_balances(n)
+        greedy, greedy_time = timed(calculate_settlement, balances, "greedy")
+        exact, exact_time = timed(calculate_settlement, balances, "exact")
+        print(
+            f"{n:>8} {len(greedy):>7} {greedy_time * 1000:>10.2f} "
+            f"{len(exact):>7} {exact_time * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
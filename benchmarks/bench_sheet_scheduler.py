@@ -0,0 +1,179 @@
+"""Exercise the Sheets request scheduler against the in-process fake API.
+
+Runs offline (see fake_sheets.py) with a scaled-down quota window, and
+reports for each scenario the requests the fake server saw, the 429s and
+5xx errors it returned, and the failures that reached the app:
+
+- burst: N sessions miss the cache at the same moment; with the
+  scheduler their identical reads share one request, without it every
+  session sends its own
+- sustained: sessions keep reloading for several quota windows with the
+  cache disabled; the scheduler paces them under the quota instead of
+  letting the API return 429s
+- outage: the API fails every request for a while; sessions keep
+  getting the cached frame (marked stale) and pick up new rows once the
+  API answers again
+
+Run from the repository root:
+
+    python benchmarks/bench_sheet_scheduler.py
+    python benchmarks/bench_sheet_scheduler.py --sessions 50 --window 2 --quota 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import group_expenses_app as app  # noqa: E402
+from fake_sheets import FakeSheetsServer  # noqa: E402
+from bench_suite import synthetic_ledger  # noqa: E402
+
+
+def sheet_tabs(n_rows):
+    expenses, payments = synthetic_ledger(n_rows)
+    return {
+        "Expenses": [list(expenses.columns)] + expenses.values.tolist(),
+        "Payments": [list(payments.columns)] + payments.values.tolist(),
+    }
+
+
+class Session:
+    """What one Streamlit session does on a rerun: read both tabs through the shared cache."""
+
+    def __init__(self, pool, cache, handles):
+        self.pool = pool
+        self.cache = cache
+        self.handles = handles
+
+    def load(self):
+        sheet = self.pool.spreadsheet()
+        return [
+            self.cache.get(title, lambda previous, title=title: app._load_typed_worksheet(
+                self.handles.get(sheet, title), previous, app.MEMBERS))
+            for title in ("Expenses", "Payments")
+        ]
+
+
+def shared_state(server, spreadsheet, args, ttl):
+    scheduler = app.SheetRequestScheduler(
+        read_quota=args.quota, write_quota=args.quota, window=args.window,
+        max_wait=args.window * 2, backoff_base=args.window / 20, backoff_max=args.window,
+    )
+    pool = app.SheetClientPool(spreadsheet.id, {}, connect=lambda: (None, spreadsheet), scheduler=scheduler,
+                               probe_interval=float("inf"))
+    return scheduler, pool, app.WorksheetCache(ttl=ttl, stale_retry=args.window / 4), app.WorksheetHandles()
+
+
+def run_threads(count, target):
+    """Run `target(i)` on `count` threads started together; return (seconds, errors)."""
+    errors = []
+    barrier = threading.Barrier(count)
+
+    def worker(i):
+        barrier.wait()
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+
+def report(name, seconds, errors, server, scheduler=None):
+    served = server.stats()
+    line = (f"  {name:<22} {seconds * 1000:>8.0f} ms  reads={served['reads']:<4} "
+            f"429s={served['rejected_429']:<4} 5xx={served['errors_5xx']:<4} app errors={len(errors)}")
+    if scheduler is not None:
+        stats = scheduler.stats()
+        line += f"  coalesced={stats['coalesced']} retries={stats['retries']} throttled={stats['throttled']}"
+    print(line)
+
+
+def burst(args):
+    print(f"burst: {args.sessions} sessions, cold cache")
+    server = FakeSheetsServer(read_quota=args.quota, window=args.window, latency=args.latency)
+    spreadsheet = server.create("burst", sheet_tabs(args.rows))
+    worksheets = spreadsheet.worksheets()
+    server.requests["read"] = 0
+    seconds, errors = run_threads(args.sessions, lambda i: [
+        app._load_typed_worksheet(worksheet, None, app.MEMBERS) for worksheet in worksheets])
+    report("unscheduled", seconds, errors, server)
+
+    server = FakeSheetsServer(read_quota=args.quota, window=args.window, latency=args.latency)
+    spreadsheet = server.create("burst", sheet_tabs(args.rows))
+    scheduler, pool, cache, handles = shared_state(server, spreadsheet, args, ttl=60)
+    pool.spreadsheet()
+    seconds, errors = run_threads(args.sessions, lambda i: Session(pool, cache, handles).load())
+    report("scheduled", seconds, errors, server, scheduler)
+
+
+def sustained(args):
+    rounds = args.windows * 4
+    print(f"sustained: {args.sessions} sessions, {rounds} reloads each over {args.windows} windows")
+    server = FakeSheetsServer(read_quota=args.quota, window=args.window, latency=args.latency)
+    spreadsheet = server.create("sustained", sheet_tabs(args.rows))
+    scheduler, pool, cache, handles = shared_state(server, spreadsheet, args, ttl=0)
+
+    def session(i):
+        for _ in range(rounds):
+            Session(pool, cache, handles).load()
+            time.sleep(args.window / 4)
+
+    seconds, errors = run_threads(args.sessions, session)
+    report("scheduled", seconds, errors, server, scheduler)
+
+
+def outage(args):
+    print(f"outage: API down for {args.window:g} s, {args.sessions} sessions polling")
+    server = FakeSheetsServer(read_quota=args.quota * 10, window=args.window, latency=args.latency)
+    spreadsheet = server.create("outage", sheet_tabs(args.rows))
+    scheduler, pool, cache, handles = shared_state(server, spreadsheet, args, ttl=args.window / 8)
+    before = len(Session(pool, cache, handles).load()[0])
+    sheet_rows = spreadsheet.worksheet("Expenses").rows
+
+    server.error_rate = 1.0
+    sheet_rows.append(["2024-12-31", "Late", app.MEMBERS[0], "1", "10", "10", ""])
+    down_until = time.monotonic() + args.window
+    stale_reads = []
+
+    def session(i):
+        while time.monotonic() < down_until + args.window:
+            if time.monotonic() >= down_until:
+                server.error_rate = 0.0
+            Session(pool, cache, handles).load()
+            stale_reads.append(cache.staleness("Expenses") is not None)
+            time.sleep(args.window / 8)
+
+    seconds, errors = run_threads(args.sessions, session)
+    report("scheduled", seconds, errors, server, scheduler)
+    after = len(Session(pool, cache, handles).load()[0])
+    print(f"  {'stale frames served':<22} {sum(stale_reads)} of {len(stale_reads)} reads; "
+          f"rows {before} -> {after} after recovery")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sheets scheduler scenarios against the fake API.")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--rows", type=int, default=2000, help="expense rows in the fake sheet")
+    parser.add_argument("--quota", type=int, default=20, help="read requests per window")
+    parser.add_argument("--window", type=float, default=1.0, help="quota window in seconds (60 on the real API)")
+    parser.add_argument("--windows", type=int, default=3, help="windows the sustained scenario runs for")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake API request")
+    args = parser.parse_args()
+
+    burst(args)
+    sustained(args)
+    outage(args)
+
+
+if __name__ == "__main__":
+    main()
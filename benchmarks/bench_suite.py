@@ -0,0 +1,204 @@
+"""Benchmark the calculation and rendering hot paths on synthetic ledgers.
+
+Times, for ledgers of 10^2 to 10^7 expense rows (plus a quarter as many
+payments):
+
+- calculate_balances (also on typed frames, with and without a Split
+  column, so split-aware balances can be compared with equal splits)
+- calculate_settlement (greedy and exact)
+- build_balance_table_html
+- create_spending_chart / create_balance_chart
+- DataFrame loading from a get_all_records-style payload (pd.DataFrame
+  over the records, the app's own numericising row loader, and the
+  typed_frame conversion, with its memory per row before and after)
+
+Results are written as JSON and can be compared against a stored
+baseline; a timing more than --threshold times its baseline counts as a
+regression and makes the run exit non-zero.
+
+Run from the repository root:
+
+    python benchmarks/bench_suite.py --max-rows 1000000 --save-baseline
+    python benchmarks/bench_suite.py --max-rows 1000000 --compare
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import expense_core as core  # noqa: E402
+import group_expenses_app as app  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+SIZES = [10 ** k for k in range(2, 8)]
+PAYLOAD_MAX_ROWS = 10 ** 6  # a list of dicts per row gets very large beyond this
+DEFAULT_THRESHOLD = 1.25
+
+
+def synthetic_ledger(n_rows, members=app.MEMBERS, seed=0):
+    """Expenses and payments frames in the worksheet schema."""
+    rng = np.random.default_rng(seed)
+    roster = np.array(members, dtype=object)
+    days = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), unit="D")
+    quantity = rng.integers(1, 20, n_rows).astype(np.float64)
+    unit_price = rng.integers(100, 50_000, n_rows) / 100
+    expenses = pd.DataFrame({
+        "Date": days.strftime("%Y-%m-%d"),
+        "Item": rng.choice(np.array(["Food", "Transportation", "Equipment", "Supplies"], dtype=object), n_rows),
+        "Buyer": roster[rng.integers(0, len(members), n_rows)],
+        "Quantity": quantity,
+        "Unit Price": unit_price,
+        "Amount": np.round(quantity * unit_price, 2),
+        "Notes": "",
+    })
+    n_payments = max(n_rows // 4, 1)
+    payments = pd.DataFrame({
+        "Date": days[:n_payments].strftime("%Y-%m-%d"),
+        "From": roster[rng.integers(0, len(members), n_payments)],
+        "To": roster[rng.integers(0, len(members), n_payments)],
+        "Amount": rng.integers(100, 100_000, n_payments) / 100,
+        "Notes": "",
+    })
+    return expenses, payments
+
+
+def with_splits(expenses, members=app.MEMBERS, seed=0):
+    """`expenses` with a Split column: half shared by everyone, half by one of a few subsets."""
+    rng = np.random.default_rng(seed)
+    patterns = np.array([
+        "",
+        f"{members[0]}; {members[1]}",
+        f"{members[0]}: 2; {members[2]}: 1; {members[3]}: 1",
+        "; ".join(members[:len(members) // 2]),
+    ], dtype=object)
+    choice = np.where(rng.random(len(expenses)) < 0.5, 0, rng.integers(1, len(patterns), len(expenses)))
+    return expenses.assign(Split=pd.Categorical(patterns[choice]))
+
+
+def recorded_payload(expenses):
+    """What get_all_records returns for the Expenses tab: one dict per row."""
+    return expenses.to_dict("records")
+
+
+def timed(fn, repeats):
+    """Best wall-clock time of `repeats` calls."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_suite(sizes, repeats):
+    results = {}
+
+    def record(name, n, seconds):
+        results.setdefault(name, {})[str(n)] = seconds
+        print(f"  {name:<28} {seconds * 1000:>12.3f} ms")
+
+    # Frames are del'd before the next size to free memory, so the timed
+    # lambdas take them as default arguments rather than closing over them
+    for n in sizes:
+        print(f"{n:,} rows")
+        expenses, payments = synthetic_ledger(n)
+        reps = repeats if n <= 10 ** 6 else 1
+
+        record("calculate_balances", n, timed(lambda e=expenses, p=payments: core.calculate_balances(e, p), reps))
+        typed_expenses = app.typed_frame(expenses)
+        split_expenses = with_splits(typed_expenses)
+        record("calculate_balances_typed", n, timed(lambda e=typed_expenses, p=payments: core.calculate_balances(e, p), reps))
+        record("calculate_balances_split", n, timed(lambda e=split_expenses, p=payments: core.calculate_balances(e, p), reps))
+        del typed_expenses, split_expenses
+        balances, _, _ = core.calculate_balances(expenses, payments)
+        record("calculate_settlement_greedy", n, timed(lambda: core.calculate_settlement(balances, "greedy"), reps))
+        record("calculate_settlement_exact", n, timed(lambda: core.calculate_settlement(balances, "exact"), reps))
+        record("build_balance_table_html", n, timed(lambda: app.build_balance_table_html(balances, app.MEMBERS), reps))
+        if app.PLOTLY_AVAILABLE:
+            record("create_spending_chart", n, timed(lambda: app.create_spending_chart(balances), reps))
+            record("create_balance_chart", n, timed(lambda: app.create_balance_chart(balances), reps))
+
+        if n <= PAYLOAD_MAX_ROWS:
+            records = recorded_payload(expenses)
+            header = list(records[0]) if records else app.EXPENSE_COLUMNS
+            raw_rows = expenses.astype(str).values.tolist()
+            record("load_records_dataframe", n, timed(lambda r=records: pd.DataFrame(r), reps))
+            if app.GSPREAD_AVAILABLE:
+                record("load_numericised_rows", n, timed(lambda r=raw_rows: app._records_frame(header, r), reps))
+                raw = app._records_frame(header, raw_rows)
+                record("load_typed_frame", n, timed(lambda r=raw: app.typed_frame(r), reps))
+                typed = app.typed_frame(raw)
+                print(f"  {'bytes per row (raw -> typed)':<28} {app.frame_memory(raw) / n:>9.0f} -> {app.frame_memory(typed) / n:.0f}")
+                del raw, typed
+            del records, raw_rows
+        del expenses, payments
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print current/baseline ratios; return the list of regressions."""
+    regressions = []
+    print(f"\ncompared with baseline (regression above {threshold:.2f}x):")
+    for name, by_size in results.items():
+        for n, seconds in by_size.items():
+            before = baseline.get("results", {}).get(name, {}).get(n)
+            if not before:
+                continue
+            ratio = seconds / before
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"  {name:<28} {int(n):>10,} {ratio:>7.2f}x{flag}")
+            if flag:
+                regressions.append((name, n, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-rows", type=int, default=SIZES[-1])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    sizes = [n for n in SIZES if n <= args.max_rows]
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "sizes": sizes,
+        },
+        "results": run_suite(sizes, args.repeats),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report["results"], baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Headless balances and settlement plan for large expense exports.
+
+Streams the expense and payment files in chunks, so memory stays flat no
+matter how many rows they hold. Does not import Streamlit.
+
+    python expense_cli.py expenses.csv --payments payments.csv
+    python expense_cli.py expenses.parquet --members-file roster.txt --json
+"""
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from expense_core import CURRENCY, MEMBERS, SETTLEMENT_MODE, SPLIT_COLUMN, StreamingTotals
+
+DEFAULT_CHUNKSIZE = 200_000  # rows per chunk read from disk
+
+
+def iter_chunks(path, columns, chunksize=DEFAULT_CHUNKSIZE, optional=()):
+    """Yield DataFrames of at most `chunksize` rows from a CSV or Parquet file.
+
+    `optional` columns are read too when the file has them.
+    """
+    if path.lower().endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet files requires pyarrow (pip install pyarrow)")
+        parquet = pq.ParquetFile(path)
+        columns = columns + [c for c in optional if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        columns = columns + [c for c in optional if c in header]
+        names = {column: str for column in columns if column != "Amount"}
+        yield from pd.read_csv(path, usecols=columns, dtype=names, chunksize=chunksize)
+
+
+def read_roster(args):
+    """Roster from --members / --members-file, the app's MEMBERS by default.
+
+    Returns None with --discover-members, to take the roster from the data.
+    """
+    if args.discover_members:
+        return None
+    if args.members is not None:
+        roster = [m.strip() for m in args.members.split(",") if m.strip()]
+        source = "--members"
+    elif args.members_file:
+        with open(args.members_file, encoding="utf-8") as f:
+            roster = [line.strip() for line in f if line.strip()]
+        source = args.members_file
+    else:
+        return list(MEMBERS)
+    if not roster:
+        raise SystemExit(f"The roster from {source} is empty; list at least one member")
+    return roster
+
+
+def accumulate(args):
+    """Stream every input file into a StreamingTotals."""
+    totals = StreamingTotals(read_roster(args))
+    for path in args.expenses:
+        for chunk in iter_chunks(path, ["Buyer", "Amount"], args.chunksize, optional=[SPLIT_COLUMN]):
+            totals.add_expenses(chunk)
+            progress(args, totals)
+    for path in args.payments:
+        for chunk in iter_chunks(path, ["From", "To", "Amount"], args.chunksize):
+            totals.add_payments(chunk)
+            progress(args, totals)
+    return totals
+
+
+def progress(args, totals):
+    if not args.quiet:
+        print(f"\r{totals.expense_rows:,} expenses, {totals.payment_rows:,} payments read",
+              end="", file=sys.stderr, flush=True)
+
+
+def balances_frame(balances):
+    return pd.DataFrame(
+        [(m, d["spent"], d["share"], d["balance"]) for m, d in balances.items()],
+        columns=["Member", "Spent", "Share", "Balance"],
+    )
+
+
+def settlement_frame(plan):
+    return pd.DataFrame(
+        [(t["from"], t["to"], t["amount"]) for t in plan],
+        columns=["From", "To", "Amount"],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute balances and a settlement plan from expense exports.")
+    parser.add_argument("expenses", nargs="+", help="expense files (CSV or Parquet) with Buyer and Amount (and optionally Split) columns")
+    parser.add_argument("--payments", nargs="*", default=[], help="payment files with From, To and Amount columns")
+    roster = parser.add_mutually_exclusive_group()
+    roster.add_argument("--members", help="comma-separated roster (default: the app's members)")
+    roster.add_argument("--members-file", help="file with one member per line")
+    roster.add_argument("--discover-members", action="store_true",
+                        help="take the roster from everyone named in the data")
+    parser.add_argument("--mode", choices=["exact", "greedy"], default=SETTLEMENT_MODE, help="settlement algorithm")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows read per chunk")
+    parser.add_argument("--balances-out", help="write the balance table to this CSV file")
+    parser.add_argument("--settlement-out", help="write the settlement plan to this CSV file")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--quiet", action="store_true", help="no progress output on stderr")
+    args = parser.parse_args(argv)
+
+    totals = accumulate(args)
+    if not args.quiet:
+        print(file=sys.stderr)
+    balances, total_expenses, per_person_share = totals.balances()
+    plan = totals.settlement(args.mode)
+    unparsed = totals.unparsed_splits()
+    if unparsed:
+        print(f"Warning: {len(unparsed)} Split value(s) do not parse and were shared equally by everyone: "
+              + "; ".join(f'"{text}"' for text in unparsed[:5]), file=sys.stderr)
+
+    balance_table = balances_frame(balances)
+    settlement_table = settlement_frame(plan)
+    if args.balances_out:
+        balance_table.to_csv(args.balances_out, index=False)
+    if args.settlement_out:
+        settlement_table.to_csv(args.settlement_out, index=False)
+
+    if args.json:
+        json.dump({
+            "currency": CURRENCY,
+            "expense_rows": totals.expense_rows,
+            "payment_rows": totals.payment_rows,
+            "total_expenses": total_expenses,
+            "per_person_share": per_person_share,
+            "balances": balances,
+            "settlement": plan,
+            "unparsed_splits": unparsed,
+        }, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"Total expenses: {total_expenses:,.2f} {CURRENCY} "
+              f"({len(balances)} members, {per_person_share:,.2f} {CURRENCY} each)\n")
+        print(balance_table.to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+        print()
+        if plan:
+            for t in plan:
+                print(f"{t['from']} -> {t['to']}: {t['amount']:,.2f} {CURRENCY}")
+        else:
+            print("Everyone is settled up.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1682 @@
+"""Balance, settlement and ledger calculations shared by the app and the CLI.
+
+Depends only on numpy and pandas, so it can be imported without Streamlit.
+"""
+import heapq
+import importlib.util
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# ============================================================================
+# CONFIGURATION CONSTANTS
+# ============================================================================
+MEMBERS = [
+    "Fares Samer",
+    "Mohamed Tarek",
+    "Yassin Sherif",
+    "Youssef Ossama",
+    "Yousef Ibrahim",
+    "Mahmoud Sayed",
+    "Abdalrahman Ahmad",
+    "Mostafa Khaled",
+    "Mohamed Walid",
+    "Beshoy Fayez",
+    "Mohamed Hamada"
+]
+
+CURRENCY = "EGP"
+
+EXPENSE_COLUMNS = ["Date", "Item", "Buyer", "Quantity", "Unit Price", "Amount", "Notes", "Split"]
+PAYMENT_COLUMNS = ["Date", "From", "To", "Amount", "Notes"]
+
+SETTLEMENT_MODE = "exact"  # "exact" (minimum transfers, falls back to greedy) or "greedy"
+EXACT_SETTLEMENT_MAX_MEMBERS = 20  # non-zero balances the exact solver will take on
+EXACT_SETTLEMENT_TIME_BUDGET = 0.5  # seconds before the exact solver gives up
+
+# pyarrow is only needed for ledger snapshots and openpyxl for Excel exports;
+# each is imported when first used
+SNAPSHOTS_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+EXCEL_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+SNAPSHOT_FORMAT = "expense-snapshot/1"
+
+# ============================================================================
+# CALCULATION FUNCTIONS
+# ============================================================================
+def member_codes(names, members=None):
+    """Map a column of member names to integer indices (-1 for unknown names)."""
+    if members is None:
+        members = MEMBERS
+    # Typed frames' categoricals start with the roster, so their codes already are member codes
+    if isinstance(getattr(names, "dtype", None), pd.CategoricalDtype):
+        categories = names.cat.categories
+        if len(categories) >= len(members) and list(categories[:len(members)]) == list(members):
+            codes = names.cat.codes.to_numpy(dtype=np.int64)
+            codes[codes >= len(members)] = -1
+            return codes
+    return pd.Categorical(names, categories=members).codes.astype(np.int64)
+
+def _amount_array(amounts):
+    """Convert an Amount column to a float array, raising ValueError on missing or unparseable cells."""
+    values = pd.to_numeric(amounts, errors="coerce").to_numpy(dtype=np.float64)
+    bad = np.flatnonzero(~np.isfinite(values))
+    if len(bad):
+        cells = ", ".join(repr(amounts.iloc[i]) for i in bad[:5])
+        raise ValueError(f"{len(bad)} invalid Amount value(s), e.g. {cells}")
+    return values
+
+def balance_arrays(expenses_df, payments_df, members=None, splits=None):
+    """Per-member spent totals and payment adjustments, and per-pattern split totals, as float arrays.
+    
+    The split totals are indexed by `splits` codes (a SplitTable for
+    `members`); expenses split equally across the roster are not in them.
+    """
+    if members is None:
+        members = MEMBERS
+    if splits is None:
+        splits = SplitTable(members)
+    n = len(members)
+    spent = np.zeros(n)
+    adjustments = np.zeros(n)
+    split_totals = np.zeros(len(splits))
+    
+    # Total spent by each person: one bincount over buyer indices
+    if not expenses_df.empty:
+        buyers = member_codes(expenses_df["Buyer"], members)
+        amounts = _amount_array(expenses_df["Amount"])
+        known = buyers >= 0
+        spent = np.bincount(buyers[known], weights=amounts[known], minlength=n)
+        if SPLIT_COLUMN in expenses_df.columns:
+            split_totals = splits.totals(splits.codes(expenses_df[SPLIT_COLUMN])[known], amounts[known])
+    
+    # Payments raise the payer's balance and lower the recipient's
+    if not payments_df.empty:
+        payers = member_codes(payments_df["From"], members)
+        payees = member_codes(payments_df["To"], members)
+        amounts = _amount_array(payments_df["Amount"])
+        known = (payers >= 0) & (payees >= 0)
+        adjustments = (
+            np.bincount(payers[known], weights=amounts[known], minlength=n)
+            - np.bincount(payees[known], weights=amounts[known], minlength=n)
+        )
+    
+    return spent, adjustments, split_totals
+
+def balances_from_arrays(members, spent, adjustments, owed=None):
+    """Build the (balances, total_expenses, per_person_share) result from arrays.
+    
+    `owed` holds each member's share of the split expenses; the rest of
+    the total is shared equally. per_person_share is the average share.
+    """
+    total_expenses = float(spent.sum())
+    per_person_share = total_expenses / len(members)
+    if owed is None:
+        share = np.full(len(members), per_person_share)
+    else:
+        share = (total_expenses - owed.sum()) / len(members) + owed
+    balance = spent - share + adjustments
+    balances = {
+        member: {"spent": float(spent[i]), "share": float(share[i]), "balance": float(balance[i])}
+        for i, member in enumerate(members)
+    }
+    return balances, total_expenses, per_person_share
+
+def calculate_balances(expenses_df, payments_df, members=None):
+    """Calculate per-person balances in a single vectorized pass.
+    
+    Expenses with a Split are shared by their participants only; their
+    shares are one sparse matrix-vector product (see SplitTable).
+    """
+    if members is None:
+        members = MEMBERS
+    splits = SplitTable(members)
+    spent, adjustments, split_totals = balance_arrays(expenses_df, payments_df, members, splits)
+    return balances_from_arrays(members, spent, adjustments, splits.shares(split_totals))
+
+def _normalise_cents(cents):
+    """Non-negligible balances in integer cents, nudged so they sum to zero."""
+    # Ignore sub-cent drift, as the 0.01 tolerance always did
+    cents = {m: int(c) for m, c in cents.items() if abs(c) > 1}
+    residual = sum(cents.values())
+    if residual and cents:
+        largest = max(cents, key=lambda m: abs(cents[m]))
+        cents[largest] -= residual
+    return {m: c for m, c in cents.items() if c}
+
+def _greedy_transfers(cents):
+    """Repeatedly pay the largest creditor from the largest debtor (heap-based)."""
+    creditors = [(-c, m) for m, c in cents.items() if c > 0]
+    debtors = [(c, m) for m, c in cents.items() if c < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    
+    settlement_plan = []
+    while creditors and debtors:
+        owed, creditor = heapq.heappop(creditors)
+        owes, debtor = heapq.heappop(debtors)
+        transfer = min(-owed, -owes)
+        settlement_plan.append({"from": debtor, "to": creditor, "amount": transfer / 100})
+        if -owed > transfer:
+            heapq.heappush(creditors, (owed + transfer, creditor))
+        if -owes > transfer:
+            heapq.heappush(debtors, (owes + transfer, debtor))
+    return settlement_plan
+
+def zero_sum_partition(values, max_size=EXACT_SETTLEMENT_MAX_MEMBERS, time_budget=EXACT_SETTLEMENT_TIME_BUDGET):
+    """Split integer `values` (summing to zero) into the most zero-sum groups.
+    
+    A group of k people always settles in k - 1 transfers, so the maximum
+    number of groups gives the minimum number of transfers. Runs a bitmask
+    DP over subsets, one popcount layer at a time with numpy. Returns a
+    list of index lists, or None if the input is larger than `max_size`
+    or the DP runs past `time_budget` seconds.
+    """
+    started = time.perf_counter()
+    n = len(values)
+    if n == 0:
+        return []
+    if n > max_size:
+        return None
+    
+    # Subset sums, built by doubling: sums[mask | bit i] = sums[mask] + values[i]
+    sums = np.zeros(1 << n, dtype=np.int64)
+    for i, v in enumerate(values):
+        sums[1 << i: 1 << (i + 1)] = sums[: 1 << i] + v
+    zero = (sums == 0).astype(np.int16)
+    
+    masks = np.arange(1 << n, dtype=np.int64)
+    popcount = np.zeros(1 << n, dtype=np.int8)
+    for i in range(n):
+        popcount += ((masks >> i) & 1).astype(np.int8)
+    
+    # groups[mask] = most zero-sum groups a subset order through `mask` can close
+    groups = np.zeros(1 << n, dtype=np.int16)
+    for k in range(1, n + 1):
+        layer = masks[popcount == k]
+        best = np.zeros(len(layer), dtype=np.int16)
+        for i in range(n):
+            bit = 1 << i
+            has = (layer & bit) != 0
+            best[has] = np.maximum(best[has], groups[layer[has] ^ bit])
+        groups[layer] = best + zero[layer]
+        if time.perf_counter() - started > time_budget:
+            return None
+    
+    # Walk back from the full set; each zero-sum mask on the path closes a group
+    partition, current = [], []
+    mask = (1 << n) - 1
+    while mask:
+        target = groups[mask] - zero[mask]
+        for i in range(n):
+            bit = 1 << i
+            if mask & bit and groups[mask ^ bit] == target:
+                current.append(i)
+                mask ^= bit
+                break
+        if zero[mask] or not mask:
+            partition.append(current)
+            current = []
+    return partition
+
+def calculate_settlement(balances, mode=None):
+    """Calculate settlement transfers.
+    
+    `mode="greedy"` pairs the largest debtor with the largest creditor off
+    two heaps (O(n log n)). `mode="exact"` finds the minimum number of
+    transfers by splitting the group into zero-sum subsets, falling back to
+    greedy when the group is too large or the solver runs out of time.
+    """
+    return settle_cents({m: round(data["balance"] * 100) for m, data in balances.items()}, mode)
+
+def settle_cents(cents, mode=None):
+    """Settlement plan for `{member: balance in integer cents}`.
+    
+    Balances of a cent or less are dropped and any rounding residual is
+    moved onto the largest balance, so every caller settles the same way.
+    """
+    mode = mode or SETTLEMENT_MODE
+    cents = _normalise_cents(cents)
+    if mode != "exact":
+        return _greedy_transfers(cents)
+    
+    # An exact x / -x pair is always its own group in some optimal plan
+    settlement_plan = []
+    by_amount = {}
+    for member, c in cents.items():
+        by_amount.setdefault(c, []).append(member)
+    for c in [c for c in by_amount if c > 0]:
+        while by_amount[c] and by_amount.get(-c):
+            creditor, debtor = by_amount[c].pop(), by_amount[-c].pop()
+            settlement_plan.append({"from": debtor, "to": creditor, "amount": c / 100})
+    remaining = {m: c for c, members in by_amount.items() for m in members}
+    
+    members = list(remaining)
+    partition = zero_sum_partition([remaining[m] for m in members])
+    if partition is None:
+        return settlement_plan + _greedy_transfers(remaining)
+    for group in partition:
+        settlement_plan.extend(_greedy_transfers({members[i]: remaining[members[i]] for i in group}))
+    return settlement_plan
+
+# ============================================================================
+# EXPENSE SPLITS
+# ============================================================================
+# The optional Split column of an expense says who shares it. Empty means
+# the whole roster in equal parts (as for every expense before the column
+# existed); otherwise it lists the participants, each with an optional
+# weight:
+#   "Fares Samer; Mohamed Tarek"        half each
+#   "Fares Samer: 2; Mohamed Tarek: 1"  two thirds and one third
+SPLIT_COLUMN = "Split"
+SPLIT_SEPARATOR = ";"
+SPLIT_WEIGHT_SEPARATOR = ":"
+
+def parse_split(text, members=None):
+    """Parse Split text into ((member index, weight), ...) in roster order.
+    
+    Returns None for an equal split across the whole roster: empty text,
+    or every member listed with the same weight. Raises ValueError for
+    names outside the roster, repeated names and non-positive weights.
+    """
+    if members is None:
+        members = MEMBERS
+    if text is None or pd.isna(text):
+        return None
+    index = {member: i for i, member in enumerate(members)}
+    weights = {}
+    for part in str(text).split(SPLIT_SEPARATOR):
+        name, _, weight = part.partition(SPLIT_WEIGHT_SEPARATOR)
+        name, weight = name.strip(), weight.strip()
+        if not name and not weight:
+            continue
+        if name not in index:
+            raise ValueError(f"{name or 'A blank name'} is not a group member")
+        if index[name] in weights:
+            raise ValueError(f"{name} is listed twice")
+        try:
+            value = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"The weight for {name} is not a number")
+        if not 0 < value < np.inf:
+            raise ValueError(f"The weight for {name} must be positive")
+        weights[index[name]] = value
+    if not weights or (len(weights) == len(members) and len(set(weights.values())) == 1):
+        return None
+    return tuple(sorted(weights.items()))
+
+def _fails_to_parse(text, members):
+    try:
+        parse_split(text, members)
+    except ValueError:
+        return True
+    return False
+
+def split_text(split, members=None):
+    """Canonical Split text for a parse_split() result ("" for an equal split)."""
+    if split is None:
+        return ""
+    if members is None:
+        members = MEMBERS
+    separator = f"{SPLIT_SEPARATOR} "
+    if len({weight for _, weight in split}) == 1:
+        return separator.join(members[i] for i, _ in split)
+    return separator.join(f"{members[i]}{SPLIT_WEIGHT_SEPARATOR} {weight:g}" for i, weight in split)
+
+def format_split(participants, weights=None, members=None):
+    """Canonical Split text for participant names and optional weights; validated like parse_split."""
+    if weights is None:
+        weights = [1.0] * len(participants)
+    if len(weights) != len(participants):
+        raise ValueError(f"Give one weight per participant ({len(participants)}), got {len(weights)}")
+    text = SPLIT_SEPARATOR.join(f"{name}{SPLIT_WEIGHT_SEPARATOR}{weight}" for name, weight in zip(participants, weights))
+    return split_text(parse_split(text, members), members)
+
+def split_names(text):
+    """Participant names in Split text, without checking them against a roster."""
+    if text is None or pd.isna(text):
+        return []
+    names = (part.partition(SPLIT_WEIGHT_SEPARATOR)[0].strip() for part in str(text).split(SPLIT_SEPARATOR))
+    return [name for name in names if name]
+
+def _padded(values, size):
+    """`values` extended with zeros along its last axis to `size` entries."""
+    missing = size - values.shape[-1]
+    if missing <= 0:
+        return values
+    return np.concatenate([values, np.zeros(values.shape[:-1] + (missing,), dtype=values.dtype)], axis=-1)
+
+class SplitTable:
+    """The distinct Split patterns of a roster, as a sparse pattern x member share matrix.
+    
+    Every pattern gets a code and a CSR row holding its participants with
+    their cumulative weight fractions. Code -1 is the equal split across
+    the roster, which is not stored. Expenses are reduced to one total per
+    code with a bincount, so per-member shares of a whole ledger are one
+    sparse matrix-vector product over the patterns, however many rows there
+    are. Codes are only ever appended, so totals collected earlier stay
+    valid as new patterns turn up.
+    """
+    
+    def __init__(self, members=None):
+        self.members = list(members if members is not None else MEMBERS)
+        self.texts = []  # canonical Split text per code
+        self._codes = {"": -1}  # Split text as seen, and canonical text -> code
+        self._lock = threading.Lock()  # tables are shared along with the ledgers that own them
+        self._entries = np.empty(0, dtype=np.int64)  # code of each stored entry (CSR rows, expanded)
+        self._indices = np.empty(0, dtype=np.int64)  # member of each stored entry
+        self._lower = np.empty(0)  # participants' cumulative weight fraction before / through each entry
+        self._upper = np.empty(0)
+    
+    def __len__(self):
+        return len(self.texts)
+    
+    def code(self, text):
+        """Code of one Split cell; text that does not parse counts as an equal split (see unparsed)."""
+        text = "" if text is None or pd.isna(text) else str(text)
+        with self._lock:
+            code = self._codes.get(text)
+            if code is None:
+                code = self._codes[text] = self._add(text)
+            return code
+    
+    def _add(self, text):
+        try:
+            split = parse_split(text, self.members)
+        except ValueError:
+            return -1
+        canonical = split_text(split, self.members)
+        if canonical in self._codes:
+            return self._codes[canonical]
+        code = len(self.texts)
+        indices, weights = zip(*split)
+        upper = np.cumsum(weights) / sum(weights)
+        upper[-1] = 1.0  # so the last participant's share closes the total exactly
+        self._entries = np.concatenate([self._entries, np.full(len(indices), code, dtype=np.int64)])
+        self._indices = np.concatenate([self._indices, np.array(indices, dtype=np.int64)])
+        self._lower = np.concatenate([self._lower, np.concatenate([[0.0], upper[:-1]])])
+        self._upper = np.concatenate([self._upper, upper])
+        self.texts.append(canonical)
+        self._codes[canonical] = code
+        return code
+    
+    def codes(self, splits):
+        """Codes of a column of Split cells; each distinct text is parsed once."""
+        values, uniques = pd.factorize(pd.Series(splits, copy=False))
+        lookup = np.array([self.code(text) for text in uniques] + [-1], dtype=np.int64)
+        return lookup[values]  # factorize's -1 (missing) picks the trailing equal-split slot
+    
+    def unparsed(self, splits):
+        """Mask of the Split cells in a column that are not blank but do not parse.
+        
+        Their expenses are shared equally across the roster, so callers
+        should point them out rather than let money move unnoticed.
+        """
+        values, uniques = pd.factorize(pd.Series(splits, copy=False))
+        lookup = np.array([_fails_to_parse(text, self.members) for text in uniques] + [False])
+        return lookup[values]
+    
+    def text(self, codes):
+        """Split text of each code ("" for -1)."""
+        with self._lock:
+            texts = np.array(self.texts + [""], dtype=object)
+        return texts[np.asarray(codes)]
+    
+    def totals(self, codes, amounts):
+        """Sum of `amounts` per code; rows split equally across the roster are left out."""
+        custom = codes >= 0
+        return np.bincount(codes[custom], weights=np.asarray(amounts, dtype=np.float64)[custom], minlength=len(self))
+    
+    def _matrix(self):
+        with self._lock:
+            return len(self.texts), self._entries, self._indices, self._lower, self._upper
+    
+    def shares(self, totals):
+        """Per-member float shares of per-code totals (the matrix-vector product)."""
+        k, entries, indices, lower, upper = self._matrix()
+        totals = _padded(np.asarray(totals, dtype=np.float64), k)
+        return np.bincount(indices, weights=totals[entries] * (upper - lower), minlength=len(self.members))
+    
+    def owed(self, totals):
+        """Per-member integer cents of per-code cent totals.
+        
+        A participant's share is the difference of the rounded cumulative
+        amounts before and through them, so every pattern's shares add up
+        to its total exactly. `totals` may also be 2-D, one row of code
+        totals per date, giving one row of shares per date.
+        """
+        k, entries, indices, lower, upper = self._matrix()
+        totals = _padded(np.asarray(totals, dtype=np.int64), k)
+        amounts = totals[..., entries].astype(np.float64)
+        cents = (np.rint(amounts * upper) - np.rint(amounts * lower)).astype(np.int64)
+        if totals.ndim == 1:
+            return np.bincount(indices, weights=cents, minlength=len(self.members)).astype(np.int64)
+        owed = np.zeros(totals.shape[:-1] + (len(self.members),), dtype=np.int64)
+        np.add.at(owed, (slice(None), indices), cents)
+        return owed
+
+# ============================================================================
+# INCREMENTAL LEDGER
+# ============================================================================
+def to_cents(amounts):
+    """Float amounts (scalar or array) to integer cents, rounding half away from zero."""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+def split_shares(total, n):
+    """Split `total` cents into n whole-cent shares that add up exactly."""
+    base, remainder = divmod(int(total), n)
+    shares = np.full(n, base, dtype=np.int64)
+    shares[:remainder] += 1
+    return shares
+
+def share_cents(spent, owed=None):
+    """Each member's share in cents: `owed` from split expenses plus an equal part of the rest."""
+    if owed is None:
+        return split_shares(spent.sum(), len(spent))
+    return split_shares(spent.sum() - owed.sum(), len(spent)) + owed
+
+def balances_from_cents(members, spent, adjustments, owed=None):
+    """Exact (balances, total_expenses, per_person_share) from integer-cent arrays.
+    
+    The equally shared total is split into whole-cent shares, with the
+    leftover cents going to the first members, and `owed` (each member's
+    cents of the split expenses) is added on top, so balances always sum
+    to exactly zero. per_person_share is the average share.
+    """
+    n = len(members)
+    total = int(spent.sum())
+    shares = share_cents(spent, owed)
+    balance = spent - shares + adjustments
+    balances = {
+        member: {"spent": spent[i] / 100, "share": shares[i] / 100, "balance": balance[i] / 100}
+        for i, member in enumerate(members)
+    }
+    return balances, total / 100, total / 100 / n
+
+# Only these columns feed balances, the settlement, the charts, the date index and the recent cards
+FINGERPRINT_EXPENSE_COLUMNS = ["Date", "Item", "Buyer", "Amount", "Split"]
+FINGERPRINT_PAYMENT_COLUMNS = ["Date", "From", "To", "Amount"]
+
+def _mix64(x):
+    """splitmix64 finalizer over a uint64 array (wraps mod 2**64)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _rows_digest(df, columns, start=0):
+    """Order-sensitive hash of `df[columns]`: each row's hash mixed with its position, summed mod 2**64.
+    
+    Rows are numbered from `start`, so the digest of a frame is the digest
+    of its leading rows plus that of the rest.
+    """
+    columns = [c for c in columns if c in df.columns]
+    if df.empty or not columns:
+        return 0
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    positions = np.arange(start, start + len(hashes), dtype=np.uint64)
+    return int(_mix64(hashes ^ _mix64(positions)).sum(dtype=np.uint64))
+
+def frame_fingerprint(df, columns):
+    """Row count plus a rolling hash over the rows' `columns`."""
+    return (len(df), f"{_rows_digest(df, columns):016x}")
+
+def extend_fingerprint(fingerprint, df, columns):
+    """frame_fingerprint of `df`, given the `fingerprint` of its leading rows; only the rest is hashed."""
+    n, digest = fingerprint
+    return (len(df), f"{(int(digest, 16) + _rows_digest(df.iloc[n:], columns, n)) % 2**64:016x}")
+
+def ledger_fingerprint(expenses_df, payments_df):
+    """Cheap content key for everything derived from the two frames."""
+    return (
+        frame_fingerprint(expenses_df, FINGERPRINT_EXPENSE_COLUMNS)
+        + frame_fingerprint(payments_df, FINGERPRINT_PAYMENT_COLUMNS)
+    )
+
+def data_version(source, expenses_df, payments_df):
+    """Version key for a loaded ledger: data source plus the content fingerprint of both frames."""
+    return (source,) + ledger_fingerprint(expenses_df, payments_df)
+
+def extend_version(version, expenses_df, payments_df):
+    """data_version of frames that start with the data `version` was taken of.
+    
+    Only the rows after that data are hashed, so checking a few appended
+    rows costs O(rows appended), not O(ledger).
+    """
+    source, n_expenses, expense_digest, n_payments, payment_digest = version
+    return (
+        (source,)
+        + extend_fingerprint((n_expenses, expense_digest), expenses_df, FINGERPRINT_EXPENSE_COLUMNS)
+        + extend_fingerprint((n_payments, payment_digest), payments_df, FINGERPRINT_PAYMENT_COLUMNS)
+    )
+
+class Ledger:
+    """Running per-member totals (integer cents) that absorb new rows as O(1) deltas.
+    
+    `version` is the data_version of the data the totals were last synced
+    with. Rows applied since then are remembered until a sync sees them:
+    if the loaded frames are exactly that data plus those rows, in order,
+    the deltas are confirmed without a rebuild; any other change (such as
+    a row edited in place) rebuilds from scratch.
+    
+    A CompactLedger of the same rows (for the date index and the recent
+    rows) is built on first request and then kept current by the apply
+    methods, until a rebuild drops it.
+    """
+    
+    def __init__(self, members=None):
+        self.members = list(members if members is not None else MEMBERS)
+        self.index = {member: i for i, member in enumerate(self.members)}
+        self.splits = SplitTable(self.members)
+        self.version = None
+        self.rebuilds = 0
+        self.deltas = 0
+        self._lock = threading.RLock()  # ledgers are shared by every session viewing a group
+        self._reset()
+    
+    def _reset(self):
+        self.spent = np.zeros(len(self.members), dtype=np.int64)
+        self.adjustments = np.zeros(len(self.members), dtype=np.int64)
+        self.split_cents = np.zeros(0, dtype=np.int64)  # per SplitTable code
+        self._pending = ([], [])  # expense and payment rows applied since `version`, as int64 arrays
+        self._compact = None  # CompactLedger of the same rows, built on first request
+    
+    def _load_arrays(self, spent, adjustments, split_totals, version):
+        self.spent, self.adjustments, self.split_cents = to_cents(spent), to_cents(adjustments), to_cents(split_totals)
+        self._pending = ([], [])
+        self._compact = None
+        self.version = version
+        self.rebuilds += 1
+    
+    def _applied(self, kind, rows, version):
+        """Remember delta rows until a sync confirms them, or take `version` as already confirming them."""
+        if version is not None:
+            self.version = version
+            self._pending = ([], [])
+        else:
+            self._pending[kind].append(np.asarray(rows, dtype=np.int64).reshape(-1, 3))
+        self.deltas += len(rows)
+    
+    def _confirm_pending(self, expenses_df, payments_df, version):
+        """True if the frames hold the data of `self.version` plus exactly the rows applied since, in order."""
+        if self.version is None or not (self._pending[0] or self._pending[1]):
+            return False
+        expected = [np.concatenate(rows) if rows else np.empty((0, 3), dtype=np.int64) for rows in self._pending]
+        _, n_expenses, _, n_payments, _ = self.version
+        if len(expenses_df) != n_expenses + len(expected[0]) or len(payments_df) != n_payments + len(expected[1]):
+            return False
+        if extend_version(self.version, expenses_df, payments_df) != version:
+            return False  # the rows that were already there have changed
+        
+        new_expenses, new_payments = expenses_df.iloc[n_expenses:], payments_df.iloc[n_payments:]
+        found_expenses = np.column_stack([
+            member_codes(new_expenses["Buyer"], self.members),
+            to_cents(_amount_array(new_expenses["Amount"])),
+            self.splits.codes(new_expenses[SPLIT_COLUMN]) if SPLIT_COLUMN in new_expenses.columns
+            else np.full(len(new_expenses), -1, dtype=np.int64),
+        ]) if len(new_expenses) else expected[0][:0]
+        found_payments = np.column_stack([
+            member_codes(new_payments["From"], self.members),
+            member_codes(new_payments["To"], self.members),
+            to_cents(_amount_array(new_payments["Amount"])),
+        ]) if len(new_payments) else expected[1][:0]
+        return np.array_equal(found_expenses, expected[0]) and np.array_equal(found_payments, expected[1])
+    
+    def _add_split_cents(self, codes, cents):
+        totals = self.splits.totals(codes, cents).astype(np.int64)  # covers every code so far
+        self.split_cents = _padded(self.split_cents, len(totals)) + totals
+    
+    @property
+    def total(self):
+        return int(self.spent.sum()) / 100
+    
+    def rebuild(self, expenses_df, payments_df, version=None):
+        """Recompute all totals from scratch."""
+        with self._lock:
+            self._load_arrays(*balance_arrays(expenses_df, payments_df, self.members, self.splits), version)
+    
+    def sync(self, expenses_df, payments_df, version, backend=None):
+        """Bring the totals in line with the frames, whose data_version is `version`.
+        
+        Nothing is recomputed if the data is unchanged, or changed only by
+        the rows applied since the last sync. Otherwise the totals are
+        rebuilt; with a backend they come from `backend.balance_arrays` (so
+        SQLite can do the summation) instead of the frames.
+        """
+        with self._lock:
+            if version == self.version and not (self._pending[0] or self._pending[1]):
+                return
+            if self._confirm_pending(expenses_df, payments_df, version):
+                self.version = version
+                self._pending = ([], [])
+                return
+            if backend is None:
+                self.rebuild(expenses_df, payments_df, version)
+            else:
+                self._load_arrays(*backend.balance_arrays(self.members, self.splits), version)
+    
+    def compact(self, expenses_df, payments_df):
+        """CompactLedger of the synced frames, built from them on first request.
+        
+        Frames from before or after rows another session applied since the
+        sync get a CompactLedger of their own, which is not kept.
+        """
+        with self._lock:
+            if self._compact is None:
+                self._compact = CompactLedger.from_frames(expenses_df, payments_df, self.members)
+            compact = self._compact
+            if compact.n_expenses == len(expenses_df) and compact.n_payments == len(payments_df):
+                return compact
+        return CompactLedger.from_frames(expenses_df, payments_df, self.members)
+    
+    def apply_expense(self, buyer, amount, version=None, split=None, date=None):
+        """Add one expense, optionally with Split text, to the running totals.
+        
+        `version` is the data_version after this row, if the caller knows
+        it; otherwise the next sync checks the row against the loaded data.
+        Without a `date` the CompactLedger can't take the row, so it is
+        dropped and built again on its next request.
+        """
+        with self._lock:
+            i = self.index.get(buyer, -1)
+            cents = int(to_cents(float(amount)))
+            code = self.splits.code(split)
+            if i >= 0:
+                self.spent[i] += cents
+                self._add_split_cents(np.array([code]), np.array([cents]))
+            self._applied(0, [[i, cents, code]], version)
+            if self._compact is not None and date is not None:
+                self._compact.append_expense(date, buyer, amount, split)
+            else:
+                self._compact = None
+    
+    def apply_expenses(self, buyers, amounts, version=None, splits=None, dates=None):
+        """Add a batch of expenses (and their Split cells) to the running totals with bincounts."""
+        with self._lock:
+            codes = member_codes(buyers, self.members)
+            cents = to_cents(amounts)
+            split_codes = self.splits.codes(splits) if splits is not None else np.full(len(codes), -1, dtype=np.int64)
+            known = codes >= 0
+            self.spent += np.bincount(codes[known], weights=cents[known], minlength=len(self.members)).astype(np.int64)
+            self._add_split_cents(split_codes[known], cents[known])
+            self._applied(0, np.column_stack([codes, cents, split_codes]), version)
+            if self._compact is not None and dates is not None:
+                compact_splits = self._compact.splits.codes(splits) if splits is not None else None
+                self._compact.extend_expenses(_date_days(dates), codes, cents, compact_splits)
+            else:
+                self._compact = None
+    
+    def apply_payment(self, from_person, to_person, amount, version=None, date=None):
+        """Add one payment to the running totals."""
+        with self._lock:
+            i = self.index.get(from_person, -1)
+            j = self.index.get(to_person, -1)
+            cents = int(to_cents(float(amount)))
+            if i >= 0 and j >= 0:
+                self.adjustments[i] += cents
+                self.adjustments[j] -= cents
+            self._applied(1, [[i, j, cents]], version)
+            if self._compact is not None and date is not None:
+                self._compact.append_payment(date, from_person, to_person, amount)
+            else:
+                self._compact = None
+    
+    def balances(self):
+        """Return (balances, total_expenses, per_person_share) like calculate_balances."""
+        with self._lock:
+            owed = self.splits.owed(self.split_cents)
+            return balances_from_cents(self.members, self.spent.copy(), self.adjustments.copy(), owed)
+    
+    def snapshot(self):
+        """(version, balances()) taken together, so another session's sync can't come in between.
+        
+        The version is None while applied rows await a sync: no data
+        version describes those totals yet.
+        """
+        with self._lock:
+            version = None if self._pending[0] or self._pending[1] else self.version
+            return version, self.balances()
+
+# ============================================================================
+# COMPACT LEDGER
+# ============================================================================
+NO_DATE = np.iinfo(np.int64).min  # stored for dates that could not be parsed
+
+def _grow(array, needed):
+    """Return `array` with room for at least `needed` rows (capacity doubling)."""
+    if needed <= len(array):
+        return array
+    grown = np.empty(max(needed, 2 * len(array), 16), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def _parse_dates(dates):
+    """Dates (strings or datetimes) as a datetime64 Series, NaT where unparseable."""
+    if pd.api.types.is_datetime64_dtype(getattr(dates, "dtype", None)):
+        return pd.Series(dates)
+    dates = pd.Series(dates, dtype=object)
+    parsed = pd.to_datetime(dates, errors="coerce", format="%Y-%m-%d")  # the app's own format, parsed fast
+    retry = parsed.isna() & dates.notna() & (dates != "")
+    if retry.any():
+        parsed[retry] = pd.to_datetime(dates[retry], errors="coerce", format="mixed")
+    return parsed
+
+def _date_days(dates):
+    """Dates (strings or datetimes) as int64 days since 1970-01-01."""
+    parsed = _parse_dates(dates)
+    days = parsed.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    days[parsed.isna().to_numpy()] = NO_DATE
+    return days
+
+def _to_day(date):
+    """One date (string, date or datetime) as int64 days since 1970-01-01."""
+    return int(np.datetime64(pd.Timestamp(date).date(), "D").astype(np.int64))
+
+class CompactLedger:
+    """Array-backed ledger: int64 dates (days), member indices and amounts (cents).
+    
+    Only the columns that affect balances are kept, which makes a row a few
+    dozen bytes instead of several hundred for an object-dtype DataFrame.
+    Members outside the roster are stored as -1 and ignored in balances;
+    an expense's Split is stored as its SplitTable code.
+    """
+    
+    def __init__(self, members=None):
+        self.members = list(members if members is not None else MEMBERS)
+        self.index = {member: i for i, member in enumerate(self.members)}
+        self.splits = SplitTable(self.members)
+        self.n_expenses = 0
+        self.n_payments = 0
+        self._expense_date = np.empty(0, dtype=np.int64)
+        self._expense_buyer = np.empty(0, dtype=np.int64)
+        self._expense_cents = np.empty(0, dtype=np.int64)
+        self._expense_split = np.empty(0, dtype=np.int64)
+        self._payment_date = np.empty(0, dtype=np.int64)
+        self._payment_from = np.empty(0, dtype=np.int64)
+        self._payment_to = np.empty(0, dtype=np.int64)
+        self._payment_cents = np.empty(0, dtype=np.int64)
+        self._recent = {}  # "expenses"/"payments" -> RecentRows, built on first use
+    
+    # Views over the filled part of each array
+    expense_date = property(lambda self: self._expense_date[:self.n_expenses])
+    expense_buyer = property(lambda self: self._expense_buyer[:self.n_expenses])
+    expense_cents = property(lambda self: self._expense_cents[:self.n_expenses])
+    expense_split = property(lambda self: self._expense_split[:self.n_expenses])
+    payment_date = property(lambda self: self._payment_date[:self.n_payments])
+    payment_from = property(lambda self: self._payment_from[:self.n_payments])
+    payment_to = property(lambda self: self._payment_to[:self.n_payments])
+    payment_cents = property(lambda self: self._payment_cents[:self.n_payments])
+    
+    def extend_expenses(self, days, buyers, cents, splits=None):
+        """Append expense columns (equal-length int64 arrays; `splits` are SplitTable codes)."""
+        n, end = self.n_expenses, self.n_expenses + len(cents)
+        self._expense_date = _grow(self._expense_date, end)
+        self._expense_buyer = _grow(self._expense_buyer, end)
+        self._expense_cents = _grow(self._expense_cents, end)
+        self._expense_split = _grow(self._expense_split, end)
+        self._expense_date[n:end] = days
+        self._expense_buyer[n:end] = buyers
+        self._expense_cents[n:end] = cents
+        self._expense_split[n:end] = splits if splits is not None else -1
+        self.n_expenses = end
+        if "expenses" in self._recent:
+            self._recent["expenses"].extend(days)
+    
+    def extend_payments(self, days, payers, payees, cents):
+        """Append payment columns (equal-length int64 arrays)."""
+        n, end = self.n_payments, self.n_payments + len(cents)
+        self._payment_date = _grow(self._payment_date, end)
+        self._payment_from = _grow(self._payment_from, end)
+        self._payment_to = _grow(self._payment_to, end)
+        self._payment_cents = _grow(self._payment_cents, end)
+        self._payment_date[n:end] = days
+        self._payment_from[n:end] = payers
+        self._payment_to[n:end] = payees
+        self._payment_cents[n:end] = cents
+        self.n_payments = end
+        if "payments" in self._recent:
+            self._recent["payments"].extend(days)
+    
+    def append_expense(self, date, buyer, amount, split=None):
+        self.extend_expenses(
+            _date_days([date]), [self.index.get(buyer, -1)], [to_cents(float(amount))], [self.splits.code(split)],
+        )
+    
+    def append_payment(self, date, from_person, to_person, amount):
+        self.extend_payments(
+            _date_days([date]), [self.index.get(from_person, -1)], [self.index.get(to_person, -1)],
+            [to_cents(float(amount))],
+        )
+    
+    @classmethod
+    def from_frames(cls, expenses_df, payments_df, members=None):
+        """Build from DataFrames in the worksheet schema."""
+        ledger = cls(members)
+        if not expenses_df.empty:
+            ledger.extend_expenses(
+                _date_days(expenses_df["Date"]),
+                member_codes(expenses_df["Buyer"], ledger.members),
+                to_cents(_amount_array(expenses_df["Amount"])),
+                ledger.splits.codes(expenses_df[SPLIT_COLUMN]) if SPLIT_COLUMN in expenses_df.columns else None,
+            )
+        if not payments_df.empty:
+            ledger.extend_payments(
+                _date_days(payments_df["Date"]),
+                member_codes(payments_df["From"], ledger.members),
+                member_codes(payments_df["To"], ledger.members),
+                to_cents(_amount_array(payments_df["Amount"])),
+            )
+        return ledger
+    
+    @classmethod
+    def from_snapshot(cls, snapshot, members=None):
+        """Build straight from a Snapshot's columns, without going through pandas."""
+        ledger = cls(members if members is not None else snapshot.members)
+        n = snapshot.expense_rows
+        days = snapshot.days()
+        codes = snapshot.member_codes(ledger.members)
+        cents = snapshot.column("Cents")
+        ledger._expense_date, ledger._payment_date = days[:n], days[n:]
+        ledger._expense_buyer, ledger._payment_from = codes["Member"][:n], codes["Member"][n:]
+        ledger._payment_to = codes["To"][n:]
+        ledger._expense_cents, ledger._payment_cents = cents[:n], cents[n:]
+        ledger._expense_split = snapshot.split_codes(ledger.splits)[:n]
+        ledger.n_expenses, ledger.n_payments = n, len(days) - n
+        return ledger
+    
+    def to_frames(self):
+        """Convert back to the worksheet schema.
+        
+        Item and Notes are not stored, so they come back empty, and each
+        expense comes back as one unit at its full amount. Splits come
+        back in canonical form.
+        """
+        roster = np.array(self.members + [""], dtype=object)  # index -1 -> ""
+        
+        def dates(days):
+            out = days.astype("datetime64[D]").astype(str).astype(object)
+            out[days == NO_DATE] = ""
+            return out
+        
+        amounts = self.expense_cents / 100
+        expenses_df = pd.DataFrame({
+            "Date": dates(self.expense_date),
+            "Item": "",
+            "Buyer": roster[self.expense_buyer],
+            "Quantity": 1.0,
+            "Unit Price": amounts,
+            "Amount": amounts,
+            "Notes": "",
+            "Split": self.splits.text(self.expense_split),
+        }, columns=EXPENSE_COLUMNS)
+        payments_df = pd.DataFrame({
+            "Date": dates(self.payment_date),
+            "From": roster[self.payment_from],
+            "To": roster[self.payment_to],
+            "Amount": self.payment_cents / 100,
+            "Notes": "",
+        }, columns=PAYMENT_COLUMNS)
+        return expenses_df, payments_df
+    
+    def balance_cents(self):
+        """Exact per-member (spent, adjustments, owed) in integer cents."""
+        # bincount accumulates in float64, which is exact for integer sums below 2**53 cents
+        n = len(self.members)
+        buyers, cents = self.expense_buyer, self.expense_cents
+        known = buyers >= 0
+        spent = np.bincount(buyers[known], weights=cents[known], minlength=n).astype(np.int64)
+        owed = self.splits.owed(self.splits.totals(self.expense_split[known], cents[known]).astype(np.int64))
+        
+        payers, payees, cents = self.payment_from, self.payment_to, self.payment_cents
+        known = (payers >= 0) & (payees >= 0)
+        adjustments = (
+            np.bincount(payers[known], weights=cents[known], minlength=n)
+            - np.bincount(payees[known], weights=cents[known], minlength=n)
+        ).astype(np.int64)
+        return spent, adjustments, owed
+    
+    def balances(self):
+        """Return (balances, total_expenses, per_person_share) like calculate_balances."""
+        return balances_from_cents(self.members, *self.balance_cents())
+    
+    def settlement(self, mode=None):
+        """Settlement plan computed directly on the integer balances."""
+        spent, adjustments, owed = self.balance_cents()
+        balance = spent - share_cents(spent, owed) + adjustments
+        return settle_cents(dict(zip(self.members, balance.tolist())), mode)
+    
+    def recent(self, kind):
+        """RecentRows over "expenses" or "payments", kept current by later appends."""
+        if kind not in self._recent:
+            self._recent[kind] = RecentRows(self.expense_date if kind == "expenses" else self.payment_date)
+        return self._recent[kind]
+    
+    def memory_usage(self):
+        """Bytes held by the filled part of the arrays."""
+        arrays = [
+            self.expense_date, self.expense_buyer, self.expense_cents, self.expense_split,
+            self.payment_date, self.payment_from, self.payment_to, self.payment_cents,
+        ]
+        return sum(a.nbytes for a in arrays)
+
+# ============================================================================
+# TYPED FRAMES
+# ============================================================================
+NUMERIC_COLUMNS = ["Quantity", "Unit Price", "Amount"]
+MEMBER_COLUMNS = ["Buyer", "From", "To"]
+ITEM_CATEGORY_MAX_RATIO = 0.5  # Item becomes a categorical when it has at most this many distinct values per row
+
+def _member_categorical(values, members):
+    """Names as a categorical whose categories are the roster, then any other names."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        seen = values.cat.categories
+    else:
+        values = values.where(values.isna() | (values == ""), values.astype(str))  # numericised names
+        seen = pd.unique(values.dropna())
+    known = set(members)
+    extras = sorted(str(name) for name in seen if name not in known)
+    return pd.Categorical(values, categories=list(members) + extras)
+
+def typed_frame(df, members=None):
+    """Copy of a ledger frame with compact, schema-aware dtypes.
+    
+    Quantity/Unit Price/Amount become float64 (bad cells NaN), Date becomes
+    datetime64 (NaT where unparseable), Buyer/From/To become categoricals
+    over the roster, and Item does too when it repeats enough to pay off.
+    Split is always a categorical: a ledger has few distinct patterns.
+    Already-typed columns are kept as they are.
+    """
+    if members is None:
+        members = MEMBERS
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column in NUMERIC_COLUMNS and not pd.api.types.is_float_dtype(values.dtype):
+            values = pd.to_numeric(values, errors="coerce").astype(np.float64)
+        elif column == "Date":
+            values = _parse_dates(values)
+        elif column in MEMBER_COLUMNS:
+            values = pd.Series(_member_categorical(values, members), index=df.index)
+        elif column == "Item" and values.dtype == object and len(values):
+            if values.nunique() <= ITEM_CATEGORY_MAX_RATIO * len(values):
+                values = values.astype("category")
+        elif column == SPLIT_COLUMN and not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.fillna("").astype(str).astype("category")
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+def append_typed(df, new):
+    """Typed frame `df` with the typed rows of `new` (same columns) appended.
+    
+    Only `new` has to have gone through typed_frame: categorical columns of
+    `df` stay categorical, with any new categories added after the existing
+    ones so the roster still comes first.
+    """
+    if new.empty:
+        return df
+    if df.empty:
+        return new.reset_index(drop=True)
+    columns = {}
+    for column in df.columns:
+        values, added = df[column], new[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if not isinstance(added.dtype, pd.CategoricalDtype):
+                added = added.astype("category")
+            combined = union_categoricals([values.array, added.array], ignore_order=True)
+            columns[column] = pd.Series(combined)
+        else:
+            columns[column] = pd.concat([values, added], ignore_index=True)
+    return pd.DataFrame(columns)
+
+def frame_memory(df):
+    """Bytes held by a frame, counting the Python objects in object columns."""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+# ============================================================================
+# DATE INDEX
+# ============================================================================
+class BalanceIndex:
+    """Per-member cumulative totals (integer cents) at every distinct date.
+    
+    Row k of the prefix arrays holds the totals of all rows dated before
+    `dates[k]`, so an as-of or [start, end) balance is a binary search and
+    a subtraction. Undated rows count from the very beginning.
+    `split_totals` holds the split expenses' cents per Split pattern by the
+    same prefixes; members' shares of them are rounded only once the range
+    is known, so every balance matches a recompute of its rows to the cent.
+    """
+    
+    def __init__(self, members, dates, spent, adjustments, split_totals=None, splits=None):
+        self.members = list(members)
+        self.dates = dates  # sorted distinct days, int64
+        self.spent = spent  # (len(dates) + 1, members) prefix sums
+        self.adjustments = adjustments
+        self.split_totals = split_totals  # (len(dates) + 1, splits) prefix sums, or None without splits
+        self.splits = splits
+    
+    @classmethod
+    def from_ledger(cls, ledger):
+        """Build from a CompactLedger's date, member and cents columns."""
+        n = len(ledger.members)
+        days = np.concatenate([ledger.expense_date, ledger.payment_date, ledger.payment_date])
+        codes = np.concatenate([ledger.expense_buyer, ledger.payment_from, ledger.payment_to])
+        known_payment = (ledger.payment_from >= 0) & (ledger.payment_to >= 0)
+        spent_cents = np.concatenate([ledger.expense_cents, np.zeros(2 * ledger.n_payments, dtype=np.int64)])
+        adjustment_cents = np.concatenate([
+            np.zeros(ledger.n_expenses, dtype=np.int64),
+            np.where(known_payment, ledger.payment_cents, 0),
+            np.where(known_payment, -ledger.payment_cents, 0),
+        ])
+        keep = codes >= 0
+        days, codes = days[keep], codes[keep]
+        spent_cents, adjustment_cents = spent_cents[keep], adjustment_cents[keep]
+        
+        dates, slot = np.unique(days, return_inverse=True)
+        spent = np.zeros((len(dates) + 1, n), dtype=np.int64)
+        adjustments = np.zeros((len(dates) + 1, n), dtype=np.int64)
+        np.add.at(spent, (slot + 1, codes), spent_cents)
+        np.add.at(adjustments, (slot + 1, codes), adjustment_cents)
+        
+        # Split expenses: code totals per date, prefix-summed; shared out per query (see _owed)
+        split_totals = None
+        split = (ledger.expense_buyer >= 0) & (ledger.expense_split >= 0)
+        if split.any():
+            split_totals = np.zeros((len(dates) + 1, len(ledger.splits)), dtype=np.int64)
+            split_slot = np.searchsorted(dates, ledger.expense_date[split]) + 1
+            np.add.at(split_totals, (split_slot, ledger.expense_split[split]), ledger.expense_cents[split])
+            split_totals = np.cumsum(split_totals, axis=0)
+        return cls(ledger.members, dates, np.cumsum(spent, axis=0), np.cumsum(adjustments, axis=0),
+                   split_totals, ledger.splits)
+    
+    def _row(self, date, inclusive):
+        """Prefix row covering dates before `date` (or up to it, if inclusive)."""
+        return int(np.searchsorted(self.dates, _to_day(date), side="right" if inclusive else "left"))
+    
+    @property
+    def first_date(self):
+        dated = self.dates[self.dates != NO_DATE]
+        return pd.Timestamp(int(dated[0]), unit="D").date() if len(dated) else None
+    
+    @property
+    def last_date(self):
+        dated = self.dates[self.dates != NO_DATE]
+        return pd.Timestamp(int(dated[-1]), unit="D").date() if len(dated) else None
+    
+    def _owed(self, rows, start=None):
+        """Members' cents of the split expenses in prefix `rows`, less those in prefix `start`.
+        
+        Differencing the pattern totals before sharing them out keeps the
+        rounding that of the rows in range; differencing rounded shares
+        would be off by a cent per pattern.
+        """
+        if self.split_totals is None:
+            return np.zeros(np.shape(rows) + (len(self.members),), dtype=np.int64)
+        totals = self.split_totals[rows]
+        if start is not None:
+            totals = totals - self.split_totals[start]
+        return self.splits.owed(totals)
+    
+    def totals_as_of(self, date):
+        """(spent, adjustments, owed) cent arrays for all rows dated on or before `date`."""
+        k = self._row(date, inclusive=True)
+        return self.spent[k], self.adjustments[k], self._owed(k)
+    
+    def _totals_range(self, a, b):
+        return self.spent[b] - self.spent[a], self.adjustments[b] - self.adjustments[a], self._owed(b, a)
+    
+    def totals_between(self, start, end):
+        """(spent, adjustments, owed) cent arrays for rows dated in [start, end)."""
+        return self._totals_range(self._row(start, inclusive=False), self._row(end, inclusive=False))
+    
+    def totals_in(self, start=None, end=None):
+        """(spent, adjustments, owed) for rows dated from `start` through `end`; either may be open."""
+        a = self._row(start, inclusive=False) if start is not None else 0
+        b = self._row(end, inclusive=True) if end is not None else len(self.dates)
+        return self._totals_range(a, b)
+    
+    def balances_as_of(self, date):
+        """Return (balances, total_expenses, per_person_share) at the end of `date`."""
+        return balances_from_cents(self.members, *self.totals_as_of(date))
+    
+    def balances_between(self, start, end):
+        """Return (balances, total_expenses, per_person_share) for [start, end) on its own."""
+        return balances_from_cents(self.members, *self.totals_between(start, end))
+    
+    def balance_history(self, dates):
+        """Balances in cents at the end of each of `dates`, shape (len(dates), members)."""
+        rows = np.searchsorted(self.dates, [_to_day(d) for d in dates], side="right")
+        spent, adjustments, owed = self.spent[rows], self.adjustments[rows], self._owed(rows)
+        n = len(self.members)
+        base, remainder = np.divmod(spent.sum(axis=1) - owed.sum(axis=1), n)
+        shares = base[:, None] + (np.arange(n)[None, :] < remainder[:, None]) + owed  # as in share_cents
+        return spent - shares + adjustments
+
+# ============================================================================
+# RECENT ROWS
+# ============================================================================
+RECENT_KEEP = 200  # newest rows kept sorted; deeper pages are selected on demand
+
+def _recency_key(days, rows):
+    """One int64 per row ordering by date, then by position (later entry wins)."""
+    return (np.maximum(days, -(1 << 30)) << 32) + rows  # undated rows sort oldest
+
+class RecentRows:
+    """Row positions newest-first by date, with the top `keep` maintained on append.
+    
+    Pages inside the kept head are served in O(k); deeper pages use a
+    partial selection over all rows instead of sorting the whole table.
+    """
+    
+    def __init__(self, days=(), keep=RECENT_KEEP):
+        self.keep = keep
+        self.n = 0
+        self._days = np.empty(0, dtype=np.int64)
+        self._head = []  # negated keys of the newest rows, ascending (so newest first)
+        self.extend(days)
+    
+    def _select(self, count):
+        """Negated keys of the `count` newest rows, newest first."""
+        keys = -_recency_key(self._days[:self.n], np.arange(self.n, dtype=np.int64))
+        if count < self.n:
+            keys = keys[np.argpartition(keys, count)[:count]]
+        return np.sort(keys)
+    
+    def extend(self, days):
+        """Record newly appended rows dated `days` (int64 days, NO_DATE if undated)."""
+        days = np.asarray(days, dtype=np.int64)
+        start, self.n = self.n, self.n + len(days)
+        self._days = _grow(self._days, self.n)
+        self._days[start:self.n] = days
+        keys = -_recency_key(days, np.arange(start, self.n, dtype=np.int64))
+        if len(self._head) >= self.keep:
+            keys = keys[keys < self._head[-1]]
+        if len(keys) > self.keep:
+            keys = keys[np.argpartition(keys, self.keep)[:self.keep]]  # only these can enter the head
+        if len(keys):
+            self._head = sorted(self._head + keys.tolist())[:self.keep]
+    
+    def append(self, day):
+        self.extend([day])
+    
+    def page(self, offset, limit):
+        """Row positions of the newest rows in [offset, offset + limit)."""
+        end = min(offset + limit, self.n)
+        keys = self._head if end <= len(self._head) else self._select(end)
+        return [-int(k) & 0xFFFFFFFF for k in keys[offset:end]]
+
+# ============================================================================
+# EXPORTS
+# ============================================================================
+EXPORT_REPORTS = ["Expenses", "Payments", "Balances", "Settlement"]
+EXPORT_CHUNK_ROWS = 50_000  # rows converted to CSV/Excel at a time
+EXCEL_MAX_ROWS = 1_048_575  # data rows per worksheet; longer reports continue on another sheet
+
+def _row_mask(df, member_columns, start, end, member):
+    """Rows dated from `start` through `end` that involve `member` (None = no filter)."""
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None or end is not None:
+        days = _date_days(df["Date"])
+        mask &= days != NO_DATE
+        if start is not None:
+            mask &= days >= _to_day(start)
+        if end is not None:
+            mask &= days <= _to_day(end)
+    if member is not None:
+        mask &= np.logical_or.reduce([(df[c] == member).to_numpy() for c in member_columns])
+    return mask
+
+def report_chunks(report, expenses_df, payments_df, members=None, start=None, end=None, member=None,
+                  mode=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield one of EXPORT_REPORTS as DataFrames of at most `chunk_rows` rows.
+    
+    Ledger reports are sliced from the filtered rows one chunk at a time;
+    Balances and Settlement cover the same date range, from a BalanceIndex.
+    At least one (possibly empty) chunk is always yielded.
+    """
+    members = list(members if members is not None else MEMBERS)
+    if report in ("Expenses", "Payments"):
+        if report == "Expenses":
+            df, columns, member_columns = expenses_df, EXPENSE_COLUMNS, ["Buyer"]
+        else:
+            df, columns, member_columns = payments_df, PAYMENT_COLUMNS, ["From", "To"]
+        positions = np.flatnonzero(_row_mask(df, member_columns, start, end, member)) if len(df) else []
+        yield df.iloc[positions[:chunk_rows]].reindex(columns=columns)
+        for i in range(chunk_rows, len(positions), chunk_rows):
+            yield df.iloc[positions[i:i + chunk_rows]].reindex(columns=columns)
+        return
+    
+    index = BalanceIndex.from_ledger(CompactLedger.from_frames(expenses_df, payments_df, members))
+    spent, adjustments, owed = index.totals_in(start, end)
+    if report == "Balances":
+        balances = balances_from_cents(members, spent, adjustments, owed)[0]
+        rows = [(m, d["spent"], d["share"], d["balance"]) for m, d in balances.items() if member in (None, m)]
+        yield pd.DataFrame(rows, columns=["Member", "Spent", "Share", "Balance"])
+    elif report == "Settlement":
+        balance = spent - share_cents(spent, owed) + adjustments
+        plan = settle_cents(dict(zip(members, balance.tolist())), mode)
+        rows = [(t["from"], t["to"], t["amount"]) for t in plan if member in (None, t["from"], t["to"])]
+        yield pd.DataFrame(rows, columns=["From", "To", f"Amount ({CURRENCY})"])
+    else:
+        raise ValueError(f"Unknown report: {report}")
+
+def iter_csv(chunks):
+    """Encode DataFrame chunks as UTF-8 CSV, header first, one piece per chunk."""
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+def write_csv(target, chunks):
+    """Stream DataFrame chunks to a path or binary file object as CSV."""
+    if isinstance(target, str):
+        with open(target, "wb") as f:
+            return write_csv(f, chunks)
+    for piece in iter_csv(chunks):
+        target.write(piece)
+
+def write_excel(target, sheets):
+    """Stream `{sheet name: DataFrame chunks}` into an .xlsx (openpyxl write-only mode)."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    for name, chunks in sheets.items():
+        parts = []
+        
+        def new_sheet(columns):
+            parts.append(workbook.create_sheet(name if not parts else f"{name} ({len(parts) + 1})"))
+            parts[-1].append(list(columns))
+            return parts[-1]
+        
+        rows = 0
+        for chunk in chunks:
+            worksheet = parts[-1] if parts else new_sheet(chunk.columns)
+            values = chunk.astype(object).where(chunk.notna(), None)  # NaN is not a valid cell
+            for row in values.itertuples(index=False, name=None):
+                if rows == EXCEL_MAX_ROWS:
+                    worksheet, rows = new_sheet(chunk.columns), 0
+                worksheet.append(list(row))
+                rows += 1
+    workbook.save(target)
+
+# ============================================================================
+# BULK IMPORT
+# ============================================================================
+IMPORT_REQUIRED_COLUMNS = ["Date", "Buyer", "Amount"]  # a missing Quantity or Unit Price is derived from Amount
+IMPORT_AMOUNT_TOLERANCE = 0.01  # how far Amount may be from Quantity x Unit Price
+
+def read_import_file(source, name):
+    """Read an uploaded CSV or Excel file (path or file object) as text columns."""
+    if str(name).lower().endswith((".xlsx", ".xlsm")):
+        if not EXCEL_AVAILABLE:
+            raise ValueError("Reading Excel files requires openpyxl (pip install openpyxl)")
+        df = pd.read_excel(source, dtype=str, engine="openpyxl")
+    else:
+        df = pd.read_csv(source, dtype=str, skipinitialspace=True)
+    df.columns = [str(column).strip() for column in df.columns]
+    return df
+
+def validate_expense_import(df, members=None):
+    """Validate imported expense rows column by column.
+    
+    Returns (accepted_df, errors_df). accepted_df is in the Expenses
+    worksheet layout with YYYY-MM-DD dates, float amounts and canonical
+    Split text; errors_df has one row per rejected line, numbered as in the
+    file (header = row 1).
+    """
+    if members is None:
+        members = MEMBERS
+    missing = [column for column in IMPORT_REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    df = df.reset_index(drop=True)
+    
+    def text(column):
+        if column not in df.columns:
+            return pd.Series("", index=df.index)
+        return df[column].fillna("").astype(str).str.strip()
+    
+    def number(column):
+        return pd.to_numeric(df[column].astype(str).str.replace(",", ""), errors="coerce").to_numpy(dtype=np.float64)
+    
+    days = _date_days(text("Date"))
+    buyers = text("Buyer")
+    amounts = number("Amount")
+    # Without one of Quantity and Unit Price it is Amount over the other; without both, 1 x Amount
+    quantities = number("Quantity") if "Quantity" in df.columns else np.ones(len(df))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if "Unit Price" in df.columns:
+            unit_prices = number("Unit Price")
+            if "Quantity" not in df.columns:
+                quantities = amounts / unit_prices
+        else:
+            unit_prices = amounts / quantities
+    
+    # Each distinct Split text is parsed once
+    splits = text(SPLIT_COLUMN)
+    canonical = {}
+    for value in pd.unique(splits):
+        try:
+            canonical[value] = split_text(parse_split(value, members), members)
+        except ValueError:
+            pass
+
+    # NaN compares False, so unparseable numbers fail the positivity checks too
+    checks = [
+        (days == NO_DATE, "Date is missing or not a date"),
+        (member_codes(buyers, members) < 0, "Buyer is not a group member"),
+        (~(amounts > 0), "Amount must be a positive number"),
+        (~(quantities > 0), "Quantity must be a positive number"),
+        (~(unit_prices > 0), "Unit Price must be a positive number"),
+        (np.abs(amounts - quantities * unit_prices) > IMPORT_AMOUNT_TOLERANCE, "Amount is not Quantity x Unit Price"),
+        (~splits.isin(list(canonical)).to_numpy(), "Split has a non-member, a repeated name or a bad weight"),
+    ]
+    reasons = pd.Series("", index=df.index)
+    for failed, message in checks:
+        reasons[failed] += message + "; "
+    rejected = (reasons != "").to_numpy()
+    
+    errors_df = pd.DataFrame({
+        "Row": df.index[rejected] + 2,
+        "Date": text("Date")[rejected],
+        "Buyer": buyers[rejected],
+        "Amount": text("Amount")[rejected],
+        "Errors": reasons[rejected].str[:-2],
+    }).reset_index(drop=True)
+    
+    ok = ~rejected
+    accepted_df = pd.DataFrame({
+        "Date": pd.to_datetime(days[ok], unit="D").strftime("%Y-%m-%d"),
+        "Item": text("Item")[ok].to_numpy(),
+        "Buyer": buyers[ok].to_numpy(),
+        "Quantity": quantities[ok],
+        "Unit Price": unit_prices[ok],
+        "Amount": np.round(amounts[ok], 2),
+        "Notes": text("Notes")[ok].to_numpy(),
+        "Split": splits[ok].map(canonical).to_numpy(),
+    }, columns=EXPENSE_COLUMNS)
+    return accepted_df, errors_df
+
+# ============================================================================
+# STREAMING TOTALS
+# ============================================================================
+class StreamingTotals:
+    """Per-member totals (integer cents) accumulated one chunk of rows at a time.
+    
+    Memory grows with the roster and the distinct Split texts, not the row
+    count. With a fixed roster, unknown names are ignored like in
+    calculate_balances; without one, members are added in the order they
+    first appear, participants of a Split included.
+    """
+    
+    def __init__(self, members=None):
+        self.fixed = members is not None
+        self.members = list(members) if members is not None else []
+        self.index = {member: i for i, member in enumerate(self.members)}
+        self.spent = np.zeros(len(self.members), dtype=np.int64)
+        self.adjustments = np.zeros(len(self.members), dtype=np.int64)
+        self.split_cents = {}  # Split text -> cents; shared out once the roster is final
+        self.expense_rows = 0
+        self.payment_rows = 0
+    
+    def _codes(self, names):
+        names = names.fillna("").astype(str).str.strip()
+        if not self.fixed:
+            for name in pd.unique(names):
+                if name and name not in self.index:
+                    self.index[name] = len(self.members)
+                    self.members.append(name)
+            grow = len(self.members) - len(self.spent)
+            if grow:
+                self.spent = np.concatenate([self.spent, np.zeros(grow, dtype=np.int64)])
+                self.adjustments = np.concatenate([self.adjustments, np.zeros(grow, dtype=np.int64)])
+        return member_codes(names, self.members)
+    
+    def add_expenses(self, chunk):
+        """Fold a chunk of expense rows (needs Buyer and Amount; Split is optional) into the totals."""
+        buyers = self._codes(chunk["Buyer"])
+        cents = to_cents(_amount_array(chunk["Amount"]))
+        known = buyers >= 0
+        n = len(self.members)
+        self.spent += np.bincount(buyers[known], weights=cents[known], minlength=n).astype(np.int64)
+        if SPLIT_COLUMN in chunk.columns:
+            codes, texts = pd.factorize(chunk[SPLIT_COLUMN].fillna("").astype(str).str.strip().to_numpy()[known])
+            for text, total in zip(texts, np.bincount(codes, weights=cents[known], minlength=len(texts))):
+                if text:
+                    self.split_cents[text] = self.split_cents.get(text, 0) + int(total)
+        self.expense_rows += len(chunk)
+    
+    def add_payments(self, chunk):
+        """Fold a chunk of payment rows (needs From, To and Amount) into the totals."""
+        payers = self._codes(chunk["From"])
+        payees = self._codes(chunk["To"])
+        cents = to_cents(_amount_array(chunk["Amount"]))
+        known = (payers >= 0) & (payees >= 0)
+        n = len(self.members)
+        self.adjustments += (
+            np.bincount(payers[known], weights=cents[known], minlength=n)
+            - np.bincount(payees[known], weights=cents[known], minlength=n)
+        ).astype(np.int64)
+        self.payment_rows += len(chunk)
+    
+    def owed(self):
+        """Each member's cents of the split expenses seen so far."""
+        if not self.fixed:
+            self._codes(pd.Series([name for text in self.split_cents for name in split_names(text)], dtype=object))
+        splits = SplitTable(self.members)
+        codes = splits.codes(list(self.split_cents))
+        return splits.owed(splits.totals(codes, list(self.split_cents.values())).astype(np.int64))
+    
+    def unparsed_splits(self):
+        """Split texts seen so far that do not parse against the roster; they are shared equally."""
+        return [text for text in self.split_cents if _fails_to_parse(text, self.members)]
+    
+    def balances(self):
+        """Return (balances, total_expenses, per_person_share) like calculate_balances."""
+        if not self.members:
+            return {}, 0.0, 0.0
+        owed = self.owed()
+        return balances_from_cents(self.members, self.spent, self.adjustments, owed)
+    
+    def settlement(self, mode=None):
+        """Settlement plan computed directly on the integer balances."""
+        if not self.members:
+            return []
+        owed = self.owed()
+        balance = self.spent - share_cents(self.spent, owed) + self.adjustments
+        return settle_cents(dict(zip(self.members, balance.tolist())), mode)
+
+# ============================================================================
+# LEDGER SNAPSHOTS
+# ============================================================================
+# A snapshot is one Arrow table holding the expense rows followed by the
+# payment rows (the split point is in the schema metadata):
+#   Kind      dictionary  "expense" / "payment"
+#   Date      date32      null when the sheet date could not be parsed
+#   Item      dictionary  expenses only
+#   Member    dictionary  buyer of an expense, payer of a payment
+#   To        dictionary  payee of a payment
+#   Quantity, Unit Price  float64, expenses only
+#   Cents     int64       amount in integer cents
+#   Notes     dictionary
+#   Split     dictionary  expenses only; optional, older snapshots lack it
+# Member and To share one dictionary that starts with the roster, so their
+# indices are member codes. Written as an uncompressed Arrow IPC file the
+# table is memory-mapped on load; Parquet is also accepted for interchange.
+SNAPSHOT_KINDS = ["expense", "payment"]
+
+def _dictionary(values, categories=None):
+    """pyarrow dictionary array for a column of strings (empty or missing -> null).
+    
+    With `categories`, the dictionary is exactly that list, in that order.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    values = pd.Series(values, dtype=object)
+    try:
+        array = pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):  # numericised sheet cells
+        array = pa.array(values.where(values.isna(), values.astype(str)), type=pa.string(), from_pandas=True)
+    array = pc.if_else(pc.equal(array, ""), pa.scalar(None, pa.string()), array)
+    encoded = array.dictionary_encode()
+    if categories is None:
+        return encoded
+    position = {c: i for i, c in enumerate(categories)}
+    remap = np.array([position[v] for v in encoded.dictionary.to_pylist()] + [0], dtype=np.int32)
+    indices = encoded.indices
+    return pa.DictionaryArray.from_arrays(
+        pa.array(remap[indices.fill_null(len(remap) - 1).to_numpy()], mask=np.asarray(indices.is_null())),
+        pa.array(list(categories), type=pa.string()),
+    )
+
+def _float_column(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+
+def snapshot_table(expenses_df, payments_df, members=None):
+    """Build the snapshot table for two frames in the worksheet schema."""
+    import pyarrow as pa
+    members = list(members if members is not None else MEMBERS)
+    n_exp, n_pay = len(expenses_df), len(payments_df)
+    
+    def column(df, name, n):
+        return df[name] if name in df.columns else pd.Series([""] * n, dtype=object)
+    
+    names = pd.concat([column(expenses_df, "Buyer", n_exp), column(payments_df, "From", n_pay),
+                       column(payments_df, "To", n_pay)], ignore_index=True)
+    known = set(members)
+    extras = [m for m in pd.unique(names.dropna()) if m != "" and m not in known]
+    roster = members + [str(m) for m in extras]
+    dates = pd.concat([column(expenses_df, "Date", n_exp), column(payments_df, "Date", n_pay)], ignore_index=True)
+    days = _date_days(dates)
+    empty = np.full(n_pay, np.nan)
+    
+    table = pa.table({
+        "Kind": pa.DictionaryArray.from_arrays(
+            pa.array(np.repeat(np.array([0, 1], dtype=np.int8), [n_exp, n_pay])), pa.array(SNAPSHOT_KINDS)),
+        "Date": pa.array(days.astype(np.int32), type=pa.int32(), mask=days == NO_DATE).cast(pa.date32()),
+        "Item": _dictionary(pd.concat([column(expenses_df, "Item", n_exp), pd.Series([""] * n_pay)], ignore_index=True)),
+        "Member": _dictionary(names[:n_exp + n_pay], roster),
+        "To": _dictionary(pd.concat([pd.Series([""] * n_exp), names[n_exp + n_pay:]], ignore_index=True), roster),
+        "Quantity": np.concatenate([_float_column(column(expenses_df, "Quantity", n_exp)), empty]),
+        "Unit Price": np.concatenate([_float_column(column(expenses_df, "Unit Price", n_exp)), empty]),
+        "Cents": np.concatenate([to_cents(_amount_array(column(expenses_df, "Amount", n_exp))),
+                                 to_cents(_amount_array(column(payments_df, "Amount", n_pay)))]),
+        "Notes": _dictionary(pd.concat([column(expenses_df, "Notes", n_exp), column(payments_df, "Notes", n_pay)],
+                                       ignore_index=True)),
+        "Split": _dictionary(pd.concat([column(expenses_df, SPLIT_COLUMN, n_exp), pd.Series([""] * n_pay)],
+                                       ignore_index=True)),
+    })
+    metadata = {"format": SNAPSHOT_FORMAT, "expense_rows": str(n_exp), "members": json.dumps(members)}
+    return table.replace_schema_metadata(metadata)
+
+def write_snapshot(target, expenses_df, payments_df, members=None, fmt="arrow"):
+    """Write a snapshot to a path or binary file object.
+    
+    `fmt` is "arrow" (memory-mappable IPC file) or "parquet"; paths ending
+    in .parquet are always written as Parquet.
+    """
+    import pyarrow as pa
+    table = snapshot_table(expenses_df, payments_df, members)
+    if isinstance(target, str) and target.lower().endswith(".parquet"):
+        fmt = "parquet"
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, target)
+        return
+    with pa.ipc.new_file(target, table.schema) as writer:
+        writer.write_table(table)
+
+class Snapshot:
+    """A loaded snapshot table with typed access to its columns."""
+    
+    def __init__(self, table):
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"format", b"").decode() != SNAPSHOT_FORMAT:
+            raise ValueError("Not a ledger snapshot (missing or unknown format marker)")
+        self.table = table
+        self.expense_rows = int(metadata[b"expense_rows"])
+        self.members = json.loads(metadata[b"members"])
+    
+    @property
+    def payment_rows(self):
+        return self.table.num_rows - self.expense_rows
+    
+    def column(self, name):
+        """A numeric column as a numpy array (zero-copy for single-chunk columns)."""
+        return self.table.column(name).combine_chunks().to_numpy(zero_copy_only=False)
+    
+    def days(self):
+        """Date column as int64 days since 1970-01-01 (NO_DATE where missing)."""
+        import pyarrow as pa
+        dates = self.table.column("Date").combine_chunks().cast(pa.int32())
+        days = dates.fill_null(0).to_numpy().astype(np.int64)
+        days[np.asarray(dates.is_null())] = NO_DATE
+        return days
+    
+    def member_codes(self, members):
+        """Member and To columns as indices into `members` (-1 for other names)."""
+        index = {m: i for i, m in enumerate(members)}
+        codes = {}
+        for name in ("Member", "To"):
+            column = self.table.column(name).combine_chunks()
+            remap = np.array([index.get(m, -1) for m in column.dictionary.to_pylist()] + [-1], dtype=np.int64)
+            indices = column.indices.fill_null(-1).to_numpy()
+            codes[name] = remap[indices]  # -1 picks the trailing "not a member" slot
+        return codes
+    
+    def split_codes(self, splits):
+        """Split column as `splits` (SplitTable) codes; -1 for equal splits and older snapshots."""
+        if SPLIT_COLUMN not in self.table.column_names:
+            return np.full(self.table.num_rows, -1, dtype=np.int64)
+        column = self.table.column(SPLIT_COLUMN).combine_chunks()
+        remap = np.append(splits.codes(column.dictionary.to_pylist()), -1)
+        return remap[column.indices.fill_null(-1).to_numpy()]
+    
+    def frames(self):
+        """(expenses_df, payments_df) in the worksheet schema; text columns are categoricals."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        table = self.table
+        dates = pc.fill_null(table.column("Date").cast(pa.string()), "").dictionary_encode()
+        text = {
+            name: table.column(name).to_pandas().cat.add_categories([""]).fillna("")
+            for name in ("Item", "Member", "To", "Notes", SPLIT_COLUMN) if name in table.column_names
+        }
+        if SPLIT_COLUMN not in text:
+            text[SPLIT_COLUMN] = pd.Series(pd.Categorical([""] * table.num_rows))
+        date_column = dates.to_pandas()
+        amounts = self.column("Cents") / 100
+        n = self.expense_rows
+        expenses_df = pd.DataFrame({
+            "Date": date_column[:n],
+            "Item": text["Item"][:n],
+            "Buyer": text["Member"][:n],
+            "Quantity": self.column("Quantity")[:n],
+            "Unit Price": self.column("Unit Price")[:n],
+            "Amount": amounts[:n],
+            "Notes": text["Notes"][:n],
+            "Split": text[SPLIT_COLUMN][:n],
+        }, columns=EXPENSE_COLUMNS)
+        payments_df = pd.DataFrame({
+            "Date": date_column[n:].reset_index(drop=True),
+            "From": text["Member"][n:].reset_index(drop=True),
+            "To": text["To"][n:].reset_index(drop=True),
+            "Amount": amounts[n:],
+            "Notes": text["Notes"][n:].reset_index(drop=True),
+        }, columns=PAYMENT_COLUMNS)
+        return expenses_df, payments_df
+
+def read_snapshot(source):
+    """Open a snapshot from a path or bytes; Arrow IPC files are memory-mapped."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            magic = f.read(6)
+        if magic == b"ARROW1":
+            return Snapshot(pa.ipc.open_file(pa.memory_map(source, "r")).read_all())
+        return Snapshot(pq.read_table(source, memory_map=True))
+    buffer = pa.py_buffer(source)
+    if bytes(buffer[:6]) == b"ARROW1":
+        return Snapshot(pa.ipc.open_file(buffer).read_all())
+    return Snapshot(pq.read_table(pa.BufferReader(buffer)))
@@ -0,0 +1,183 @@
+"""In-process fake of the parts of the Google Sheets API the app uses.
+
+For exercising the request scheduler, the worksheet cache and the
+write-behind queue offline; shared by tests/ and benchmarks/. The fake
+enforces per-window read and write quotas (HTTP 429), can inject server
+errors (5xx) and latency, and counts every request it serves. Does not
+import Streamlit or gspread.
+
+    from fake_sheets import FakeSheetsServer
+    server = FakeSheetsServer(read_quota=60, latency=0.05)
+    spreadsheet = server.create("demo", {"Expenses": rows, "Payments": rows})
+    pool = SheetClientPool("demo", {}, connect=lambda: (None, spreadsheet))
+
+Rows are lists with the header first, like get_all_values() returns them.
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeAPIError(Exception):
+    """Raised like gspread's APIError: the HTTP status is on `response.status_code`."""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"{status_code}: {message}")
+        self.response = FakeResponse(status_code)
+
+
+def _cell(value):
+    """A value as Sheets displays it (what get_all_values returns)."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return "" if value is None else str(value)
+
+
+def _trim(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord("A") + 1
+    return number
+
+
+_A1_PART = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+class FakeSheetsServer:
+    """Quota, error and latency model shared by every fake spreadsheet it creates."""
+
+    def __init__(self, read_quota=60, write_quota=60, window=60.0, latency=0.0, error_rate=0.0,
+                 seed=0, clock=time.monotonic, sleep=time.sleep):
+        self.quota = {"read": read_quota, "write": write_quota}
+        self.window = window
+        self.latency = latency
+        self.error_rate = error_rate
+        self.clock = clock
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._served = {"read": deque(), "write": deque()}
+        self._forced = deque()  # status codes for the next requests
+        self.requests = {"read": 0, "write": 0}
+        self.rejected = 0  # 429s
+        self.errors = 0  # injected 5xx
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def create(self, spreadsheet_id, tabs):
+        """A FakeSpreadsheet with one worksheet per `{title: rows}` entry."""
+        return FakeSpreadsheet(self, spreadsheet_id, tabs)
+
+    def fail_next(self, count, status=503):
+        """Make the next `count` requests fail with `status`."""
+        with self._lock:
+            self._forced.extend([status] * count)
+
+    def _request(self, kind, action):
+        """Serve one request: check the quota and injected failures, wait out the latency, run `action`."""
+        with self._lock:
+            now = self.clock()
+            served = self._served[kind]
+            while served and now - served[0] >= self.window:
+                served.popleft()
+            if len(served) >= self.quota[kind]:
+                self.rejected += 1
+                raise FakeAPIError(429, f"Quota exceeded for {kind} requests per window")
+            served.append(now)
+            self.requests[kind] += 1
+            status = self._forced.popleft() if self._forced else None
+            if status is None and self.error_rate and self._random.random() < self.error_rate:
+                status = 503
+            if status is not None:
+                self.errors += 1
+                raise FakeAPIError(status, "The service is currently unavailable")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                self.sleep(self.latency)
+            with self._lock:
+                return action()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "reads": self.requests["read"],
+                "writes": self.requests["write"],
+                "rejected_429": self.rejected,
+                "errors_5xx": self.errors,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+class FakeSpreadsheet:
+    def __init__(self, server, spreadsheet_id, tabs):
+        self.server = server
+        self.id = spreadsheet_id
+        self._worksheets = [
+            FakeWorksheet(server, i, title, rows) for i, (title, rows) in enumerate(tabs.items())
+        ]
+
+    def worksheets(self):
+        return self.server._request("read", lambda: list(self._worksheets))
+
+    def worksheet(self, title):
+        def find():
+            for worksheet in self._worksheets:
+                if worksheet.title == title:
+                    return worksheet
+            raise FakeAPIError(400, f"Worksheet not found: {title}")
+        return self.server._request("read", find)
+
+    def fetch_sheet_metadata(self, params=None):
+        return self.server._request("read", lambda: {"spreadsheetId": self.id})
+
+
+class FakeWorksheet:
+    def __init__(self, server, worksheet_id, title, rows):
+        self.server = server
+        self.id = worksheet_id
+        self.title = title
+        self.rows = [[_cell(v) for v in row] for row in rows]
+
+    def _range(self, a1):
+        """Rows of an A1 range such as "1:1", "A7:G" or "A7:G7" (trailing blanks trimmed)."""
+        start, _, end = a1.partition(":")
+        start_col, start_row = _A1_PART.match(start).groups()
+        end_col, end_row = _A1_PART.match(end or start).groups()
+        first = int(start_row) - 1 if start_row else 0
+        last = int(end_row) if end_row else len(self.rows)
+        width = _column_number(end_col) if end_col else None
+        return [_trim(row[:width]) for row in self.rows[first:last] if _trim(row[:width])]
+
+    def get_all_values(self):
+        return self.server._request("read", lambda: [list(row) for row in self.rows])
+
+    def batch_get(self, ranges):
+        return self.server._request("read", lambda: [self._range(a1) for a1 in ranges])
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        def append():
+            self.rows.extend([_cell(v) for v in row] for row in values)
+            return {"updates": {"updatedRows": len(values)}}
+        return self.server._request("write", append)
@@ -1,48 +1,115 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
+import contextvars
+import functools
+import importlib.util
 import io
 import json
+import logging.handlers
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 
-# Try to import Google Sheets libraries (optional if testing locally)
-try:
-    import gspread
-    from google.oauth2.service_account import Credentials
-    GSPREAD_AVAILABLE = True
-except ImportError:
-    GSPREAD_AVAILABLE = False
-
-try:
-    import plotly.express as px
-    import plotly.graph_objects as go
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
+# The calculation core lives in expense_core so the CLI can use it without Streamlit
+from expense_core import (
+    CURRENCY,
+    EXCEL_AVAILABLE,
+    EXPENSE_COLUMNS,
+    EXPORT_REPORTS,
+    FINGERPRINT_EXPENSE_COLUMNS,
+    FINGERPRINT_PAYMENT_COLUMNS,
+    MEMBERS,
+    PAYMENT_COLUMNS,
+    SETTLEMENT_MODE,
+    SNAPSHOTS_AVAILABLE,
+    SPLIT_COLUMN,
+    BalanceIndex,
+    CompactLedger,
+    Ledger,
+    append_typed,
+    balance_arrays,
+    calculate_settlement,
+    data_version,
+    extend_fingerprint,
+    format_split,
+    frame_fingerprint,
+    ledger_fingerprint,
+    frame_memory,
+    read_import_file,
+    read_snapshot,
+    report_chunks,
+    typed_frame,
+    validate_expense_import,
+    write_csv,
+    write_excel,
+    write_snapshot,
+)
+
+# Google Sheets and plotly are optional and slow to import, so they are only
+# looked up here and imported inside the functions that use them
+GSPREAD_AVAILABLE = (
+    importlib.util.find_spec("gspread") is not None
+    and importlib.util.find_spec("google.oauth2") is not None
+)
+PLOTLY_AVAILABLE = importlib.util.find_spec("plotly") is not None
 
 # ============================================================================
 # CONFIGURATION CONSTANTS
 # ============================================================================
 SHEET_ID = "1blpS3ZCtNNdUOVUSszotbJYoz9BpJAuWnq19VIZa4mI"
-UNIVERSITY_LOGO_URL = "https://ik.imagekit.io/senti/del_date.jpg?updatedAt=1761147709230"
 DATE_MASCOT_GIF_URL = "https://ik.imagekit.io/senti/del_date.jpg?updatedAt=1761147709230"
 BACKGROUND_IMAGE_URL = "https://ik.imagekit.io/senti/del_date.jpg?updatedAt=1761147709230"
 
-MEMBERS = [
-    "Fares Samer",
-    "Mohamed Tarek",
-    "Yassin Sherif",
-    "Youssef Ossama",
-    "Yousef Ibrahim",
-    "Mahmoud Sayed",
-    "Abdalrahman Ahmad",
-    "Mostafa Khaled",
-    "Mohamed Walid",
-    "Beshoy Fayez",
-    "Mohamed Hamada"
+
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
 ]
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # refresh access tokens this long before expiry
+HEALTH_PROBE_INTERVAL = 60  # seconds between connection health probes
+SHEET_CACHE_TTL = 30  # seconds a cached worksheet stays fresh without a write
+FULL_RELOAD_EVERY = 20  # delta syncs between safety full reloads
+VERIFY_ROWS_PER_SYNC = 1000  # cached rows re-read per delta sync, in turn, to catch mid-sheet edits
+FINGERPRINT_COLUMNS = {"Expenses": FINGERPRINT_EXPENSE_COLUMNS, "Payments": FINGERPRINT_PAYMENT_COLUMNS}
+WRITE_BATCH_SIZE = 20  # queued rows that trigger an immediate flush
+WRITE_FLUSH_INTERVAL = 2.0  # seconds a queued row may wait before being flushed
+WRITE_MAX_RETRIES = 5  # retryable failures before a batch is marked failed
+WRITE_BACKOFF_BASE = 1.0  # seconds; doubled per retry, with jitter
+WRITE_BACKOFF_MAX = 60.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+AUTH_ERROR_STATUS_CODES = {401}  # expired or revoked credentials: reconnect instead of retrying
+SHEETS_READ_QUOTA = 60  # read requests per window for the service account (the API's per-user default)
+SHEETS_WRITE_QUOTA = 60  # write requests per window
+SHEETS_QUOTA_WINDOW = 60.0  # seconds
+SHEETS_QUOTA_MAX_WAIT = 10.0  # longest a call waits for quota before giving up (cached data is shown)
+SHEETS_MAX_RETRIES = 3  # retries of a call after a 429 or 5xx
+SHEETS_BACKOFF_BASE = 0.5  # seconds; doubled per retry, with jitter
+SHEETS_BACKOFF_MAX = 8.0
+STALE_RETRY_INTERVAL = 10  # seconds between sheet retries while cached data is being shown
+LOCAL_DB_PATH = "expenses.db"  # SQLite file used by the "Local Database" data source
+GROUPS_CONFIG_PATH = "groups.json"  # optional list of expense groups; the team above is the default
+DEFAULT_GROUP_ID = "graduation-project"
+GROUP_CACHE_MAX_ACTIVE = 256  # groups whose ledgers and sheet caches stay in memory
+GROUP_PICKER_MAX_OPTIONS = 50  # above this, groups are picked by ID instead of a dropdown
+RECENT_PAGE_SIZES = [5, 10, 25, 50]  # choices for the Recent Expenses/Payments panels
+EXPORT_CACHE_MAX_ENTRIES = 16  # finished export files kept on disk for repeat downloads
+EXPORT_CACHE_MAX_BYTES = 256 * 2**20  # and at most this much disk between them
+# Set EXPENSES_DIAGNOSTICS_LOG to a file path to append one JSON object per run there; off by default
+DIAGNOSTICS_LOG_PATH = os.environ.get("EXPENSES_DIAGNOSTICS_LOG") or None
+DIAGNOSTICS_LOG_MAX_BYTES = 5 * 2**20  # rotate the log at this size
+DIAGNOSTICS_LOG_BACKUPS = 3  # rotated log files kept
+DIAGNOSTICS_HISTORY = 20  # runs kept per session for the diagnostics panel
+PROFILE_TOP_FUNCTIONS = 30  # rows shown from a profiled run
 
-CURRENCY = "EGP"
 
 # ============================================================================
 # CUSTOM CSS
@@ -252,76 +319,1257 @@ def apply_custom_css():
     </style>
     """, unsafe_allow_html=True)
 
+# ============================================================================
+# DIAGNOSTICS
+# ============================================================================
+# Every script run (or fragment rerun) gets a RunTrace in a context
+# variable, so the data layer can add timings and counters to it without
+# passing it around. With no active trace the helpers do nothing.
+@st.cache_resource(show_spinner=False)
+def get_trace_var():
+    """The context variable holding the active trace.
+    
+    Cached so every rerun of the script shares it: caches and pools built
+    by an earlier run still report to the current trace.
+    """
+    return contextvars.ContextVar("active_trace", default=None)
+
+_active_trace = get_trace_var()
+
+class RunTrace:
+    """Phase timings and counters collected during one run."""
+    
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.phases = {}  # phase -> seconds, summed over repeats
+        self.counters = {}
+        self._lock = threading.Lock()  # the sheet loader threads report here too
+    
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+    
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+    
+    def finish(self):
+        """Stop the clock and return the run as a JSON-ready record."""
+        self.total = time.perf_counter() - self.started
+        with self._lock:
+            return {
+                "timestamp": self.started_at.isoformat(timespec="milliseconds"),
+                "run": self.name,
+                "total_ms": round(self.total * 1000, 3),
+                "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()},
+                "counters": dict(self.counters),
+            }
+
+@contextmanager
+def trace_phase(phase):
+    """Add the time spent in the block to `phase` of the active trace."""
+    trace = _active_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add_time(phase, time.perf_counter() - started)
+
+def trace_count(counter, n=1):
+    """Add `n` to a counter of the active trace."""
+    trace = _active_trace.get()
+    if trace is not None:
+        trace.count(counter, n)
+
+def traced(name):
+    """Decorator: time a function as phase `name` of the active trace.
+    
+    Called with no active trace (a full run or a fragment rerun), the
+    function becomes the root of a new trace that is finished afterwards.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            if _active_trace.get() is not None:
+                with trace_phase(name):
+                    return func(*args, **kwargs)
+            trace = RunTrace(name)
+            token = _active_trace.set(trace)
+            profiler = start_requested_profile()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _active_trace.reset(token)
+                if profiler is not None:
+                    finish_profile(profiler, name)
+                finish_trace(trace)
+        return run
+    return decorate
+
+@st.cache_resource(show_spinner=False)
+def get_diagnostics_log(path):
+    """Process-wide logger that appends one JSON line per run to a rotating file."""
+    # Not registered with logging.getLogger, so each path gets a logger (and file handler) of its own
+    logger = logging.Logger("expense_manager.diagnostics", logging.INFO)
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=DIAGNOSTICS_LOG_MAX_BYTES, backupCount=DIAGNOSTICS_LOG_BACKUPS,
+        encoding="utf-8", delay=True,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+def finish_trace(trace):
+    """Keep a finished run in the session's history and append it to the log."""
+    record = trace.finish()
+    history = st.session_state.setdefault("diagnostics", [])
+    history.append(record)
+    del history[:-DIAGNOSTICS_HISTORY]
+    if DIAGNOSTICS_LOG_PATH:
+        get_diagnostics_log(DIAGNOSTICS_LOG_PATH).info(json.dumps(record))
+
+def request_profile():
+    st.session_state.profile_next_run = True
+
+def start_requested_profile():
+    """Start cProfile for this run if the diagnostics panel asked for it."""
+    if not st.session_state.pop("profile_next_run", False):
+        return None
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def finish_profile(profiler, name):
+    """Stop a run's profiler and keep its top functions for the panel."""
+    import pstats
+    profiler.disable()
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    st.session_state.last_profile = {
+        "run": name,
+        "timestamp": datetime.now().strftime("%H:%M:%S"),
+        "text": stream.getvalue(),
+    }
+
 # ============================================================================
 # GOOGLE SHEETS FUNCTIONS
 # ============================================================================
-def connect_to_sheet():
-    """Connect to Google Sheet using service account credentials."""
+class SheetQuotaExceeded(Exception):
+    """The request budget stayed exhausted for longer than the caller may wait."""
+
+class SheetUnavailableError(Exception):
+    """A worksheet could not be read and there is no cached copy to fall back on."""
+    
+    def __init__(self, title, cause):
+        super().__init__(f"{title}: {cause}")
+        self.title = title
+        self.cause = cause
+
+class SheetRequestScheduler:
+    """Sends every Sheets API call within quota, merging duplicates and retrying blips.
+    
+    - Each kind of call ("read", "write") has a sliding budget of requests
+      per window; a call that would exceed it waits for room, up to
+      `max_wait` seconds, then raises SheetQuotaExceeded.
+    - Reads with the same key that overlap in time share one request, so
+      sessions missing the cache together cost one API call.
+    - 429 and 5xx errors are retried with jittered exponential backoff; a
+      429 also holds back every other call of that kind for the delay.
+    """
+    
+    def __init__(self, read_quota=SHEETS_READ_QUOTA, write_quota=SHEETS_WRITE_QUOTA, window=SHEETS_QUOTA_WINDOW,
+                 max_wait=SHEETS_QUOTA_MAX_WAIT, max_retries=SHEETS_MAX_RETRIES, backoff_base=SHEETS_BACKOFF_BASE,
+                 backoff_max=SHEETS_BACKOFF_MAX, clock=time.monotonic, sleep=time.sleep):
+        self.quota = {"read": read_quota, "write": write_quota}
+        self.window = window
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._sent = {"read": deque(), "write": deque()}  # send times inside the window
+        self._paused_until = {"read": 0.0, "write": 0.0}
+        self._in_flight = {}  # read key -> Future shared by every caller of that read
+        self.requests = {"read": 0, "write": 0}
+        self.coalesced = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+    
+    def call(self, kind, func, key=None):
+        """Run `func()` as one API call of `kind`; reads with a `key` are shared while in flight."""
+        if kind != "read" or key is None:
+            return self._send(kind, func)
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            trace_count("sheet_coalesced_reads")
+            return future.result()
+        try:
+            result = self._send(kind, func)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+    
+    def _acquire(self, kind):
+        """Wait for room in the budget, then record one request."""
+        deadline = self.clock() + self.max_wait
+        while True:
+            with self._lock:
+                now = self.clock()
+                sent = self._sent[kind]
+                while sent and now - sent[0] >= self.window:
+                    sent.popleft()
+                wait = self._paused_until[kind] - now
+                if len(sent) >= self.quota[kind]:
+                    wait = max(wait, sent[0] + self.window - now)
+                if wait <= 0:
+                    sent.append(now)
+                    self.requests[kind] += 1
+                    break
+                if now + wait > deadline:
+                    raise SheetQuotaExceeded(f"Sheets {kind} quota exhausted; next slot in {wait:.0f}s")
+                self.throttled += 1
+            trace_count("sheet_quota_waits")
+            self.sleep(wait)
+        trace_count("sheet_api_calls")
+    
+    def _send(self, kind, func):
+        attempt = 0
+        while True:
+            self._acquire(kind)
+            try:
+                return func()
+            except Exception as e:
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = min(self.backoff_base * 2 ** attempt, self.backoff_max) * random.uniform(0.5, 1.5)
+                with self._lock:
+                    self.retries += 1
+                    if getattr(getattr(e, "response", None), "status_code", None) == 429:
+                        self._paused_until[kind] = max(self._paused_until[kind], self.clock() + delay)
+                trace_count("sheet_retries")
+                attempt += 1
+                self.sleep(delay)
+    
+    def used(self, kind):
+        """Requests of `kind` sent within the current window."""
+        with self._lock:
+            now = self.clock()
+            return sum(1 for sent_at in self._sent[kind] if now - sent_at < self.window)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "reads": self.requests["read"],
+                "writes": self.requests["write"],
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_request_scheduler():
+    """Process-wide scheduler: the quota belongs to the service account, not one sheet."""
+    return SheetRequestScheduler()
+
+# gspread methods that make an API call, by quota kind; everything else is a plain attribute
+SHEET_READ_METHODS = {"worksheets", "worksheet", "fetch_sheet_metadata", "get_all_values", "get_all_records", "batch_get"}
+SHEET_WRITE_METHODS = {"append_row", "append_rows"}
+
+class ScheduledHandle:
+    """Spreadsheet or worksheet handle whose API calls go through a SheetRequestScheduler.
+    
+    `on_auth_error` is called when a call fails with an authentication
+    error, so the owning pool can reconnect on its next use.
+    """
+    
+    def __init__(self, handle, scheduler, key, on_auth_error=None):
+        self._handle = handle
+        self._scheduler = scheduler
+        self._key = key
+        self._on_auth_error = on_auth_error
+    
+    def __getattr__(self, name):
+        if name in SHEET_READ_METHODS or name in SHEET_WRITE_METHODS:
+            return functools.partial(self._call, name)
+        return getattr(self._handle, name)
+    
+    def _call(self, name, *args, **kwargs):
+        method = getattr(self._handle, name)
+        try:
+            if name in SHEET_WRITE_METHODS:
+                return self._scheduler.call("write", lambda: method(*args, **kwargs))
+            key = (self._key, name, repr(args), repr(sorted(kwargs.items())))
+            result = self._scheduler.call("read", lambda: method(*args, **kwargs), key=key)
+        except Exception as e:
+            if self._on_auth_error is not None and is_auth_error(e):
+                self._on_auth_error()
+            raise
+        # Worksheets come back wrapped too, so their reads and writes are scheduled
+        if name == "worksheets":
+            return [self._wrap(ws) for ws in result]
+        if name == "worksheet":
+            return self._wrap(result)
+        return result
+    
+    def _wrap(self, worksheet):
+        return ScheduledHandle(worksheet, self._scheduler, self._key + (worksheet.title,), self._on_auth_error)
+
+class SheetClientPool:
+    """Process-wide gspread client and spreadsheet handle shared by all sessions."""
+    
+    def __init__(self, sheet_id, credentials_info, connect=None, scheduler=None,
+                 token_margin=TOKEN_REFRESH_MARGIN, probe_interval=HEALTH_PROBE_INTERVAL):
+        self.sheet_id = sheet_id
+        self.credentials_info = credentials_info
+        self.scheduler = scheduler or SheetRequestScheduler()
+        self.token_margin = token_margin
+        self.probe_interval = probe_interval
+        self._connect = connect or self._authorize
+        self._lock = threading.RLock()
+        self._credentials = None
+        self._spreadsheet = None
+        self._last_probe = 0.0
+        self.connects = 0
+        self.refreshes = 0
+    
+    def _authorize(self):
+        """Build credentials, authorize gspread and open the spreadsheet."""
+        import gspread
+        from google.oauth2.service_account import Credentials
+        
+        credentials = Credentials.from_service_account_info(self.credentials_info, scopes=SHEETS_SCOPES)
+        client = gspread.authorize(credentials)
+        return credentials, client.open_by_key(self.sheet_id)
+    
+    def _reconnect(self):
+        self._credentials, spreadsheet = self.scheduler.call("read", self._connect)
+        self._spreadsheet = ScheduledHandle(spreadsheet, self.scheduler, (self.sheet_id,), self.invalidate)
+        self._last_probe = time.monotonic()
+        self.connects += 1
+    
+    def _refresh_token_if_needed(self):
+        """Refresh the access token before it expires instead of on a failed call."""
+        credentials = self._credentials
+        if credentials is None or not hasattr(credentials, "refresh"):
+            return
+        expiry = getattr(credentials, "expiry", None)
+        if credentials.token and expiry and expiry - datetime.utcnow() > self.token_margin:
+            return
+        from google.auth.transport.requests import Request as AuthRequest
+        credentials.refresh(AuthRequest())
+        self.refreshes += 1
+    
+    def _is_healthy(self):
+        """Cheap probe: fetch only the spreadsheet id from the metadata endpoint."""
+        try:
+            self._spreadsheet.fetch_sheet_metadata({"fields": "spreadsheetId"})
+            return True
+        except Exception:
+            return False
+    
+    def spreadsheet(self):
+        """Return the shared spreadsheet handle, reconnecting only when needed."""
+        with self._lock:
+            if self._spreadsheet is None:
+                self._reconnect()
+                return self._spreadsheet
+            
+            try:
+                self._refresh_token_if_needed()
+            except Exception:
+                self._reconnect()
+                return self._spreadsheet
+            
+            if time.monotonic() - self._last_probe >= self.probe_interval:
+                if self._is_healthy():
+                    self._last_probe = time.monotonic()
+                else:
+                    self._reconnect()
+            return self._spreadsheet
+    
+    def invalidate(self):
+        """Drop the cached handle so the next call reconnects."""
+        with self._lock:
+            self._credentials = None
+            self._spreadsheet = None
+
+@st.cache_resource(show_spinner=False, max_entries=GROUP_CACHE_MAX_ACTIVE)
+def get_sheet_pool(sheet_id):
+    """One SheetClientPool per spreadsheet, shared across sessions and reruns."""
+    return SheetClientPool(sheet_id, dict(st.secrets["gcp_service_account"]), scheduler=get_request_scheduler())
+
+def connect_to_sheet(sheet_id=SHEET_ID):
+    """Connect to Google Sheet using the shared, pooled service account client."""
     if not GSPREAD_AVAILABLE:
         return None
     
     try:
-        # Check if credentials are stored in Streamlit secrets
-        if "gcp_service_account" in st.secrets:
-            credentials = Credentials.from_service_account_info(
-                st.secrets["gcp_service_account"],
-                scopes=[
-                    "https://www.googleapis.com/auth/spreadsheets",
-                    "https://www.googleapis.com/auth/drive"
-                ]
-            )
-            client = gspread.authorize(credentials)
-            sheet = client.open_by_key(SHEET_ID)
-            return sheet
+        # Check if credentials are stored in Streamlit secrets; without a secrets file
+        # the membership test alone would report "No secrets files found" as an error
+        if st.secrets.load_if_toml_exists() and "gcp_service_account" in st.secrets:
+            return get_sheet_pool(sheet_id).spreadsheet()
         else:
             return None
     except Exception as e:
         st.error(f"Error connecting to Google Sheets: {e}")
         return None
 
-def read_expenses_from_sheet(sheet):
-    """Read expenses from Google Sheet."""
-    try:
-        worksheet = sheet.worksheet("Expenses")
-        data = worksheet.get_all_records()
-        return pd.DataFrame(data)
-    except:
-        return pd.DataFrame(columns=["Date", "Item", "Buyer", "Quantity", "Unit Price", "Amount", "Notes"])
+class WorksheetCache:
+    """Shared cache of parsed worksheet DataFrames with TTL and write-through invalidation."""
+    
+    def __init__(self, ttl=SHEET_CACHE_TTL, stale_retry=STALE_RETRY_INTERVAL):
+        self.ttl = ttl
+        self.stale_retry = stale_retry
+        self._lock = threading.Lock()
+        self._entries = {}  # title -> (DataFrame, fetched_at, sync snapshot)
+        self._versions = {}  # title -> int, bumped on every reload or invalidation
+        self._loaded_at = {}  # title -> wall-clock time of the last successful load
+        self._errors = {}  # title -> message of the failure behind a stale frame
+        self.hits = 0
+        self.misses = 0
+        self.full_reloads = 0
+        self.delta_syncs = 0
+        self.stale_serves = 0
+    
+    def get(self, title, loader):
+        """Return the cached frame for `title`, calling `loader(snapshot)` on a miss.
+        
+        The loader receives the stale `(df, snapshot)` pair (or None) and
+        returns a fresh one; stale entries are kept so the loader can fetch
+        only what changed since then. If the loader fails, the stale frame
+        is served (and retried after `stale_retry` seconds); with nothing
+        cached, SheetUnavailableError is raised instead of returning empty.
+        """
+        with self._lock:
+            entry = self._entries.get(title)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                trace_count("sheet_cache_hits")
+                return entry[0]
+            self.misses += 1
+            trace_count("sheet_cache_misses")
+            previous = (entry[0], entry[2]) if entry is not None else None
+        
+        try:
+            df, snapshot = loader(previous)  # outside the lock so one slow read doesn't block other tabs
+        except Exception as e:
+            with self._lock:
+                self._errors[title] = str(e) or type(e).__name__
+                if entry is None:
+                    raise SheetUnavailableError(title, e) from e
+                self.stale_serves += 1
+                self._entries[title] = (entry[0], time.monotonic() - self.ttl + self.stale_retry, entry[2])
+            trace_count("sheet_stale_serves")
+            return entry[0]
+        with self._lock:
+            self._errors.pop(title, None)
+            self._loaded_at[title] = datetime.now()
+            self._entries[title] = (df, time.monotonic(), snapshot)
+            self._versions[title] = self._versions.get(title, 0) + 1
+            if snapshot.get("mode") == "delta":
+                self.delta_syncs += 1
+            else:
+                self.full_reloads += 1
+        return df
+    
+    def invalidate(self, title=None):
+        """Mark one worksheet (or all of them) stale so the next read goes to the network."""
+        with self._lock:
+            titles = [title] if title is not None else list(self._entries)
+            for t in titles:
+                entry = self._entries.get(t)
+                if entry is not None:
+                    self._entries[t] = (entry[0], float("-inf"), entry[2])
+                self._versions[t] = self._versions.get(t, 0) + 1
+    
+    def version(self, title):
+        with self._lock:
+            return self._versions.get(title, 0)
+    
+    def staleness(self, title):
+        """(last successful load time, error) while a stale frame is served for `title`, else None."""
+        with self._lock:
+            if title not in self._errors:
+                return None
+            return self._loaded_at.get(title), self._errors[title]
+    
+    def info(self, title):
+        """Sync snapshot of the cached frame for `title` (empty if never loaded)."""
+        with self._lock:
+            entry = self._entries.get(title)
+            return dict(entry[2]) if entry is not None else {}
+    
+    def fingerprint(self, title, df):
+        """Fingerprint recorded when `df` was loaded, or None if `df` is not the cached frame for `title`."""
+        with self._lock:
+            entry = self._entries.get(title)
+            if entry is None or entry[0] is not df:
+                return None
+            return entry[2].get("fingerprint")
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "full_reloads": self.full_reloads,
+                "delta_syncs": self.delta_syncs,
+                "stale_serves": self.stale_serves,
+            }
 
-def read_payments_from_sheet(sheet):
-    """Read payments from Google Sheet."""
-    try:
-        worksheet = sheet.worksheet("Payments")
-        data = worksheet.get_all_records()
-        return pd.DataFrame(data)
-    except:
-        return pd.DataFrame(columns=["Date", "From", "To", "Amount", "Notes"])
+@st.cache_resource(show_spinner=False, max_entries=GROUP_CACHE_MAX_ACTIVE)
+def get_sheet_cache(sheet_id):
+    """Process-wide worksheet cache for one spreadsheet, shared by every session."""
+    return WorksheetCache()
 
-def write_expense_to_sheet(sheet, date, item, buyer, quantity, unit_price, amount, notes):
-    """Write a new expense to Google Sheet."""
-    try:
-        worksheet = sheet.worksheet("Expenses")
-        worksheet.append_row([date, item, buyer, float(quantity), float(unit_price), float(amount), notes])
-        return True
-    except Exception as e:
-        st.error(f"Error writing to sheet: {e}")
-        return False
+def _pad_row(row, width):
+    return list(row[:width]) + [""] * (width - len(row))
 
-def write_payment_to_sheet(sheet, date, from_person, to_person, amount, notes):
-    """Write a new payment to Google Sheet."""
-    try:
-        worksheet = sheet.worksheet("Payments")
-        worksheet.append_row([date, from_person, to_person, float(amount), notes])
+def _strip_row(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+def _records_frame(header, rows):
+    """Numericise raw sheet rows the way get_all_records does and build a DataFrame."""
+    from gspread.utils import numericise_all
+    rows = [numericise_all(_pad_row(row, len(header))) for row in rows]
+    return pd.DataFrame(rows, columns=header)
+
+def _row_hashes(rows, width):
+    """One hash per raw row (as padded to the header), to spot rows edited since they were cached."""
+    return np.fromiter((hash(tuple(_pad_row(row, width))) for row in rows), dtype=np.int64, count=len(rows))
+
+def _full_load(worksheet):
+    values = worksheet.get_all_values()
+    if not values:
+        return pd.DataFrame(), {"mode": "full", "header": [], "n_rows": 0, "last_row": None, "syncs": 0}
+    header, rows = values[0], values[1:]
+    snapshot = {
+        "mode": "full",
+        "header": header,
+        "n_rows": len(rows),
+        "last_row": _pad_row(rows[-1], len(header)) if rows else None,
+        "row_hashes": _row_hashes(rows, len(header)),
+        "verify_from": 0,
+        "syncs": 0,
+    }
+    return _records_frame(header, rows), snapshot
+
+def _load_worksheet(worksheet, previous=None):
+    """Fetch a worksheet, pulling only rows appended since `previous` when possible.
+    
+    Returns `(df, snapshot)`. After a full load ("mode": "full") df holds
+    every row; after a delta sync ("mode": "delta") only the appended ones.
+    
+    Both tabs are append-only in practice, so one batched request for the
+    header, the last row we already have, everything after it and the next
+    VERIFY_ROWS_PER_SYNC cached rows in turn is enough. A changed header,
+    last row or re-read row means rows were edited or deleted, and we fall
+    back to a full reload; so does every FULL_RELOAD_EVERY-th sync.
+    """
+    if previous is None:
+        return _full_load(worksheet)
+    _, previous = previous
+    if not previous["header"] or previous["syncs"] >= FULL_RELOAD_EVERY:
+        return _full_load(worksheet)
+    
+    header, n_rows = previous["header"], previous["n_rows"]
+    width = len(header)
+    from gspread.utils import rowcol_to_a1
+    last_col = rowcol_to_a1(1, width).rstrip("0123456789")
+    verify_from = previous["verify_from"] if previous["verify_from"] < n_rows else 0
+    verify_to = min(verify_from + VERIFY_ROWS_PER_SYNC, n_rows)
+    ranges = ["1:1", f"A{n_rows + 2}:{last_col}"]
+    if n_rows:
+        ranges.append(f"A{n_rows + 1}:{last_col}{n_rows + 1}")
+        ranges.append(f"A{verify_from + 2}:{last_col}{verify_to + 1}")
+    fetched = worksheet.batch_get(ranges)
+    
+    current_header = _strip_row(fetched[0][0] if fetched[0] else [])
+    current_last = _pad_row(fetched[2][0], width) if n_rows and fetched[2] else None
+    if current_header != _strip_row(header) or current_last != previous["last_row"]:
+        return _full_load(worksheet)
+    if n_rows:
+        # The API leaves out trailing empty rows, so a short window ends in blank rows
+        window = fetched[3] + [[]] * (verify_to - verify_from - len(fetched[3]))
+        if not np.array_equal(_row_hashes(window, width), previous["row_hashes"][verify_from:verify_to]):
+            return _full_load(worksheet)
+    
+    new_rows = fetched[1]
+    snapshot = dict(previous, mode="delta", verify_from=verify_to, syncs=previous["syncs"] + 1)
+    if new_rows:
+        snapshot["n_rows"] = n_rows + len(new_rows)
+        snapshot["last_row"] = _pad_row(new_rows[-1], width)
+        snapshot["row_hashes"] = np.concatenate([previous["row_hashes"], _row_hashes(new_rows, width)])
+    return _records_frame(header, new_rows), snapshot
+
+class WorksheetHandles:
+    """Worksheet handles resolved once per spreadsheet handle and reused."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()  # spreadsheet id -> (spreadsheet, {title: worksheet}), LRU order
+    
+    def get(self, sheet, title):
+        with self._lock:
+            key = getattr(sheet, "id", None)
+            owner, by_title = self._handles.get(key, (None, {}))
+            if owner is not sheet:
+                # New or reconnected spreadsheet: one metadata call resolves every tab
+                by_title = {ws.title: ws for ws in sheet.worksheets()}
+                self._handles[key] = (sheet, by_title)
+                while len(self._handles) > GROUP_CACHE_MAX_ACTIVE:
+                    self._handles.popitem(last=False)
+            self._handles.move_to_end(key)
+            if title not in by_title:
+                by_title[title] = sheet.worksheet(title)
+            return by_title[title]
+
+@st.cache_resource(show_spinner=False)
+def get_worksheet_handles():
+    """Process-wide worksheet handle registry."""
+    return WorksheetHandles()
+
+@st.cache_resource(show_spinner=False)
+def get_loader_pool():
+    """Small thread pool used to fetch worksheets concurrently."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="sheet-loader")
+
+def _load_typed_worksheet(worksheet, previous=None, members=None):
+    """_load_worksheet, with the frame converted to compact dtypes (see typed_frame).
+    
+    A delta sync converts only the appended rows and adds them to the
+    cached typed frame. Full loads also record the frame's memory before
+    and after conversion. The frame's fingerprint (see data_version) is
+    recorded with it, hashing only the appended rows on a delta, so reruns
+    that reuse the cached frame never hash it again.
+    """
+    df, snapshot = _load_worksheet(worksheet, previous)
+    typed = typed_frame(df, members)
+    columns = FINGERPRINT_COLUMNS.get(worksheet.title)
+    if snapshot["mode"] == "full":
+        snapshot["memory"] = {"rows": len(df), "raw": frame_memory(df), "typed": frame_memory(typed)}
+        if columns is not None:
+            snapshot["fingerprint"] = frame_fingerprint(typed, columns)
+        return typed, snapshot
+    combined = append_typed(previous[0], typed)
+    if previous[1].get("fingerprint") is not None:
+        snapshot["fingerprint"] = extend_fingerprint(previous[1]["fingerprint"], combined, columns)
+    return combined, snapshot
+
+def _read_worksheet(sheet, title, cache, handles, members=None):
+    """Read one worksheet through the cache; returns (df, seconds spent).
+    
+    Raises SheetUnavailableError when the sheet cannot be read and nothing
+    is cached, so a failed read never looks like an empty ledger.
+    """
+    started = time.perf_counter()
+    with trace_phase(f"sheet_read_{title.lower()}"):
+        df = cache.get(title, lambda previous: _load_typed_worksheet(handles.get(sheet, title), previous, members))
+    return df, time.perf_counter() - started
+
+def load_sheet_data(sheet, members=None):
+    """Load both worksheets concurrently.
+    
+    Returns `(expenses_df, payments_df, timing)` where `timing` holds the
+    wall-clock time, the serial time (sum of the two reads) and the
+    difference saved by overlapping them.
+    """
+    cache, handles = get_sheet_cache(sheet.id), get_worksheet_handles()
+    started = time.perf_counter()
+    # The copied context carries this run's trace into the loader thread
+    expenses_job = get_loader_pool().submit(
+        contextvars.copy_context().run, _read_worksheet, sheet, "Expenses", cache, handles, members
+    )
+    payments_df, payments_time = _read_worksheet(sheet, "Payments", cache, handles, members)
+    expenses_df, expenses_time = expenses_job.result()
+    wall = time.perf_counter() - started
+    serial = expenses_time + payments_time
+    timing = {"wall": wall, "serial": serial, "saved": max(serial - wall, 0.0)}
+    return expenses_df, payments_df, timing
+
+def expense_row(date, item, buyer, quantity, unit_price, amount, notes, split=""):
+    """Row values for the Expenses worksheet, in column order."""
+    return [date, item, buyer, float(quantity), float(unit_price), float(amount), notes, split]
+
+def payment_row(date, from_person, to_person, amount, notes):
+    """Row values for the Payments worksheet, in column order."""
+    return [date, from_person, to_person, float(amount), notes]
+
+def is_retryable_error(exc):
+    """True for quota (429), transient server (5xx) and network errors from the Sheets API."""
+    if isinstance(exc, SheetQuotaExceeded):
+        return True  # the budget frees up within one quota window
+    response = getattr(exc, "response", None)
+    if response is None:
+        return isinstance(exc, OSError)  # requests' connection errors and timeouts are OSErrors
+    return getattr(response, "status_code", None) in RETRYABLE_STATUS_CODES
+
+def is_auth_error(exc):
+    """True when the Sheets API rejected the credentials (the client must reconnect)."""
+    return getattr(getattr(exc, "response", None), "status_code", None) in AUTH_ERROR_STATUS_CODES
+
+class WriteBehindQueue:
+    """Buffers appended rows and flushes them with batched append_rows calls.
+    
+    Rows are accepted immediately and stay visible through `pending_frame`
+    until a background thread has written them. A batch is flushed once
+    WRITE_BATCH_SIZE rows are waiting or the oldest has waited
+    WRITE_FLUSH_INTERVAL seconds; quota and 5xx errors are retried with
+    jittered exponential backoff before the rows are moved to `failed`.
+    """
+    
+    def __init__(self, get_spreadsheet, cache, handles, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, max_retries=WRITE_MAX_RETRIES):
+        self.get_spreadsheet = get_spreadsheet
+        self.cache = cache
+        self.handles = handles
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._pending = {}  # title -> [row, ...] in submission order
+        self._failed = {}  # title -> [row, ...]
+        self._oldest = None  # monotonic time the oldest pending row was queued
+        self._retry_at = 0.0
+        self._attempt = 0
+        self._thread = None
+        self.flushes = 0
+        self.retries = 0
+    
+    def enqueue(self, title, row):
+        """Queue one row for `title` and return immediately."""
+        self.enqueue_rows(title, [row])
+    
+    def enqueue_rows(self, title, rows):
+        """Queue rows for `title` under one lock, so they go out in one flush."""
+        with self._cond:
+            self._pending.setdefault(title, []).extend(list(row) for row in rows)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+    
+    def pending_count(self):
+        with self._cond:
+            return sum(len(rows) for rows in self._pending.values())
+    
+    def failed_count(self):
+        with self._cond:
+            return sum(len(rows) for rows in self._failed.values())
+    
+    def retry_failed(self):
+        """Move failed rows back to the front of the queue."""
+        with self._cond:
+            for title, rows in self._failed.items():
+                self._pending[title] = rows + self._pending.get(title, [])
+            self._failed = {}
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+            self._attempt = 0
+            self._retry_at = 0.0
+            self._cond.notify()
+    
+    def pending_frame(self, title, columns):
+        """Rows for `title` still waiting to be written, as a DataFrame (empty if none)."""
+        with self._cond:
+            rows = list(self._pending.get(title, []))
+        return pd.DataFrame(rows, columns=columns)
+    
+    def _due(self, now):
+        if not self._pending or now < self._retry_at:
+            return False
+        waiting = sum(len(rows) for rows in self._pending.values())
+        return waiting >= self.batch_size or now - self._oldest >= self.flush_interval
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due(time.monotonic()):
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    wake_at = max(self._oldest + self.flush_interval, self._retry_at)
+                    self._cond.wait(timeout=max(wake_at - time.monotonic(), 0.05))
+                batches = {title: list(rows) for title, rows in self._pending.items() if rows}
+            self._flush(batches)
+    
+    def _flush(self, batches):
+        for title, rows in batches.items():
+            try:
+                worksheet = self.handles.get(self.get_spreadsheet(), title)
+                worksheet.append_rows(rows)
+            except Exception as e:
+                with self._cond:
+                    if is_retryable_error(e) and self._attempt < self.max_retries:
+                        delay = min(WRITE_BACKOFF_BASE * 2 ** self._attempt, WRITE_BACKOFF_MAX)
+                        self._retry_at = time.monotonic() + delay * random.uniform(0.5, 1.5)
+                        self._attempt += 1
+                        self.retries += 1
+                        return
+                    # Give up on this batch; keep the rows so they can be retried by hand
+                    self._failed.setdefault(title, []).extend(rows)
+                    del self._pending[title][:len(rows)]
+                    self._attempt = 0
+                continue
+            with self._cond:
+                del self._pending[title][:len(rows)]
+                self.cache.invalidate(title)
+                self._attempt = 0
+                self.flushes += 1
+        with self._cond:
+            self._pending = {title: rows for title, rows in self._pending.items() if rows}
+            self._oldest = time.monotonic() if self._pending else None
+
+@st.cache_resource(show_spinner=False, max_entries=GROUP_CACHE_MAX_ACTIVE)
+def get_write_queue(sheet_id):
+    """Process-wide write-behind queue for one spreadsheet."""
+    pool = get_sheet_pool(sheet_id)
+    return WriteBehindQueue(pool.spreadsheet, get_sheet_cache(sheet_id), get_worksheet_handles())
+
+# ============================================================================
+# STORAGE BACKENDS
+# ============================================================================
+class StorageBackend(ABC):
+    """Interface shared by the persistent data sources."""
+    
+    name = None
+    
+    @abstractmethod
+    def load(self):
+        """Return (expenses_df, payments_df) in the worksheet column layout."""
+    
+    @abstractmethod
+    def append_rows(self, title, rows):
+        """Append rows (lists in worksheet column order) to "Expenses" or "Payments"."""
+    
+    def append_expense(self, row):
+        self.append_rows("Expenses", [row])
+    
+    def append_payment(self, row):
+        self.append_rows("Payments", [row])
+    
+    def supports_splits(self):
+        """True when appended Expenses rows keep their Split value."""
         return True
-    except Exception as e:
-        st.error(f"Error writing to sheet: {e}")
-        return False
+    
+    def data_version(self, source, expenses_df, payments_df):
+        """data_version of frames returned by load(); backends that know their fingerprints skip the hashing."""
+        return data_version(source, expenses_df, payments_df)
+    
+    def balance_arrays(self, members, splits):
+        """Per-member (spent, adjustments) and per-Split totals, as in balance_arrays()."""
+        expenses_df, payments_df = self.load()
+        return balance_arrays(expenses_df, payments_df, members, splits)
+
+class SheetBackend(StorageBackend):
+    """Google Sheets storage: cached, delta-synced reads and write-behind appends."""
+    
+    name = "sheet"
+    
+    def __init__(self, sheet, write_queue, members=None):
+        self.sheet = sheet
+        self.write_queue = write_queue
+        self.members = members
+        self.timing = None
+        self.stale = {}  # title -> (last loaded, error) for worksheets served from cache
+        self._fingerprints = {}  # title -> (frame returned by load(), its fingerprint or None)
+    
+    def load(self):
+        expenses_df, payments_df, self.timing = load_sheet_data(self.sheet, self.members)
+        cache = get_sheet_cache(self.sheet.id)
+        self.stale = {t: cache.staleness(t) for t in ("Expenses", "Payments") if cache.staleness(t) is not None}
+        return self._with_pending(cache, "Expenses", expenses_df), self._with_pending(cache, "Payments", payments_df)
+    
+    def _with_pending(self, cache, title, df):
+        """`df` plus the rows still in the write-behind queue, shown optimistically and typed like the rest.
+        
+        Only the pending rows are typed and hashed; the cached frame's
+        fingerprint is extended over them and remembered for data_version.
+        """
+        fingerprint = cache.fingerprint(title, df)
+        pending = self.write_queue.pending_frame(title, EXPENSE_COLUMNS if title == "Expenses" else PAYMENT_COLUMNS)
+        if not pending.empty:
+            if len(df.columns):
+                pending = pending.reindex(columns=df.columns)  # e.g. a sheet without a Split column
+            df = append_typed(df, typed_frame(pending, self.members))
+            if fingerprint is not None:
+                fingerprint = extend_fingerprint(fingerprint, df, FINGERPRINT_COLUMNS[title])
+        self._fingerprints[title] = (df, fingerprint)
+        return df
+    
+    def data_version(self, source, expenses_df, payments_df):
+        fingerprints = []
+        for title, df in (("Expenses", expenses_df), ("Payments", payments_df)):
+            loaded, fingerprint = self._fingerprints.get(title, (None, None))
+            fingerprints.append(fingerprint if loaded is df and fingerprint is not None
+                                else frame_fingerprint(df, FINGERPRINT_COLUMNS[title]))
+        return (source,) + fingerprints[0] + fingerprints[1]
+    
+    def memory_report(self):
+        """Per-worksheet memory of the cached frames, as measured at their last full load."""
+        cache = get_sheet_cache(self.sheet.id)
+        return {title: cache.info(title).get("memory") for title in ("Expenses", "Payments")}
+    
+    def append_rows(self, title, rows):
+        self.write_queue.enqueue_rows(title, rows)
+    
+    def supports_splits(self):
+        return header_has_split(get_sheet_cache(self.sheet.id).info("Expenses").get("header", []))
+
+def header_has_split(header):
+    """True if an Expenses header has the Split column where expense_row puts it.
+    
+    Sheets created before splits have seven columns, and reads drop cells
+    past the header, so a Split value appended to them would be lost.
+    """
+    position = EXPENSE_COLUMNS.index(SPLIT_COLUMN)
+    return len(header) > position and header[position] == SPLIT_COLUMN
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    item TEXT NOT NULL DEFAULT '',
+    buyer TEXT NOT NULL,
+    quantity REAL NOT NULL DEFAULT 0,
+    unit_price REAL NOT NULL DEFAULT 0,
+    amount REAL NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    split TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+CREATE INDEX IF NOT EXISTS idx_expenses_buyer ON expenses(buyer, amount);
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    from_member TEXT NOT NULL,
+    to_member TEXT NOT NULL,
+    amount REAL NOT NULL,
+    notes TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_payments_date ON payments(date);
+CREATE INDEX IF NOT EXISTS idx_payments_from ON payments(from_member, amount);
+CREATE INDEX IF NOT EXISTS idx_payments_to ON payments(to_member, amount);
+"""
+
+# (table, SQL columns, worksheet columns, member columns) per worksheet title
+SQLITE_TABLES = {
+    "Expenses": ("expenses", ["date", "item", "buyer", "quantity", "unit_price", "amount", "notes", "split"], EXPENSE_COLUMNS, ["buyer"]),
+    "Payments": ("payments", ["date", "from_member", "to_member", "amount", "notes"], PAYMENT_COLUMNS, ["from_member", "to_member"]),
+}
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite storage with date/member indexes and SQL-side aggregates."""
+    
+    name = "sqlite"
+    
+    def __init__(self, path=LOCAL_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        # Databases created before expenses had a Split column get it, empty (= split equally)
+        if "split" not in {row[1] for row in self._conn.execute("PRAGMA table_info(expenses)")}:
+            self._conn.execute("ALTER TABLE expenses ADD COLUMN split TEXT NOT NULL DEFAULT ''")
+    
+    def read(self, title, start=None, end=None, member=None):
+        """Rows of "Expenses" or "Payments", optionally limited to [start, end) and/or one member."""
+        table, sql_columns, columns, member_columns = SQLITE_TABLES[title]
+        select = ", ".join(f'{c} AS "{name}"' for c, name in zip(sql_columns, columns))
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(str(start))
+        if end is not None:
+            clauses.append("date < ?")
+            params.append(str(end))
+        if member is not None:
+            clauses.append("(" + " OR ".join(f"{c} = ?" for c in member_columns) + ")")
+            params.extend([member] * len(member_columns))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        trace_count("sqlite_queries")
+        with self._lock:
+            return pd.read_sql_query(f"SELECT {select} FROM {table}{where} ORDER BY id", self._conn, params=params)
+    
+    def read_expenses(self, start=None, end=None, member=None):
+        return self.read("Expenses", start, end, member)
+    
+    def read_payments(self, start=None, end=None, member=None):
+        return self.read("Payments", start, end, member)
+    
+    def load(self):
+        return self.read_expenses(), self.read_payments()
+    
+    def append_rows(self, title, rows):
+        """Insert rows in worksheet column order; raises ValueError (inserting nothing) on a bad number."""
+        table, sql_columns, columns, _ = SQLITE_TABLES[title]
+        placeholders = ", ".join("?" for _ in sql_columns)
+        rows = [sqlite_row(row, columns) for row in rows]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO {table} ({', '.join(sql_columns)}) VALUES ({placeholders})",
+                rows,
+            )
+    
+    def member_totals(self):
+        """Per-member spent, paid-out and received totals, summed in SQL."""
+        with self._lock:
+            spent = dict(self._conn.execute("SELECT buyer, SUM(amount) FROM expenses GROUP BY buyer"))
+            paid = dict(self._conn.execute("SELECT from_member, SUM(amount) FROM payments GROUP BY from_member"))
+            received = dict(self._conn.execute("SELECT to_member, SUM(amount) FROM payments GROUP BY to_member"))
+        return spent, paid, received
+    
+    def split_totals(self, members):
+        """Amount per distinct Split text, summed in SQL over expenses bought by `members`."""
+        placeholders = ", ".join("?" for _ in members)
+        with self._lock:
+            return dict(self._conn.execute(
+                f"SELECT split, SUM(amount) FROM expenses WHERE split != '' AND buyer IN ({placeholders}) GROUP BY split",
+                list(members),
+            ))
+    
+    def balance_arrays(self, members, splits):
+        spent, paid, received = self.member_totals()
+        # Payments count only when both sides are members, matching calculate_balances
+        if set(paid) - set(members) or set(received) - set(members):
+            return super().balance_arrays(members, splits)
+        split_totals = self.split_totals(members)
+        return (
+            np.array([spent.get(m, 0.0) for m in members], dtype=np.float64),
+            np.array([paid.get(m, 0.0) - received.get(m, 0.0) for m in members], dtype=np.float64),
+            splits.totals(splits.codes(list(split_totals)), list(split_totals.values())),
+        )
+
+@st.cache_resource(show_spinner=False, max_entries=GROUP_CACHE_MAX_ACTIVE)
+def get_local_backend(path=LOCAL_DB_PATH):
+    """Process-wide SQLite backend for one database file."""
+    return SQLiteBackend(path)
+
+class SnapshotCache:
+    """Open snapshots by path, each kept only at the file's latest modification time."""
+    
+    def __init__(self, max_entries=GROUP_CACHE_MAX_ACTIVE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # path -> (mtime_ns, snapshot, frames, ledger_fingerprint), LRU order
+        self.loads = 0
+    
+    def get(self, path, mtime_ns):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != mtime_ns:
+                # Replacing the entry drops the previous version of the file
+                snapshot = read_snapshot(path)
+                frames = snapshot.frames()
+                entry = self._entries[path] = (mtime_ns, snapshot, frames, ledger_fingerprint(*frames))
+                self.loads += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(path)
+            return entry[1], entry[2]
+    
+    def fingerprint(self, path, frames):
+        """ledger_fingerprint taken when `frames` were loaded, or None if they are not the cached frames."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[2][0] is not frames[0] or entry[2][1] is not frames[1]:
+                return None
+            return entry[3]
+    
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_cache():
+    """Process-wide cache of open snapshot files."""
+    return SnapshotCache()
+
+def open_snapshot(path, mtime_ns):
+    """Memory-mapped snapshot and its frames, reloaded whenever the file changes."""
+    return get_snapshot_cache().get(path, mtime_ns)
+
+class SnapshotBackend(StorageBackend):
+    """Ledger snapshot file (Arrow IPC or Parquet) used as a warm-start source.
+    
+    Appends rewrite the whole file, so this suits read-mostly use.
+    """
+    
+    name = "snapshot"
+    
+    def __init__(self, path):
+        self.path = path
+        self.revision = os.stat(path).st_mtime_ns
+    
+    def _open(self):
+        return open_snapshot(self.path, self.revision)
+    
+    def load(self):
+        return self._open()[1]
+    
+    def data_version(self, source, expenses_df, payments_df):
+        fingerprint = get_snapshot_cache().fingerprint(self.path, (expenses_df, payments_df))
+        if fingerprint is None:
+            return data_version(source, expenses_df, payments_df)
+        return (source,) + fingerprint
+    
+    def append_rows(self, title, rows):
+        snapshot, (expenses_df, payments_df) = self._open()
+        columns = EXPENSE_COLUMNS if title == "Expenses" else PAYMENT_COLUMNS
+        added = pd.DataFrame([list(row) for row in rows], columns=columns)
+        if title == "Expenses":
+            expenses_df = pd.concat([expenses_df.astype(object), added], ignore_index=True)
+        else:
+            payments_df = pd.concat([payments_df.astype(object), added], ignore_index=True)
+        save_snapshot(self.path, expenses_df, payments_df, snapshot.members)
+        self.revision = os.stat(self.path).st_mtime_ns
+    
+    def balance_arrays(self, members, splits):
+        snapshot = self._open()[0]
+        ledger = CompactLedger.from_snapshot(snapshot, members)
+        spent, adjustments, _ = ledger.balance_cents()
+        known = ledger.expense_buyer >= 0
+        split_codes = snapshot.split_codes(splits)[:ledger.n_expenses]
+        return spent / 100, adjustments / 100, splits.totals(split_codes[known], ledger.expense_cents[known] / 100)
+
+def save_snapshot(path, expenses_df, payments_df, members):
+    """Write a snapshot next to `path` and swap it in, so readers never see half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_snapshot(f, expenses_df, payments_df, members, fmt="parquet" if path.lower().endswith(".parquet") else "arrow")
+    os.replace(tmp_path, path)
+
+SYNC_NUMERIC_COLUMNS = {"Quantity", "Unit Price", "Amount"}
+
+def sqlite_row(row, columns):
+    """A row with its numeric cells as floats, as the REAL columns need them.
+    
+    A blank Quantity or Unit Price is stored as 0 (the column default); an
+    Amount or any other cell that is not a number raises ValueError.
+    """
+    row = list(row)
+    for i, column in enumerate(columns):
+        if column not in SYNC_NUMERIC_COLUMNS:
+            continue
+        value = row[i]
+        if column != "Amount" and (value is None or str(value).strip() == ""):
+            row[i] = 0.0
+            continue
+        try:
+            row[i] = float(str(value).replace(",", ""))
+        except ValueError:
+            raise ValueError(f"{column} {value!r} is not a number") from None
+        if not np.isfinite(row[i]):
+            raise ValueError(f"{column} {value!r} is not a number")
+    return row
+
+def _sync_key(row, columns):
+    """Comparable identity for a row, tolerant of sheet number formatting."""
+    key = []
+    for column, value in zip(columns, row):
+        if column in SYNC_NUMERIC_COLUMNS:
+            try:
+                key.append(round(float(value), 2))
+            except (TypeError, ValueError):
+                key.append(0.0)
+        else:
+            key.append("" if value is None else str(value).strip())
+    return tuple(key)
+
+def sync_local_with_sheet(local, sheet):
+    """Two-way sync between the SQLite backend and the Google Sheet.
+    
+    Rows present on only one side are copied to the other (duplicates are
+    matched by count, so repeated identical rows survive). Sheet rows whose
+    numbers don't parse are not pulled, and split expenses are not pushed
+    to a sheet without a Split column. Returns
+    `{title: (pulled_into_local, pushed_to_sheet, skipped)}`.
+    """
+    cache, handles = get_sheet_cache(sheet.id), get_worksheet_handles()
+    result = {}
+    for title, columns in (("Expenses", EXPENSE_COLUMNS), ("Payments", PAYMENT_COLUMNS)):
+        worksheet = handles.get(sheet, title)
+        # A direct load, not the cache: a failed read must raise, not look empty
+        sheet_df, snapshot = _full_load(worksheet)
+        sheet_df = sheet_df.reindex(columns=columns, fill_value="")
+        local_df = local.read(title)
+        sheet_rows = sheet_df.values.tolist()
+        local_rows = local_df.values.tolist()
+        
+        unmatched = {}  # key -> indices of local rows not yet matched to a sheet row
+        for i, row in enumerate(local_rows):
+            unmatched.setdefault(_sync_key(row, columns), []).append(i)
+        to_pull = []
+        for row in sheet_rows:
+            matches = unmatched.get(_sync_key(row, columns))
+            if matches:
+                matches.pop(0)
+            else:
+                to_pull.append(row)
+        leftover = sorted(i for indices in unmatched.values() for i in indices)
+        to_push = [local_rows[i] for i in leftover]
+        
+        skipped = 0
+        if to_pull:
+            pullable = []
+            for row in to_pull:
+                try:
+                    pullable.append(sqlite_row(row, columns))
+                except ValueError:
+                    skipped += 1
+            to_pull = pullable
+        if title == "Expenses" and to_push and not header_has_split(snapshot["header"]):
+            # Rows without a split fit the older seven columns; split ones wait for the header
+            split = columns.index(SPLIT_COLUMN)
+            skipped += sum(1 for row in to_push if row[split])
+            to_push = [row[:split] for row in to_push if not row[split]]
+        
+        if to_pull:
+            local.append_rows(title, to_pull)
+        if to_push:
+            worksheet.append_rows(to_push)
+            cache.invalidate(title)
+        result[title] = (len(to_pull), len(to_push), skipped)
+    return result
 
 # ============================================================================
 # DEMO DATA FUNCTIONS
 # ============================================================================
-def generate_demo_data():
-    """Generate demo data for testing without Google Sheets."""
+def generate_demo_data(members=None):
+    """Generate demo data for testing without Google Sheets.
+    
+    With another roster, the sample rows are reassigned to its members.
+    """
     expenses = pd.DataFrame([
         {"Date": "2024-01-15", "Item": "Transportation", "Buyer": "Fares Samer", "Quantity": 1, "Unit Price": 550.0, "Amount": 550.0, "Notes": "Bus rental"},
         {"Date": "2024-01-16", "Item": "Food", "Buyer": "Mohamed Tarek", "Quantity": 11, "Unit Price": 80.0, "Amount": 880.0, "Notes": "Lunch for team"},
@@ -330,96 +1578,132 @@ def generate_demo_data():
         {"Date": "2024-01-19", "Item": "Refreshments", "Buyer": "Yousef Ibrahim", "Quantity": 20, "Unit Price": 22.0, "Amount": 440.0, "Notes": "Water and snacks"},
         {"Date": "2024-01-20", "Item": "Documentation", "Buyer": "Mahmoud Sayed", "Quantity": 100, "Unit Price": 2.2, "Amount": 220.0, "Notes": "Printing costs"},
     ])
+    expenses[SPLIT_COLUMN] = ""  # every sample expense is shared by the whole group
     
     payments = pd.DataFrame([
         {"Date": "2024-01-21", "From": "Mohamed Tarek", "To": "Fares Samer", "Amount": 100.0, "Notes": "Partial payment"},
         {"Date": "2024-01-22", "From": "Yassin Sherif", "To": "Fares Samer", "Amount": 150.0, "Notes": "Settling up"},
     ])
     
+    if members is not None and list(members) != MEMBERS:
+        rename = {m: members[i % len(members)] for i, m in enumerate(MEMBERS)}
+        expenses["Buyer"] = expenses["Buyer"].map(rename)
+        payments["From"] = payments["From"].map(rename)
+        payments["To"] = payments["To"].map(rename)
+    
     return expenses, payments
 
 # ============================================================================
-# CALCULATION FUNCTIONS
+# GROUP REGISTRY
 # ============================================================================
-def calculate_balances(expenses_df, payments_df):
-    """Calculate per-person balances."""
-    balances = {member: {"spent": 0.0, "share": 0.0, "balance": 0.0} for member in MEMBERS}
-    
-    # Calculate total spent by each person
-    if not expenses_df.empty:
-        for _, row in expenses_df.iterrows():
-            buyer = row["Buyer"]
-            amount = float(row["Amount"])
-            if buyer in balances:
-                balances[buyer]["spent"] += amount
-    
-    # Calculate total expenses and per-person share
-    total_expenses = sum(b["spent"] for b in balances.values())
-    per_person_share = total_expenses / len(MEMBERS)
-    
-    for member in MEMBERS:
-        balances[member]["share"] = per_person_share
-        balances[member]["balance"] = balances[member]["spent"] - per_person_share
-    
-    # Apply payments
-    if not payments_df.empty:
-        for _, row in payments_df.iterrows():
-            from_person = row["From"]
-            to_person = row["To"]
-            amount = float(row["Amount"])
-            
-            if from_person in balances and to_person in balances:
-                balances[from_person]["balance"] += amount  # ✅ CORRECT
-                balances[to_person]["balance"] -= amount    # ✅ CORRECT
-    
-    return balances, total_expenses, per_person_share
-
-def calculate_settlement(balances):
-    """Calculate minimal settlement transfers."""
-    # Create lists of creditors (owed money) and debtors (owe money)
-    creditors = []
-    debtors = []
-    
-    for member, data in balances.items():
-        balance = round(data["balance"], 2)
-        if balance > 0.01:  # Creditor (is owed)
-            creditors.append({"name": member, "amount": balance})
-        elif balance < -0.01:  # Debtor (owes)
-            debtors.append({"name": member, "amount": -balance})
-    
-    # Sort by amount (descending)
-    creditors.sort(key=lambda x: x["amount"], reverse=True)
-    debtors.sort(key=lambda x: x["amount"], reverse=True)
-    
-    # Generate settlement plan
-    settlement_plan = []
-    
-    i, j = 0, 0
-    while i < len(debtors) and j < len(creditors):
-        debtor = debtors[i]
-        creditor = creditors[j]
-        
-        # Transfer the minimum of what debtor owes and what creditor is owed
-        transfer_amount = min(debtor["amount"], creditor["amount"])
-        
-        if transfer_amount > 0.01:  # Only record meaningful transfers
-            settlement_plan.append({
-                "from": debtor["name"],
-                "to": creditor["name"],
-                "amount": round(transfer_amount, 2)
-            })
-        
-        # Update amounts
-        debtor["amount"] -= transfer_amount
-        creditor["amount"] -= transfer_amount
-        
-        # Move to next if settled
-        if debtor["amount"] < 0.01:
-            i += 1
-        if creditor["amount"] < 0.01:
-            j += 1
-    
-    return settlement_plan
+class Group:
+    """One expense group: its roster and where its data lives."""
+    
+    def __init__(self, group_id, name, members, sheet_id=None, db_path=None, snapshot_path=None):
+        self.id = group_id
+        self.name = name
+        self.members = list(members)
+        self.member_index = {member: i for i, member in enumerate(self.members)}
+        self.sheet_id = sheet_id
+        self.db_path = db_path or f"expenses_{group_id}.db"
+        self.snapshot_path = snapshot_path or f"expenses_{group_id}.arrow"
+
+class GroupRegistry:
+    """All configured groups, plus an LRU of the ones with live in-memory state.
+    
+    Group configs are small and always kept; ledgers (and, through
+    max_entries on the cached resources, sheet caches and queues) only
+    exist for the most recently used `max_active` groups.
+    """
+    
+    def __init__(self, groups, max_active=GROUP_CACHE_MAX_ACTIVE):
+        self.groups = {group.id: group for group in groups}
+        self.max_active = max_active
+        self._lock = threading.Lock()
+        self._ledgers = OrderedDict()  # group id -> Ledger, least recently used first
+        self.evictions = 0
+    
+    def get(self, group_id):
+        return self.groups.get(group_id)
+    
+    def is_member(self, group_id, name):
+        group = self.groups.get(group_id)
+        return group is not None and name in group.member_index
+    
+    def ledger(self, group_id):
+        """The group's cached ledger, evicting the least recently used beyond max_active."""
+        with self._lock:
+            ledger = self._ledgers.get(group_id)
+            if ledger is None:
+                ledger = self._ledgers[group_id] = Ledger(self.groups[group_id].members)
+                while len(self._ledgers) > self.max_active:
+                    self._ledgers.popitem(last=False)
+                    self.evictions += 1
+            self._ledgers.move_to_end(group_id)
+            return ledger
+    
+    def active_count(self):
+        with self._lock:
+            return len(self._ledgers)
+
+def load_groups(path=GROUPS_CONFIG_PATH):
+    """Groups from the JSON config (a list of {id, name, members, sheet_id, db_path, snapshot_path}).
+    
+    The built-in team is always available as DEFAULT_GROUP_ID.
+    """
+    groups = [Group(DEFAULT_GROUP_ID, "Graduation Project", MEMBERS, sheet_id=SHEET_ID, db_path=LOCAL_DB_PATH)]
+    try:
+        with open(path) as f:
+            configs = json.load(f)
+    except FileNotFoundError:
+        return groups
+    for config in configs:
+        if config["id"] == DEFAULT_GROUP_ID:
+            continue
+        groups.append(Group(
+            config["id"], config.get("name", config["id"]), config["members"],
+            sheet_id=config.get("sheet_id"), db_path=config.get("db_path"),
+            snapshot_path=config.get("snapshot_path"),
+        ))
+    return groups
+
+@st.cache_resource(show_spinner=False)
+def get_group_registry():
+    """Process-wide group registry."""
+    return GroupRegistry(load_groups())
+
+def get_ledger(group=None, source=None):
+    """Return the incremental ledger for `group` (default: the built-in team).
+    
+    Persistent sources share one ledger per group across sessions; demo
+    data lives in each session, so its ledger does too.
+    """
+    group_id = group.id if group is not None else DEFAULT_GROUP_ID
+    if source == "demo":
+        ledgers = st.session_state.setdefault("demo_ledgers", {})
+        if group_id not in ledgers:
+            ledgers[group_id] = Ledger(group.members if group is not None else MEMBERS)
+        return ledgers[group_id]
+    return get_group_registry().ledger(group_id)
+
+def select_group(registry):
+    """Group chosen via the ?group= query parameter or the sidebar."""
+    group_id = st.query_params.get("group", DEFAULT_GROUP_ID)
+    if len(registry.groups) == 1:
+        pass
+    elif len(registry.groups) <= GROUP_PICKER_MAX_OPTIONS:
+        ids = list(registry.groups)
+        group_id = st.sidebar.selectbox(
+            "Group", ids, index=ids.index(group_id) if group_id in ids else 0,
+            format_func=lambda g: registry.groups[g].name,
+        )
+    else:
+        group_id = st.sidebar.text_input("Group ID", value=group_id).strip()
+    group = registry.get(group_id)
+    if group is None:
+        st.sidebar.error(f"Unknown group '{group_id}', showing the default group")
+        group = registry.get(DEFAULT_GROUP_ID)
+    return group
 
 # ============================================================================
 # VISUALIZATION FUNCTIONS
@@ -430,6 +1714,7 @@ def create_spending_chart(balances):
     spent = [balances[m]["spent"] for m in members]
     
     if PLOTLY_AVAILABLE:
+        import plotly.graph_objects as go
         fig = go.Figure(data=[
             go.Bar(
                 x=members,
@@ -460,6 +1745,7 @@ def create_balance_chart(balances):
     colors = ['#28a745' if b > 0 else '#dc3545' if b < 0 else '#6c757d' for b in balance_vals]
     
     if PLOTLY_AVAILABLE:
+        import plotly.graph_objects as go
         fig = go.Figure(data=[
             go.Bar(
                 x=members,
@@ -483,496 +1769,1197 @@ def create_balance_chart(balances):
     else:
         return None
 
+def history_dates(index):
+    """Month ends from the first to the last dated row, plus the last date itself."""
+    if index.first_date is None:
+        return []
+    month_ends = pd.date_range(index.first_date, index.last_date, freq="M").date.tolist()
+    return month_ends + [index.last_date] if index.last_date not in month_ends else month_ends
+
+def create_balance_history_chart(index):
+    """Create a line chart of each member's balance at every month end."""
+    dates = history_dates(index)
+    
+    if PLOTLY_AVAILABLE and dates:
+        import plotly.graph_objects as go
+        history = index.balance_history(dates) / 100
+        fig = go.Figure(data=[
+            go.Scatter(x=dates, y=history[:, i], mode='lines+markers', name=member)
+            for i, member in enumerate(index.members)
+        ])
+        fig.update_layout(
+            title="Balance over Time (Month End)",
+            xaxis_title="Date",
+            yaxis_title=f"Balance ({CURRENCY})",
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font=dict(size=12),
+            height=400
+        )
+        return fig
+    else:
+        return None
+
 # ============================================================================
-# VALIDATION FUNCTIONS
+# DERIVED STATE
 # ============================================================================
-def validate_amount(amount):
-    """Validate that amount is positive."""
+def style_balance(val):
+    """Colored HTML span for a balance value."""
     try:
-        amt = float(amount)
-        return amt > 0
+        v = float(val)
+        if v > 0.01:
+            return f'<span class="balance-positive">+{v:.2f} {CURRENCY}</span>'
+        elif v < -0.01:
+            return f'<span class="balance-negative">{v:.2f} {CURRENCY}</span>'
+        else:
+            return f'<span class="balance-zero">0.00 {CURRENCY}</span>'
     except:
-        return False
-
-def validate_member(name):
-    """Validate that name is in the member list."""
-    return name in MEMBERS
+        return val
 
-# ============================================================================
-# STREAMLIT APP
-# ============================================================================
-def main():
-    st.set_page_config(
-        page_title="Date Fruit Sorting - Expense Manager",
-        page_icon="🎓",
-        layout="wide"
+def build_balance_table_html(balances, members):
+    """HTML for the member balances table."""
+    rows = [
+        f'<tr><td>{member}</td><td>{balances[member]["spent"]:.2f} {CURRENCY}</td>'
+        f'<td>{balances[member]["share"]:.2f} {CURRENCY}</td><td>{style_balance(balances[member]["balance"])}</td></tr>'
+        for member in members
+    ]
+    return (
+        '<table class="balance-table"><thead><tr><th>Member</th><th>Spent</th><th>Share</th><th>Balance</th></tr></thead><tbody>'
+        + "".join(rows)
+        + '</tbody></table>'
     )
+
+def compute_derived_state(ledger, members, expenses_df):
+    """Balances, settlement plan, table HTML and figures for the dashboard.
     
-    apply_custom_css()
+    "version" is the ledger version the balances were taken at (None if
+    unconfirmed rows were in them). "unparsed_splits" lists the expenses
+    whose Split text does not parse, which the balances share equally.
+    """
+    version, (balances, total_expenses, per_person_share) = ledger.snapshot()
+    with trace_phase("split_check"):
+        unparsed_splits = find_unparsed_splits(ledger, expenses_df)
+    with trace_phase("settlement"):
+        settlement_plan = calculate_settlement(balances)
+    with trace_phase("table_html"):
+        table_html = build_balance_table_html(balances, members)
+    with trace_phase("figures"):
+        spending_chart = create_spending_chart(balances)
+        balance_chart = create_balance_chart(balances)
+    return {
+        "version": version,
+        "unparsed_splits": unparsed_splits,
+        "balances": balances,
+        "total_expenses": total_expenses,
+        "per_person_share": per_person_share,
+        "settlement_plan": settlement_plan,
+        "table_html": table_html,
+        "spending_chart": spending_chart,
+        "balance_chart": balance_chart,
+    }
+
+def find_unparsed_splits(ledger, expenses_df):
+    """(worksheet row, Split text) of expenses whose Split does not parse (header = row 1)."""
+    if SPLIT_COLUMN not in expenses_df.columns or expenses_df.empty:
+        return []
+    bad = np.flatnonzero(ledger.splits.unparsed(expenses_df[SPLIT_COLUMN]))
+    return [(int(i) + 2, str(split)) for i, split in zip(bad, expenses_df[SPLIT_COLUMN].iloc[bad])]
+
+def compute_history(ledger, expenses_df, payments_df):
+    """Date index behind the as-of view, and the balance-over-time chart."""
+    with trace_phase("date_index"):
+        balance_index = BalanceIndex.from_ledger(ledger.compact(expenses_df, payments_df))
+    with trace_phase("figures"):
+        history_chart = create_balance_history_chart(balance_index)
+    return {"balance_index": balance_index, "history_chart": history_chart}
+
+class DerivedStateCache:
+    """LRU of derived dashboard state keyed on (group, settlement mode, fingerprint)."""
     
-    # Header
-    st.markdown(f"""
-    <div class="main-header">
-        <h1>💰Graduation Project🎓</h1>
-        <p>Expense Manager - {len(MEMBERS)} Members</p>
-    </div>
-    """, unsafe_allow_html=True)
+    def __init__(self, max_entries=GROUP_CACHE_MAX_ACTIVE, name="derived"):
+        self.max_entries = max_entries
+        self.name = name  # prefix of this cache's counters in run traces
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
     
-    # Initialize session state
-    if "use_demo_data" not in st.session_state:
-        st.session_state.use_demo_data = False
-    if "demo_expenses" not in st.session_state:
-        st.session_state.demo_expenses, st.session_state.demo_payments = generate_demo_data()
+    def get(self, key, compute, keep=None):
+        """Cached value for `key`, or `compute()`; a computed value is stored unless `keep(value)` is false."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                trace_count(f"{self.name}_cache_hits")
+                return self._entries[key]
+            self.misses += 1
+            trace_count(f"{self.name}_cache_misses")
+        value = compute()
+        if keep is not None and not keep(value):
+            return value
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
     
-    # Connect to Google Sheets or use demo data
-    sheet = None
-    if GSPREAD_AVAILABLE and SHEET_ID != "YOUR_GOOGLE_SHEET_ID_HERE":
-        sheet = connect_to_sheet()
+    def invalidate(self, key):
+        """Drop one entry so its next lookup recomputes it."""
+        with self._lock:
+            self._entries.pop(key, None)
     
-    # Data source toggle
-    with st.sidebar:
-        st.image(DATE_MASCOT_GIF_URL, width=150)
-        st.markdown("### ⚙️ Settings")
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+@st.cache_resource(show_spinner=False)
+def get_derived_cache():
+    """Process-wide derived-state cache."""
+    return DerivedStateCache()
+
+# ============================================================================
+# EXPORTS
+# ============================================================================
+@contextmanager
+def download_file(write, suffix=""):
+    """Run `write(file)` into a temporary file and yield it reopened for reading.
+    
+    The file is deleted afterwards. Passing it to st.download_button means
+    the only full copy in memory is the one Streamlit serves.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        with open(path, "rb") as f:
+            yield f
+    finally:
+        os.remove(path)
+
+class ExportCache:
+    """Finished export files on disk, reused while the ledger and the export options are unchanged.
+    
+    Files are written a chunk at a time into the cache directory and only
+    registered once complete. Beyond `max_entries` files or `max_bytes` in
+    total, the least recently used are deleted.
+    """
+    
+    def __init__(self, directory=None, max_entries=EXPORT_CACHE_MAX_ENTRIES, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.directory = directory or tempfile.mkdtemp(prefix="expense_exports_")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (path, size), least recently used first
+        self.hits = 0
+        self.misses = 0
+    
+    def open(self, key, write, suffix=""):
+        """The cached file for `key` opened for reading, running `write(file)` to create it on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                try:
+                    f = open(entry[0], "rb")  # opened under the lock, so an eviction can't remove it first
+                except FileNotFoundError:
+                    del self._entries[key]  # removed from outside; written again below
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    trace_count("export_cache_hits")
+                    return f
+            self.misses += 1
+            trace_count("export_cache_misses")
         
-        if sheet is None:
-            st.warning("⚠️ Google Sheets not configured")
-            use_demo = st.checkbox("Use Demo Data", value=True)
-            st.session_state.use_demo_data = use_demo
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+        except BaseException:
+            os.remove(path)
+            raise
+        with self._lock:
+            if key in self._entries:
+                # Another session wrote the same file meanwhile: keep theirs, drop ours
+                os.remove(path)
+                path = self._entries[key][0]
+            else:
+                self._entries[key] = (path, os.path.getsize(path))
+                self._evict()
+            self._entries.move_to_end(key)
+            return open(path, "rb")
+    
+    def _evict(self):
+        # The newest file is kept even when it alone exceeds max_bytes
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes() > self.max_bytes
+        ):
+            _, (path, _) = self._entries.popitem(last=False)
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # already gone, or still open on a platform that can't delete open files
+    
+    def _bytes(self):
+        return sum(size for _, size in self._entries.values())
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "files": len(self._entries), "bytes": self._bytes()}
+
+@st.cache_resource(show_spinner=False)
+def get_export_cache():
+    """Process-wide cache of finished export files."""
+    return ExportCache()
+
+def export_report(report, fmt, expenses_df, payments_df, members, start=None, end=None, member=None, version=None):
+    """Report file (CSV or Excel) written chunk by chunk, opened for reading; use it as a context manager.
+    
+    With the ledger's data `version` the file comes from the export cache,
+    written only when that data has not been exported with these options
+    before; without it, it is a temporary file (see download_file).
+    """
+    def write(f):
+        chunks = report_chunks(report, expenses_df, payments_df, members, start, end, member)
+        if fmt == "Excel":
+            write_excel(f, {report: chunks})
         else:
-            st.success("✅ Connected to Google Sheets")
-            st.session_state.use_demo_data = False
+            write_csv(f, chunks)
+    
+    suffix = ".xlsx" if fmt == "Excel" else ".csv"
+    if version is None:
+        return download_file(write, suffix)
+    key = (version, report, fmt, start, end, member, SETTLEMENT_MODE, tuple(members))
+    return get_export_cache().open(key, write, suffix)
+
+# ============================================================================
+# VALIDATION FUNCTIONS
+# ============================================================================
+def validate_amount(amount):
+    """Validate that amount is positive."""
+    try:
+        amt = float(amount)
+        return amt > 0
+    except:
+        return False
+
+def validate_member(name, group=None):
+    """Validate that name is in the member list (of `group`, if given)."""
+    if group is not None:
+        return name in group.member_index
+    return name in MEMBERS
+
+# ============================================================================
+# LEDGER VIEW
+# ============================================================================
+def render_diagnostics():
+    """Sidebar panel: the latest run's phases and counters, and a one-run profiler."""
+    with st.sidebar.expander("🩺 Diagnostics"):
+        history = st.session_state.get("diagnostics", [])
+        if history:
+            last = history[-1]
+            st.caption(f"{last['run'].capitalize()} run at {last['timestamp'][11:19]}: {last['total_ms']:.0f} ms "
+                       "(nested phases are included in their parents)")
+            phases = sorted(last["phases_ms"].items(), key=lambda item: -item[1])
+            st.dataframe(pd.DataFrame(phases, columns=["Phase", "ms"]), hide_index=True, use_container_width=True)
+            if last["counters"]:
+                counters = pd.DataFrame(list(last["counters"].items()), columns=["Counter", "Value"])
+                st.dataframe(counters, hide_index=True, use_container_width=True)
+            if len(history) > 1:
+                st.caption(f"Last {len(history)} runs (ms)")
+                st.line_chart(pd.DataFrame({"total": [r["total_ms"] for r in history]}), height=120)
+        else:
+            st.caption("Timings appear here after the first run.")
+        if DIAGNOSTICS_LOG_PATH:
+            st.caption(f"Every run is logged to {DIAGNOSTICS_LOG_PATH}")
         
-        st.markdown("---")
-        st.markdown("### 👥 Team Members")
-        for i, member in enumerate(MEMBERS, 1):
-            st.markdown(f"{i}. {member}")
+        st.button("🔬 Profile next run", on_click=request_profile)
+        profile = st.session_state.get("last_profile")
+        if profile is not None:
+            st.caption(f"cProfile of the {profile['run']} run at {profile['timestamp']} (script thread only)")
+            st.code(profile["text"], language=None)
+
+def load_frames(backend):
+    """(expenses_df, payments_df) from the backend, or this session's demo data."""
+    if backend is None:
+        # Demo frames are replaced on every add, never mutated, so no copy is needed
+        return st.session_state.demo_expenses, st.session_state.demo_payments
+    return backend.load()
+
+@traced("render_summary")
+def render_summary(derived, expenses_df, payments_df):
+    """Summary metric cards."""
+    total_expenses, per_person_share = derived["total_expenses"], derived["per_person_share"]
     
-    # Load data
-    if st.session_state.use_demo_data:
-        expenses_df = st.session_state.demo_expenses.copy()
-        payments_df = st.session_state.demo_payments.copy()
-    elif sheet:
-        expenses_df = read_expenses_from_sheet(sheet)
-        payments_df = read_payments_from_sheet(sheet)
-    else:
-        expenses_df = pd.DataFrame(columns=["Date", "Item", "Buyer", "Amount", "Notes"])
-        payments_df = pd.DataFrame(columns=["Date", "From", "To", "Amount", "Notes"])
+    # Summary metrics
+    col1, col2, col3, col4 = st.columns(4)
     
-    # Calculate balances
-    balances, total_expenses, per_person_share = calculate_balances(expenses_df, payments_df)
-    settlement_plan = calculate_settlement(balances)
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Total Expenses</h3>
+            <p class="value">{total_expenses:.2f} {CURRENCY}</p>
+        </div>
+        """, unsafe_allow_html=True)
     
-    # Main tabs
-    tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "💰 Add Expense", "💸 Add Payment"])
+    with col2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Per Person Share</h3>
+            <p class="value">{per_person_share:.2f} {CURRENCY}</p>
+        </div>
+        """, unsafe_allow_html=True)
     
-    # ========================================================================
-    # TAB 1: DASHBOARD
-    # ========================================================================
-    with tab1:
-        # Summary metrics
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>Total Expenses</h3>
-                <p class="value">{total_expenses:.2f} {CURRENCY}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>Per Person Share</h3>
-                <p class="value">{per_person_share:.2f} {CURRENCY}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>Total Expenses</h3>
-                <p class="value">{len(expenses_df)}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col4:
+    with col3:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Total Expenses</h3>
+            <p class="value">{len(expenses_df)}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col4:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Total Payments</h3>
+            <p class="value">{len(payments_df)}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+
+@traced("render_balances")
+def render_balances(derived):
+    """Member balances table."""
+    # Balances table
+    st.subheader("💳 Member Balances")
+    
+    # Display table with HTML styling
+    st.markdown("""
+    <style>
+    .balance-table {
+        width: 100%;
+        border-collapse: collapse;
+        background: white;
+        border-radius: 10px;
+        overflow: hidden;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    .balance-table th {
+        background-color: #C41E3A;
+        color: white;
+        padding: 12px;
+        text-align: left;
+        font-weight: 600;
+    }
+    .balance-table td {
+        padding: 10px 12px;
+        border-bottom: 1px solid #f0f0f0;
+    }
+    .balance-table tr:hover {
+        background-color: #f8f9fa;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(derived["table_html"], unsafe_allow_html=True)
+    
+    st.markdown("---")
+
+@traced("render_charts")
+def render_charts(derived):
+    """Spending and balance charts."""
+    # Charts
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        spending_chart = derived["spending_chart"]
+        if spending_chart:
+            st.plotly_chart(spending_chart, use_container_width=True)
+        else:
+            st.info("Install plotly for interactive charts")
+    
+    with col2:
+        balance_chart = derived["balance_chart"]
+        if balance_chart:
+            st.plotly_chart(balance_chart, use_container_width=True)
+        else:
+            st.info("Install plotly for interactive charts")
+    
+    st.markdown("---")
+
+@st.fragment
+@traced("render_history")
+def render_history(derived_key, ledger, members, expenses_df, payments_df):
+    """As-of balances and the balance-over-time chart, built only while shown."""
+    if expenses_df.empty and payments_df.empty:
+        return
+    st.subheader("📅 Balance History")
+    # The date index is only built (and cached with the rest of the derived state) while shown
+    if st.toggle("Show balance history", key="show_history"):
+        history = get_derived_cache().get(
+            derived_key + ("history",),
+            lambda: compute_history(ledger, expenses_df, payments_df),
+        )
+        balance_index = history["balance_index"]
+        if balance_index.last_date is not None:
+            # Balances at a past date, from the date index
+            as_of = st.date_input(
+                "Balances as of",
+                value=balance_index.last_date,
+                min_value=balance_index.first_date,
+                help="Balances at the end of this day"
+            )
+            as_of_balances, as_of_total, _ = balance_index.balances_as_of(as_of)
+            st.caption(f"Total expenses up to {as_of}: {as_of_total:.2f} {CURRENCY}")
+            st.markdown(build_balance_table_html(as_of_balances, members), unsafe_allow_html=True)
+            
+            history_chart = history["history_chart"]
+            if history_chart:
+                st.plotly_chart(history_chart, use_container_width=True)
+            else:
+                st.info("Install plotly for interactive charts")
+    
+    st.markdown("---")
+
+@traced("render_settlement")
+def render_settlement(derived, derived_key):
+    """Settlement plan with recompute and CSV export."""
+    settlement_plan = derived["settlement_plan"]
+    
+    # Settlement Plan
+    st.subheader("🔄 Settlement Plan")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown("Minimal transfers to settle all balances:")
+    with col2:
+        st.button("🔄 Recompute Settlement", on_click=get_derived_cache().invalidate, args=(derived_key,))
+    
+    if not settlement_plan:
+        st.markdown("""
+        <div class="all-settled">
+            🎉 All Settled! No transfers needed.
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        for transfer in settlement_plan:
             st.markdown(f"""
-            <div class="metric-card">
-                <h3>Total Payments</h3>
-                <p class="value">{len(payments_df)}</p>
+            <div class="settlement-card">
+                <div class="transfer">
+                    {transfer['from']} ➜ {transfer['to']} : <strong>{transfer['amount']:.2f} {CURRENCY}</strong>
+                </div>
             </div>
             """, unsafe_allow_html=True)
-        
-        st.markdown("---")
-        
-        # Balances table
-        st.subheader("💳 Member Balances")
-        
-        balance_data = []
-        for member in MEMBERS:
-            bal = balances[member]
-            balance_data.append({
-                "Member": member,
-                "Spent": f"{bal['spent']:.2f}",
-                "Share": f"{bal['share']:.2f}",
-                "Balance": bal['balance']
-            })
-        
-        balance_df = pd.DataFrame(balance_data)
-        
-        # Style the balance column
-        def style_balance(val):
-            try:
-                v = float(val)
-                if v > 0.01:
-                    return f'<span class="balance-positive">+{v:.2f} {CURRENCY}</span>'
-                elif v < -0.01:
-                    return f'<span class="balance-negative">{v:.2f} {CURRENCY}</span>'
-                else:
-                    return f'<span class="balance-zero">0.00 {CURRENCY}</span>'
-            except:
-                return val
-        
-        # Display table with HTML styling
-        st.markdown("""
-        <style>
-        .balance-table {
-            width: 100%;
-            border-collapse: collapse;
-            background: white;
-            border-radius: 10px;
-            overflow: hidden;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .balance-table th {
-            background-color: #C41E3A;
-            color: white;
-            padding: 12px;
-            text-align: left;
-            font-weight: 600;
-        }
-        .balance-table td {
-            padding: 10px 12px;
-            border-bottom: 1px solid #f0f0f0;
-        }
-        .balance-table tr:hover {
-            background-color: #f8f9fa;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        html_table = '<table class="balance-table"><thead><tr><th>Member</th><th>Spent</th><th>Share</th><th>Balance</th></tr></thead><tbody>'
-        for _, row in balance_df.iterrows():
-            html_table += f'<tr><td>{row["Member"]}</td><td>{row["Spent"]} {CURRENCY}</td><td>{row["Share"]} {CURRENCY}</td><td>{style_balance(row["Balance"])}</td></tr>'
-        html_table += '</tbody></table>'
-        
-        st.markdown(html_table, unsafe_allow_html=True)
-        
-        st.markdown("---")
-        
-        # Charts
+
+    
+    st.markdown("---")
+
+@st.fragment
+@traced("render_export")
+def render_export(version, expenses_df, payments_df, members):
+    """Export any report as CSV or Excel, optionally limited to a date range and member."""
+    with st.expander("📤 Export Ledger & Reports"):
         col1, col2 = st.columns(2)
-        
         with col1:
-            spending_chart = create_spending_chart(balances)
-            if spending_chart:
-                st.plotly_chart(spending_chart, use_container_width=True)
-            else:
-                st.info("Install plotly for interactive charts")
-        
+            report = st.selectbox("Report", EXPORT_REPORTS, key="export_report")
+            member = st.selectbox("Member", ["All members"] + members, key="export_member")
         with col2:
-            balance_chart = create_balance_chart(balances)
-            if balance_chart:
-                st.plotly_chart(balance_chart, use_container_width=True)
-            else:
-                st.info("Install plotly for interactive charts")
-        
-        st.markdown("---")
-        
-        # Settlement Plan
-        st.subheader("🔄 Settlement Plan")
+            fmt = st.radio("Format", ["CSV", "Excel"] if EXCEL_AVAILABLE else ["CSV"], horizontal=True, key="export_format")
+            start = end = None
+            if st.checkbox("Limit to a date range", key="export_limit_dates"):
+                start = st.date_input("From", key="export_start")
+                end = st.date_input("To", key="export_end")
         
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.markdown("Minimal transfers to settle all balances:")
-        with col2:
-            if st.button("🔄 Recompute Settlement"):
-                st.rerun()
-        
-        if not settlement_plan:
-            st.markdown("""
-            <div class="all-settled">
-                🎉 All Settled! No transfers needed.
-            </div>
-            """, unsafe_allow_html=True)
+        # Reports are written a chunk at a time to a file, never built up in memory, and the
+        # file is kept for the next request with the same data and options
+        if st.button("📥 Prepare Export"):
+            try:
+                with export_report(
+                    report, fmt, expenses_df, payments_df, members, start, end,
+                    None if member == "All members" else member, version=version,
+                ) as data:
+                    extension = "xlsx" if fmt == "Excel" else "csv"
+                    st.download_button(
+                        label=f"Download {report} ({os.fstat(data.fileno()).st_size / 1024:.0f} KB)",
+                        data=data,
+                        file_name=f"{report.lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" if fmt == "Excel" else "text/csv"
+                    )
+            except Exception as e:
+                st.error(f"Error exporting {report.lower()}: {e}")
+    
+    st.markdown("---")
+
+def format_date(value):
+    """A ledger date for display: YYYY-MM-DD for parsed dates, as stored otherwise."""
+    if pd.isna(value):
+        return ""
+    return value.strftime("%Y-%m-%d") if isinstance(value, datetime) else value
+
+def format_split_note(split):
+    """Suffix naming who shares an expense that has a Split ("" when the whole group does)."""
+    if split is None or pd.isna(split) or not str(split):
+        return ""
+    return f" · split between {split}"
+
+def format_memory(title, memory):
+    """One worksheet's memory before and after typed loading, for the view caption."""
+    rows = max(memory["rows"], 1)
+    return (
+        f"{title}: {memory['typed'] / 1024:,.0f} KB typed vs {memory['raw'] / 1024:,.0f} KB raw "
+        f"({memory['typed'] / rows:.0f} vs {memory['raw'] / rows:.0f} B/row)"
+    )
+
+def expense_card(row):
+    """One Recent Expenses card."""
+    return (
+        '<div style="background: white; padding: 10px; border-radius: 8px; margin: 5px 0; border-left: 3px solid #C41E3A;">'
+        f"<strong>{row['Item']}</strong> - {row['Amount']:.2f} {CURRENCY}<br>"
+        f"<small>Paid by {row['Buyer']} on {format_date(row['Date'])}{format_split_note(row.get('Split'))}</small>"
+        "</div>"
+    )
+
+def payment_card(row):
+    """One Recent Payments card."""
+    return (
+        '<div style="background: white; padding: 10px; border-radius: 8px; margin: 5px 0; border-left: 3px solid #28a745;">'
+        f"<strong>{row['From']} ➜ {row['To']}</strong><br>"
+        f"{row['Amount']:.2f} {CURRENCY} on {format_date(row['Date'])}"
+        "</div>"
+    )
+
+def recent_pages_html(kind, df, recent, page_size, pages, data_key):
+    """HTML of the first `pages` pages of recent rows, one string per page.
+    
+    Pages already built for this data and page size are kept in session
+    state, so "Load more" only selects and formats the rows of the new page.
+    """
+    key = data_key + (page_size,)
+    cache = st.session_state.get("recent_html")
+    if cache is None or cache["key"] != key:
+        cache = st.session_state.recent_html = {"key": key, "expenses": [], "payments": []}
+    built = cache[kind]
+    card = expense_card if kind == "expenses" else payment_card
+    pages = min(pages, -(-len(df) // page_size))
+    for page in range(len(built), pages):
+        rows = df.iloc[recent.page(page * page_size, page_size)]
+        built.append("".join(card(row) for row in rows.to_dict("records")))
+    return built[:pages]
+
+@st.fragment
+@traced("render_recent")
+def render_recent(derived_key, ledger, expenses_df, payments_df):
+    """Recent expenses and payments, newest first, with paging."""
+    # Recent transactions, newest first by date (backdated rows land in place), from the
+    # ledger's CompactLedger: built on first view, then kept current by the form callbacks
+    with trace_phase("compact_ledger"):
+        compact = ledger.compact(expenses_df, payments_df)
+    page_size = st.selectbox("Recent transactions to show", RECENT_PAGE_SIZES, key="recent_page_size")
+    pages = st.session_state.get("recent_pages", 1)
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("📝 Recent Expenses")
+        if not expenses_df.empty:
+            for html in recent_pages_html("expenses", expenses_df, compact.recent("expenses"), page_size, pages, derived_key):
+                st.markdown(html, unsafe_allow_html=True)
         else:
-            for transfer in settlement_plan:
-                st.markdown(f"""
-                <div class="settlement-card">
-                    <div class="transfer">
-                        {transfer['from']} ➜ {transfer['to']} : <strong>{transfer['amount']:.2f} {CURRENCY}</strong>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            st.info("No expenses recorded yet")
+    
+    with col2:
+        st.subheader("💸 Recent Payments")
+        if not payments_df.empty:
+            for html in recent_pages_html("payments", payments_df, compact.recent("payments"), page_size, pages, derived_key):
+                st.markdown(html, unsafe_allow_html=True)
+        else:
+            st.info("No payments recorded yet")
+    
+    if page_size * pages < max(len(expenses_df), len(payments_df)):
+        st.button("⬇️ Load more", on_click=load_more_recent)
+
+def load_more_recent():
+    st.session_state.recent_pages = st.session_state.get("recent_pages", 1) + 1
+
+def show_form_result(key):
+    """Show (once) the message a form callback left in session state."""
+    result = st.session_state.pop(key, None)
+    if result is not None:
+        kind, message = result
+        if kind == "success":
+            st.success(message)
+            st.balloons()
+        else:
+            st.error(message)
+
+def submit_expense(group, source, backend, ledger):
+    """Expense form callback: validate and store the row before the view reruns."""
+    state = st.session_state
+    expense_item, expense_buyer = state.expense_item, state.expense_buyer
+    expense_quantity, expense_unit_price = state.expense_quantity, state.expense_unit_price
+    expense_amount = expense_quantity * expense_unit_price
+    
+    # Validation
+    if not expense_item.strip():
+        state.expense_result = ("error", "❌ Please enter an item description")
+        return
+    elif not validate_amount(expense_quantity):
+        state.expense_result = ("error", "❌ Quantity must be positive")
+        return
+    elif not validate_amount(expense_unit_price):
+        state.expense_result = ("error", "❌ Unit price must be positive")
+        return
+    elif not validate_member(expense_buyer, group):
+        state.expense_result = ("error", "❌ Invalid member selected")
+        return
+    
+    # Participants and weights become the row's Split text ("" = the whole group, equally)
+    try:
+        weights = [float(w) for w in state.expense_weights.split(",") if w.strip()] or None
+    except ValueError:
+        state.expense_result = ("error", "❌ Weights must be numbers separated by commas")
+        return
+    try:
+        expense_split = format_split(state.expense_participants, weights, group.members)
+    except ValueError as e:
+        state.expense_result = ("error", f"❌ Invalid split: {e}")
+        return
+    
+    # Add expense
+    date_str = state.expense_date.strftime("%Y-%m-%d")
+    if source == "demo":
+        new_expense = pd.DataFrame([{
+            "Date": date_str,
+            "Item": expense_item,
+            "Buyer": expense_buyer,
+            "Quantity": float(expense_quantity),
+            "Unit Price": float(expense_unit_price),
+            "Amount": float(expense_amount),
+            "Notes": state.expense_notes,
+            "Split": expense_split
+        }])
+        state.demo_expenses = pd.concat([state.demo_expenses, new_expense], ignore_index=True)
+        ledger.apply_expense(expense_buyer, expense_amount, split=expense_split, date=date_str)
+    elif backend is not None:
+        if expense_split and not backend.supports_splits():
+            state.expense_result = ("error", "❌ The Expenses sheet has no Split column; add a \"Split\" header in column H to record who shares an expense")
+            return
+        backend.append_expense(expense_row(date_str, expense_item, expense_buyer, expense_quantity, expense_unit_price, expense_amount, state.expense_notes, expense_split))
+        ledger.apply_expense(expense_buyer, expense_amount, split=expense_split, date=date_str)
+    else:
+        state.expense_result = ("error", "❌ No data source configured")
+        return
+    shared_by = f", split between {expense_split}" if expense_split else ""
+    state.expense_result = ("success", f"✅ Expense added successfully! {expense_buyer} paid {expense_amount:.2f} {CURRENCY} for {expense_quantity:.0f}x {expense_item}{shared_by}")
+
+def submit_payment(group, source, backend, ledger):
+    """Payment form callback: validate and store the row before the view reruns."""
+    state = st.session_state
+    payment_from, payment_to, payment_amount = state.payment_from, state.payment_to, state.payment_amount
+    
+    # Validation
+    if payment_from == payment_to:
+        state.payment_result = ("error", "❌ Payer and recipient cannot be the same person")
+        return
+    elif not validate_amount(payment_amount):
+        state.payment_result = ("error", "❌ Amount must be positive")
+        return
+    elif not validate_member(payment_from, group) or not validate_member(payment_to, group):
+        state.payment_result = ("error", "❌ Invalid member selected")
+        return
+    
+    # Add payment
+    date_str = state.payment_date.strftime("%Y-%m-%d")
+    if source == "demo":
+        new_payment = pd.DataFrame([{
+            "Date": date_str,
+            "From": payment_from,
+            "To": payment_to,
+            "Amount": float(payment_amount),
+            "Notes": state.payment_notes
+        }])
+        state.demo_payments = pd.concat([state.demo_payments, new_payment], ignore_index=True)
+        ledger.apply_payment(payment_from, payment_to, payment_amount, date=date_str)
+    elif backend is not None:
+        backend.append_payment(payment_row(date_str, payment_from, payment_to, payment_amount, state.payment_notes))
+        ledger.apply_payment(payment_from, payment_to, payment_amount, date=date_str)
+    else:
+        state.payment_result = ("error", "❌ No data source configured")
+        return
+    state.payment_result = ("success", f"✅ Payment recorded! {payment_from} paid {payment_amount:.2f} {CURRENCY} to {payment_to}")
+
+@traced("render_expense_form")
+def render_expense_form(group, source, backend, ledger):
+    """Add Expense tab."""
+    st.subheader("➕ Add New Expense")
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        with st.form("expense_form"):
+            st.date_input(
+                "Date",
+                value=datetime.now(),
+                help="Date of the expense",
+                key="expense_date"
+            )
+            
+            st.text_input(
+                "Item/Description",
+                placeholder="e.g., Transportation, Food, Equipment",
+                help="Brief description of the expense",
+                key="expense_item"
+            )
             
-            # Export settlement plan
-            if st.button("📥 Export Settlement Plan as CSV"):
-                settlement_df = pd.DataFrame(settlement_plan)
-                settlement_df.columns = ["From", "To", "Amount (EGP)"]
-                csv = settlement_df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name=f"settlement_plan_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
+            st.selectbox(
+                "Paid By",
+                options=group.members,
+                help="Who paid for this expense",
+                key="expense_buyer"
+            )
+            
+            st.multiselect(
+                "Split Between",
+                options=group.members,
+                help="Who shares this expense; leave empty to split it equally across the whole group",
+                key="expense_participants"
+            )
+            
+            st.text_input(
+                "Weights (Optional)",
+                placeholder="e.g., 2, 1, 1",
+                help="One weight per person in Split Between, in the same order; leave empty for equal parts",
+                key="expense_weights"
+            )
+            
+            col_qty, col_price = st.columns(2)
+            with col_qty:
+                expense_quantity = st.number_input(
+                    "Quantity",
+                    min_value=0.0,
+                    value=1.0,
+                    step=1.0,
+                    format="%.0f",
+                    help="Number of items",
+                    key="expense_quantity"
+                )
+            
+            with col_price:
+                expense_unit_price = st.number_input(
+                    f"Unit Price ({CURRENCY})",
+                    min_value=0.0,
+                    step=0.01,
+                    format="%.2f",
+                    help="Price per unit",
+                    key="expense_unit_price"
                 )
+            
+            # Auto-calculate total
+            expense_amount = expense_quantity * expense_unit_price
+            st.info(f"💰 **Total Amount: {expense_amount:.2f} {CURRENCY}**")
+            
+            st.text_area(
+                "Notes (Optional)",
+                placeholder="Additional details...",
+                help="Any additional information",
+                key="expense_notes"
+            )
+            
+            # Stored in the callback, so the submit costs one rerun instead of two
+            st.form_submit_button(
+                "💾 Add Expense",
+                on_click=submit_expense,
+                args=(group, source, backend, ledger)
+            )
+            show_form_result("expense_result")
+    
+    with col2:
+        st.info("""
+        ### 📌 Guidelines
+        - Enter accurate amounts
+        - Select the correct payer
+        - Add notes for clarity
+        - All amounts in EGP
+        """)
         
-        st.markdown("---")
+        st.image(DATE_MASCOT_GIF_URL, width=150)
+
+def import_expenses(source, backend, ledger):
+    """Bulk import callback: store every accepted row with one batched write."""
+    state = st.session_state
+    accepted_df = state.expense_import[1]
+    if source == "demo":
+        state.demo_expenses = pd.concat([state.demo_expenses, accepted_df], ignore_index=True)
+    elif backend is not None:
+        if (accepted_df["Split"] != "").any() and not backend.supports_splits():
+            state.import_result = ("error", "❌ The Expenses sheet has no Split column; add a \"Split\" header in column H to record who shares an expense")
+            return
+        try:
+            backend.append_rows("Expenses", accepted_df.values.tolist())
+        except Exception as e:
+            state.import_result = ("error", f"❌ Import failed: {e}")
+            return
+    else:
+        state.import_result = ("error", "❌ No data source configured")
+        return
+    ledger.apply_expenses(accepted_df["Buyer"], accepted_df["Amount"], splits=accepted_df["Split"],
+                          dates=accepted_df["Date"])
+    
+    # A new uploader key clears the file that was just imported
+    del state.expense_import
+    state.import_round = state.get("import_round", 0) + 1
+    state.import_result = ("success", f"✅ Imported {len(accepted_df):,} expenses totalling {accepted_df['Amount'].sum():,.2f} {CURRENCY}")
+
+@traced("render_expense_import")
+def render_expense_import(group, source, backend, ledger):
+    """Bulk import of expenses from a CSV or Excel file, validated a column at a time."""
+    with st.expander("📂 Bulk Import Expenses (CSV / Excel)"):
+        st.caption(f"Columns: {', '.join(EXPENSE_COLUMNS)}. Date, Buyer and Amount are required; "
+                   "Split lists who shares an expense (e.g. \"Fares Samer: 2; Mohamed Tarek: 1\"), empty for everyone.")
+        uploaded = st.file_uploader(
+            "Expenses file",
+            type=["csv", "xlsx"] if EXCEL_AVAILABLE else ["csv"],
+            key=f"import_file_{st.session_state.get('import_round', 0)}"
+        )
+        show_form_result("import_result")
+        if uploaded is None:
+            return
         
-        # Recent transactions
-        col1, col2 = st.columns(2)
+        # Parsed and validated once per upload, not on every rerun
+        parsed = st.session_state.get("expense_import")
+        if parsed is None or parsed[0] != (uploaded.file_id, group.id):
+            try:
+                accepted_df, errors_df = validate_expense_import(read_import_file(uploaded, uploaded.name), group.members)
+            except Exception as e:
+                st.error(f"Error reading {uploaded.name}: {e}")
+                return
+            parsed = ((uploaded.file_id, group.id), accepted_df, errors_df)
+            st.session_state.expense_import = parsed
+        _, accepted_df, errors_df = parsed
         
-        with col1:
-            st.subheader("📝 Recent Expenses")
-            if not expenses_df.empty:
-                recent_expenses = expenses_df.tail(5).sort_values("Date", ascending=False)
-                for _, row in recent_expenses.iterrows():
-                    st.markdown(f"""
-                    <div style="background: white; padding: 10px; border-radius: 8px; margin: 5px 0; border-left: 3px solid #C41E3A;">
-                        <strong>{row['Item']}</strong> - {row['Amount']:.2f} {CURRENCY}<br>
-                        <small>Paid by {row['Buyer']} on {row['Date']}</small>
-                    </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.info("No expenses recorded yet")
+        st.info(f"**{len(accepted_df):,}** rows ready to import, **{len(errors_df):,}** rejected")
+        if not errors_df.empty:
+            st.dataframe(errors_df, hide_index=True, use_container_width=True)
+        if not accepted_df.empty:
+            st.button(
+                f"💾 Import {len(accepted_df):,} Expenses",
+                on_click=import_expenses,
+                args=(source, backend, ledger)
+            )
+
+@traced("render_payment_form")
+def render_payment_form(group, source, backend, ledger, settlement_plan):
+    """Add Payment tab, with the top suggested transfers alongside."""
+    st.subheader("💸 Record Payment")
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        with st.form("payment_form"):
+            st.date_input(
+                "Date",
+                value=datetime.now(),
+                help="Date of the payment",
+                key="payment_date"
+            )
+            
+            col_a, col_b = st.columns(2)
+            with col_a:
+                st.selectbox(
+                    "From (Payer)",
+                    options=group.members,
+                    help="Who is making the payment",
+                    key="payment_from"
+                )
+            
+            with col_b:
+                st.selectbox(
+                    "To (Recipient)",
+                    options=group.members,
+                    help="Who is receiving the payment",
+                    key="payment_to"
+                )
+            
+            st.number_input(
+                f"Amount ({CURRENCY})",
+                min_value=0.0,
+                step=0.01,
+                format="%.2f",
+                help="Payment amount in EGP",
+                key="payment_amount"
+            )
+            
+            st.text_area(
+                "Notes (Optional)",
+                placeholder="Payment details...",
+                help="Any additional information",
+                key="payment_notes"
+            )
+            
+            st.form_submit_button(
+                "💾 Record Payment",
+                on_click=submit_payment,
+                args=(group, source, backend, ledger)
+            )
+            show_form_result("payment_result")
+    
+    with col2:
+        st.info("""
+        ### 💡 Quick Settle
+        Use the settlement plan in the Dashboard tab to see recommended transfers.
         
-        with col2:
-            st.subheader("💸 Recent Payments")
-            if not payments_df.empty:
-                recent_payments = payments_df.tail(5).sort_values("Date", ascending=False)
-                for _, row in recent_payments.iterrows():
-                    st.markdown(f"""
-                    <div style="background: white; padding: 10px; border-radius: 8px; margin: 5px 0; border-left: 3px solid #28a745;">
-                        <strong>{row['From']} ➜ {row['To']}</strong><br>
-                        {row['Amount']:.2f} {CURRENCY} on {row['Date']}
-                    </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.info("No payments recorded yet")
+        Record payments here as they happen to keep balances updated.
+        """)
+        
+        # Show current settlement suggestions
+        if settlement_plan:
+            st.markdown("### 🎯 Suggested Transfers:")
+            for i, transfer in enumerate(settlement_plan[:3], 1):
+                st.markdown(f"""
+                <div style="background: #fff3cd; padding: 8px; border-radius: 6px; margin: 5px 0; font-size: 0.9rem;">
+                    {i}. {transfer['from']} ➜ {transfer['to']}<br>
+                    <strong>{transfer['amount']:.2f} {CURRENCY}</strong>
+                </div>
+                """, unsafe_allow_html=True)
+
+@traced("ledger_view")
+@st.fragment
+@traced("ledger_view")
+def ledger_view(group, source, backend):
+    """Data load, balances, dashboard and forms: everything that changes with the ledger.
+    
+    The view is a fragment that loads its own data, so a form submit, an
+    import or Recompute Settlement reruns it (every section that shows the
+    ledger) but not the page around it: the CSS, sidebar, group picker and
+    sheet connection. Streamlit can only rerun the fragment a widget is in,
+    so the forms are plain sections of this fragment rather than fragments
+    of their own. The history, export and recent panels only read the
+    ledger; they are nested fragments whose widgets rerun just the panel,
+    with the frames of the view's last run.
+    """
+    started = time.perf_counter()
+    members = group.members
+    with trace_phase("load"):
+        try:
+            expenses_df, payments_df = load_frames(backend)
+        except SheetUnavailableError as e:
+            # Nothing cached to fall back on: say so rather than show an empty, "settled" ledger
+            st.error(f"❌ Could not load the {e.title} sheet from Google Sheets: {e.cause}. Retry in a moment.")
+            return
+    if backend is not None and getattr(backend, "stale", None):
+        for title, (loaded_at, error) in backend.stale.items():
+            since = f" from {loaded_at:%H:%M:%S}" if loaded_at is not None else ""
+            st.warning(f"⚠️ Google Sheets is unreachable ({error}); showing cached {title}{since}. "
+                       f"Retrying every {STALE_RETRY_INTERVAL} s.")
+    trace_count("expense_rows", len(expenses_df))
+    trace_count("payment_rows", len(payments_df))
+    
+    # Calculate balances (full rebuild only when the data changed other than by this view's own submits)
+    ledger = get_ledger(group, source)
+    # Backends hand back the fingerprints taken when the data was loaded, so an unchanged rerun hashes nothing
+    if backend is not None:
+        version = backend.data_version(source, expenses_df, payments_df)
+    else:
+        version = data_version(source, expenses_df, payments_df)
+    rebuilds = ledger.rebuilds
+    with trace_phase("ledger_sync"):
+        ledger.sync(expenses_df, payments_df, version, backend=backend)
+    trace_count("ledger_rebuilds", ledger.rebuilds - rebuilds)
+    
+    # Everything derived from the balances is reused while the data is unchanged; keyed on
+    # the same content fingerprint as the ledger, so an edit rebuilds both or neither. The
+    # ledger is shared, so balances another session synced to other data are shown but not kept
+    derived_cache = get_derived_cache()
+    derived_key = (group.id, SETTLEMENT_MODE) + version[1:]
+    derived = derived_cache.get(
+        derived_key,
+        lambda: compute_derived_state(ledger, members, expenses_df),
+        keep=lambda state: state["version"] == version,
+    )
+    
+    # Main tabs
+    tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "💰 Add Expense", "💸 Add Payment"])
+    
+    unparsed_splits = derived["unparsed_splits"]
+    trace_count("unparsed_splits", len(unparsed_splits))
+    if unparsed_splits:
+        examples = "; ".join(f"row {row}: \"{split}\"" for row, split in unparsed_splits[:3])
+        st.warning(f"⚠️ {len(unparsed_splits)} expense(s) have a Split that names a non-member, repeats a name "
+                   f"or has a bad weight ({examples}). They are shared equally by the whole group until corrected.")
+    
+    with tab1:
+        render_summary(derived, expenses_df, payments_df)
+        render_balances(derived)
+        render_charts(derived)
+        render_history(derived_key, ledger, members, expenses_df, payments_df)
+        render_settlement(derived, derived_key)
+        render_export(version, expenses_df, payments_df, members)
+        render_recent(derived_key, ledger, expenses_df, payments_df)
     
-    # ========================================================================
-    # TAB 2: ADD EXPENSE
-    # ========================================================================
     with tab2:
-        st.subheader("➕ Add New Expense")
+        render_expense_form(group, source, backend, ledger)
+        render_expense_import(group, source, backend, ledger)
+    
+    with tab3:
+        render_payment_form(group, source, backend, ledger, derived["settlement_plan"])
+    
+    # Cache figures and this view's server time (the full page's time is in the sidebar)
+    derived_stats = derived_cache.stats()
+    details = [f"Derived-state cache: {derived_stats['hit_ratio']:.0%} hits ({derived_stats['hits']}/{derived_stats['hits'] + derived_stats['misses']})"]
+    if backend is not None and backend.name == "sheet":
+        details.append(
+            f"Loaded sheets in {backend.timing['wall'] * 1000:.0f} ms "
+            f"(saved {backend.timing['saved'] * 1000:.0f} ms vs serial)"
+        )
+        details.extend(format_memory(title, memory) for title, memory in backend.memory_report().items() if memory)
+    details.append(f"⏱️ Ledger view: {(time.perf_counter() - started) * 1000:.0f} ms server time")
+    st.caption(" · ".join(details))
+
+# ============================================================================
+# STREAMLIT APP
+# ============================================================================
+@traced("page")
+def main():
+    started = time.perf_counter()
+    st.set_page_config(
+        page_title="Date Fruit Sorting - Expense Manager",
+        page_icon="🎓",
+        layout="wide"
+    )
+    
+    apply_custom_css()
+    
+    registry = get_group_registry()
+    
+    # Initialize session state
+    if "use_demo_data" not in st.session_state:
+        st.session_state.use_demo_data = False
+    
+    # Data source toggle
+    with st.sidebar:
+        st.image(DATE_MASCOT_GIF_URL, width=150)
+        st.markdown("### ⚙️ Settings")
         
-        col1, col2 = st.columns([2, 1])
+        group = select_group(registry)
+        members = group.members
         
-        with col1:
-            with st.form("expense_form"):
-                expense_date = st.date_input(
-                    "Date",
-                    value=datetime.now(),
-                    help="Date of the expense"
-                )
-                
-                expense_item = st.text_input(
-                    "Item/Description",
-                    placeholder="e.g., Transportation, Food, Equipment",
-                    help="Brief description of the expense"
-                )
-                
-                expense_buyer = st.selectbox(
-                    "Paid By",
-                    options=MEMBERS,
-                    help="Who paid for this expense"
-                )
-                
-                col_qty, col_price = st.columns(2)
-                with col_qty:
-                    expense_quantity = st.number_input(
-                        "Quantity",
-                        min_value=0.0,
-                        value=1.0,
-                        step=1.0,
-                        format="%.0f",
-                        help="Number of items"
-                    )
-                
-                with col_price:
-                    expense_unit_price = st.number_input(
-                        f"Unit Price ({CURRENCY})",
-                        min_value=0.0,
-                        step=0.01,
-                        format="%.2f",
-                        help="Price per unit"
-                    )
-                
-                # Auto-calculate total
-                expense_amount = expense_quantity * expense_unit_price
-                st.info(f"💰 **Total Amount: {expense_amount:.2f} {CURRENCY}**")
-                
-                expense_notes = st.text_area(
-                    "Notes (Optional)",
-                    placeholder="Additional details...",
-                    help="Any additional information"
-                )
-                
-                submit_expense = st.form_submit_button("💾 Add Expense")
-
-                if submit_expense:
-                    # Validation
-                    if not expense_item.strip():
-                        st.error("❌ Please enter an item description")
-                    elif not validate_amount(expense_quantity):
-                        st.error("❌ Quantity must be positive")
-                    elif not validate_amount(expense_unit_price):
-                        st.error("❌ Unit price must be positive")
-                    elif not validate_member(expense_buyer):
-                        st.error("❌ Invalid member selected")
-                    else:
-                        # Add expense
-                        date_str = expense_date.strftime("%Y-%m-%d")
-                        
-                        if st.session_state.use_demo_data:
-                            # Add to demo data
-                            new_expense = pd.DataFrame([{
-                                "Date": date_str,
-                                "Item": expense_item,
-                                "Buyer": expense_buyer,
-                                "Quantity": float(expense_quantity),
-                                "Unit Price": float(expense_unit_price),
-                                "Amount": float(expense_amount),
-                                "Notes": expense_notes
-                            }])
-                            st.session_state.demo_expenses = pd.concat([
-                                st.session_state.demo_expenses,
-                                new_expense
-                            ], ignore_index=True)
-                            st.success(f"✅ Expense added successfully! {expense_buyer} paid {expense_amount:.2f} {CURRENCY} for {expense_quantity:.0f}x {expense_item}")
-                            st.balloons()
-                            st.rerun()
-                        elif sheet:
-                            if write_expense_to_sheet(sheet, date_str, expense_item, expense_buyer, expense_quantity, expense_unit_price, expense_amount, expense_notes):
-                                st.success(f"✅ Expense added successfully! {expense_buyer} paid {expense_amount:.2f} {CURRENCY} for {expense_quantity:.0f}x {expense_item}")
-                                st.balloons()
-                                st.rerun()
-                        else:
-                            st.error("❌ No data source configured")
-                        
-                        with col2:
-                            st.info("""
-                            ### 📌 Guidelines
-                            - Enter accurate amounts
-                            - Select the correct payer
-                            - Add notes for clarity
-                            - All amounts in EGP
-                            """)
-                            
-                            st.image(DATE_MASCOT_GIF_URL, width=150)
-    
-    # ========================================================================
-    # TAB 3: ADD PAYMENT
-    # ========================================================================
-    with tab3:
-        st.subheader("💸 Record Payment")
+        # Connect to Google Sheets or use demo data
+        sheet = None
+        if GSPREAD_AVAILABLE and group.sheet_id and group.sheet_id != "YOUR_GOOGLE_SHEET_ID_HERE":
+            with trace_phase("connect"):
+                sheet = connect_to_sheet(group.sheet_id)
         
-        col1, col2 = st.columns([2, 1])
+        if sheet is None:
+            st.warning("⚠️ Google Sheets not configured")
+            sources = ["Local Database", "Demo Data"]
+        else:
+            st.success("✅ Connected to Google Sheets")
+            cache_stats = get_sheet_cache(group.sheet_id).stats()
+            st.caption(f"Sheet cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+            scheduler = get_request_scheduler()
+            scheduler_stats = scheduler.stats()
+            st.caption(
+                f"Sheets API: {scheduler.used('read')}/{SHEETS_READ_QUOTA} reads this minute · "
+                f"{scheduler_stats['coalesced']} coalesced · {scheduler_stats['retries']} retries · "
+                f"{scheduler_stats['throttled']} throttled"
+            )
+            write_queue = get_write_queue(group.sheet_id)
+            pending_writes, failed_writes = write_queue.pending_count(), write_queue.failed_count()
+            st.caption(f"⏳ Pending writes: {pending_writes}")
+            if failed_writes:
+                st.error(f"❌ Failed writes: {failed_writes}")
+                if st.button("🔁 Retry failed writes"):
+                    write_queue.retry_failed()
+            sources = ["Google Sheets", "Local Database"]
+        if SNAPSHOTS_AVAILABLE and os.path.exists(group.snapshot_path):
+            sources.insert(sources.index("Local Database") + 1, "Snapshot")
         
-        with col1:
-            with st.form("payment_form"):
-                payment_date = st.date_input(
-                    "Date",
-                    value=datetime.now(),
-                    help="Date of the payment"
-                )
-                
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    payment_from = st.selectbox(
-                        "From (Payer)",
-                        options=MEMBERS,
-                        help="Who is making the payment"
-                    )
-                
-                with col_b:
-                    payment_to = st.selectbox(
-                        "To (Recipient)",
-                        options=MEMBERS,
-                        help="Who is receiving the payment"
-                    )
-                
-                payment_amount = st.number_input(
-                    f"Amount ({CURRENCY})",
-                    min_value=0.0,
-                    step=0.01,
-                    format="%.2f",
-                    help="Payment amount in EGP"
-                )
-                
-                payment_notes = st.text_area(
-                    "Notes (Optional)",
-                    placeholder="Payment details...",
-                    help="Any additional information"
-                )
-                
-                submit_payment = st.form_submit_button("💾 Record Payment")
-                
-                if submit_payment:
-                    # Validation
-                    if payment_from == payment_to:
-                        st.error("❌ Payer and recipient cannot be the same person")
-                    elif not validate_amount(payment_amount):
-                        st.error("❌ Amount must be positive")
-                    elif not validate_member(payment_from) or not validate_member(payment_to):
-                        st.error("❌ Invalid member selected")
-                    else:
-                        # Add payment
-                        date_str = payment_date.strftime("%Y-%m-%d")
-                        
-                        if st.session_state.use_demo_data:
-                            # Add to demo data
-                            new_payment = pd.DataFrame([{
-                                "Date": date_str,
-                                "From": payment_from,
-                                "To": payment_to,
-                                "Amount": float(payment_amount),
-                                "Notes": payment_notes
-                            }])
-                            st.session_state.demo_payments = pd.concat([
-                                st.session_state.demo_payments,
-                                new_payment
-                            ], ignore_index=True)
-                            st.success(f"✅ Payment recorded! {payment_from} paid {payment_amount:.2f} {CURRENCY} to {payment_to}")
-                            st.balloons()
-                            st.rerun()
-                        elif sheet:
-                            if write_payment_to_sheet(sheet, date_str, payment_from, payment_to, payment_amount, payment_notes):
-                                st.success(f"✅ Payment recorded! {payment_from} paid {payment_amount:.2f} {CURRENCY} to {payment_to}")
-                                st.balloons()
-                                st.rerun()
-                        else:
-                            st.error("❌ No data source configured")
+        data_source = st.radio("Data Source", sources, index=len(sources) - 1 if sheet is None else 0)
+        st.session_state.use_demo_data = data_source == "Demo Data"
         
-        with col2:
-            st.info("""
-            ### 💡 Quick Settle
-            Use the settlement plan in the Dashboard tab to see recommended transfers.
-            
-            Record payments here as they happen to keep balances updated.
-            """)
-            
-            # Show current settlement suggestions
-            if settlement_plan:
-                st.markdown("### 🎯 Suggested Transfers:")
-                for i, transfer in enumerate(settlement_plan[:3], 1):
-                    st.markdown(f"""
-                    <div style="background: #fff3cd; padding: 8px; border-radius: 6px; margin: 5px 0; font-size: 0.9rem;">
-                        {i}. {transfer['from']} ➜ {transfer['to']}<br>
-                        <strong>{transfer['amount']:.2f} {CURRENCY}</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
+        if data_source == "Local Database" and sheet is not None:
+            if st.button("🔄 Sync with Google Sheets"):
+                try:
+                    synced = sync_local_with_sheet(get_local_backend(group.db_path), sheet)
+                    for title, (pulled, pushed, skipped) in synced.items():
+                        st.caption(f"{title}: {pulled} pulled, {pushed} pushed")
+                        if skipped:
+                            st.warning(f"⚠️ {title}: {skipped} row(s) not copied: sheet rows with an amount that "
+                                       "is not a number, or split expenses the sheet has no Split column for")
+                except Exception as e:
+                    st.error(f"Error syncing with Google Sheets: {e}")
+        
+        st.markdown("---")
+        st.markdown("### 👥 Team Members")
+        for i, member in enumerate(members, 1):
+            st.markdown(f"{i}. {member}")
+    
+    # Header
+    st.markdown(f"""
+    <div class="main-header">
+        <h1>💰{group.name}🎓</h1>
+        <p>Expense Manager - {len(members)} Members</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if st.session_state.get("demo_group") != group.id:
+        st.session_state.demo_expenses, st.session_state.demo_payments = generate_demo_data(members)
+        st.session_state.demo_group = group.id
+    
+    # Pick the backend; the data itself is loaded inside the ledger view
+    backend = None
+    if st.session_state.use_demo_data:
+        source = "demo"
+    else:
+        if data_source == "Local Database":
+            backend = get_local_backend(group.db_path)
+        elif data_source == "Snapshot":
+            backend = SnapshotBackend(group.snapshot_path)
+        else:
+            backend = SheetBackend(sheet, get_write_queue(group.sheet_id), members)
+        source = backend.name
+    
+    # Ledger snapshots: full export/import, and a warm-start file per group
+    if SNAPSHOTS_AVAILABLE:
+        with st.sidebar.expander("💾 Ledger Snapshot"):
+            if st.button("Save as warm-start snapshot"):
+                try:
+                    expenses_df, payments_df = load_frames(backend)
+                    save_snapshot(group.snapshot_path, expenses_df, payments_df, members)
+                    st.success(f"Saved {len(expenses_df) + len(payments_df)} rows to {group.snapshot_path}")
+                except Exception as e:
+                    st.error(f"Error saving snapshot: {e}")
+            if st.button("📥 Export Snapshot"):
+                try:
+                    frames = load_frames(backend)
+                    with download_file(lambda f: write_snapshot(f, *frames, members), ".arrow") as data:
+                        st.download_button(
+                            label="Download snapshot",
+                            data=data,
+                            file_name=f"ledger_{group.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.arrow",
+                            mime="application/vnd.apache.arrow.file"
+                        )
+                except Exception as e:
+                    st.error(f"Error exporting snapshot: {e}")
+            uploaded = st.file_uploader("Import snapshot", type=["arrow", "parquet"])
+            upload_key = (group.id, uploaded.name, uploaded.size) if uploaded is not None else None
+            if upload_key is not None and st.session_state.get("imported_snapshot") != upload_key:
+                try:
+                    snapshot = read_snapshot(uploaded.getvalue())  # validated before anything is replaced
+                    save_snapshot(group.snapshot_path, *snapshot.frames(), members)
+                    st.session_state.imported_snapshot = upload_key
+                    st.success(f"Imported {snapshot.expense_rows} expenses and {snapshot.payment_rows} payments; "
+                               "pick \"Snapshot\" as the data source to use them")
+                except Exception as e:
+                    st.error(f"Error importing snapshot: {e}")
+    
+    ledger_view(group, source, backend)
     
     # Footer
     st.markdown("---")
@@ -982,13 +2969,9 @@ def main():
         <p style="font-size: 0.9rem;">Made with ❤️ by Youssef Ossama</p>
     </div>
     """, unsafe_allow_html=True)
+    
+    st.sidebar.caption(f"⏱️ Full page run: {(time.perf_counter() - started) * 1000:.0f} ms server time")
 
 if __name__ == "__main__":
     main()
-
-
-
-
-
-
-
+    render_diagnostics()  # after main() has finished, so it shows this run
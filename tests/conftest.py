@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The app modules live at the repository root, next to this directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture(autouse=True)
+def no_diagnostics_log(monkeypatch):
+    """Runs are not logged to a file unless a test asks for it (see diagnostics_log)."""
+    monkeypatch.delenv("EXPENSES_DIAGNOSTICS_LOG", raising=False)
+
+
+@pytest.fixture
+def diagnostics_log(monkeypatch, tmp_path):
+    """Log the app's runs to a file under tmp_path; the fixture's value is its path."""
+    path = tmp_path / "diagnostics.jsonl"
+    monkeypatch.setenv("EXPENSES_DIAGNOSTICS_LOG", str(path))
+    return path
@@ -0,0 +1,114 @@
+"""The Streamlit app end to end on the demo data (streamlit.testing AppTest)."""
+import json
+import os
+import re
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "group_expenses_app.py")
+
+
+@pytest.fixture
+def app():
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    assert not at.exception, at.exception
+    return at
+
+
+def total_expenses(at):
+    for block in at.markdown:
+        match = re.search(r"Total Expenses</h3>\s*<p class=\"value\">([\d.]+)", block.value)
+        if match:
+            return float(match.group(1))
+    raise AssertionError("no Total Expenses card")
+
+
+def demo_ledger(at):
+    (ledger,) = at.session_state.demo_ledgers.values()
+    return ledger
+
+
+def test_submitted_expense_is_applied_without_rebuild(app):
+    before = total_expenses(app)
+    rebuilds = demo_ledger(app).rebuilds
+
+    app.text_input(key="expense_item").input("Pizza")
+    app.number_input(key="expense_unit_price").set_value(90.0)
+    next(b for b in app.button if "Add Expense" in b.label).click()
+    app.run()
+
+    assert not app.exception, app.exception
+    assert total_expenses(app) == pytest.approx(before + 90.0)
+    assert demo_ledger(app).rebuilds == rebuilds
+
+
+def test_row_edited_in_place_is_picked_up(app):
+    before = total_expenses(app)
+    rebuilds = demo_ledger(app).rebuilds
+
+    expenses = app.session_state.demo_expenses
+    expenses.loc[expenses.index[0], "Amount"] = float(expenses["Amount"].iloc[0]) + 1000.0
+    app.run()
+
+    assert not app.exception, app.exception
+    assert total_expenses(app) == pytest.approx(before + 1000.0)
+    assert demo_ledger(app).rebuilds == rebuilds + 1
+
+
+def test_balance_history_is_built_only_when_shown(app):
+    assert not [d for d in app.date_input if d.label == "Balances as of"]
+
+    app.toggle(key="show_history").set_value(True)
+    app.run()
+
+    assert not app.exception, app.exception
+    (as_of,) = [d for d in app.date_input if d.label == "Balances as of"]
+    assert as_of.value is not None
+
+
+def recent_expense_cards(at):
+    return sum(block.value.count("Paid by") for block in at.markdown)
+
+
+def test_load_more_formats_only_the_new_page(app):
+    page_size = app.selectbox(key="recent_page_size").value
+    assert recent_expense_cards(app) == page_size
+    first_page = app.session_state.recent_html["expenses"][0]
+
+    next(b for b in app.button if "Load more" in b.label).click()
+    app.run()
+
+    assert not app.exception, app.exception
+    assert recent_expense_cards(app) == min(2 * page_size, len(app.session_state.demo_expenses))
+    pages = app.session_state.recent_html["expenses"]
+    assert len(pages) == 2
+    assert pages[0] is first_page  # reused, not rebuilt
+
+
+def test_recent_cards_follow_an_item_edit(app):
+    expenses = app.session_state.demo_expenses
+    newest = expenses["Date"].astype(str).idxmax()
+    expenses.loc[newest, "Item"] = "Renamed item"
+    app.run()
+
+    assert not app.exception, app.exception
+    assert any("Renamed item" in block.value for block in app.markdown)
+
+
+def test_runs_are_logged_only_where_asked(diagnostics_log):
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    assert not at.exception, at.exception
+
+    records = [json.loads(line) for line in diagnostics_log.read_text().splitlines()]
+    assert records and records[-1]["run"] == "page"
+
+
+def test_unparseable_split_is_pointed_out(app):
+    assert not [warning for warning in app.warning if "Split" in warning.value]
+    expenses = app.session_state.demo_expenses
+    expenses.loc[expenses.index[0], "Split"] = "Somebody Else"
+    app.run()
+
+    assert not app.exception, app.exception
+    assert any("row 2: \"Somebody Else\"" in warning.value for warning in app.warning)
@@ -0,0 +1,105 @@
+"""Date-indexed balances against recomputing the balances of the rows in range."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from expense_core import EXPENSE_COLUMNS, MEMBERS, PAYMENT_COLUMNS, BalanceIndex, Ledger
+
+MEMBERS_3 = MEMBERS[:3]
+SPLITS = ["", "", f"{MEMBERS[0]}; {MEMBERS[1]}", f"{MEMBERS[0]}: 1; {MEMBERS[1]}: 1; {MEMBERS[2]}: 1",
+          f"{MEMBERS[1]}: 2; {MEMBERS[2]}: 1"]
+
+
+def random_ledger(seed, n_expenses=300, n_payments=60, days=30):
+    rng = np.random.default_rng(seed)
+    dates = pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, days, n_expenses), unit="D")
+    expenses = pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Item": "Item",
+        "Buyer": rng.choice(MEMBERS_3, n_expenses),
+        "Quantity": 1.0,
+        "Unit Price": 0.0,
+        "Amount": rng.integers(1, 100_00, n_expenses) / 100,  # odd cents, so shares need rounding
+        "Notes": "",
+        "Split": rng.choice(SPLITS, n_expenses),
+    }, columns=EXPENSE_COLUMNS)
+    expenses["Unit Price"] = expenses["Amount"]
+    pay_dates = pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, days, n_payments), unit="D")
+    pairs = rng.permuted(np.tile(np.arange(3), (n_payments, 1)), axis=1)[:, :2]
+    payments = pd.DataFrame({
+        "Date": pay_dates.strftime("%Y-%m-%d"),
+        "From": np.array(MEMBERS_3)[pairs[:, 0]],
+        "To": np.array(MEMBERS_3)[pairs[:, 1]],
+        "Amount": rng.integers(1, 50_00, n_payments) / 100,
+        "Notes": "",
+    }, columns=PAYMENT_COLUMNS)
+    return expenses, payments
+
+
+def synced_ledger(expenses, payments):
+    ledger = Ledger(MEMBERS_3)
+    ledger.rebuild(expenses, payments)
+    return ledger
+
+
+def balance_index(expenses, payments):
+    return BalanceIndex.from_ledger(synced_ledger(expenses, payments).compact(expenses, payments))
+
+
+def recomputed(expenses, payments):
+    """Whole-cent balances of just these rows, as the ledger computes them."""
+    return synced_ledger(expenses, payments).balances()
+
+
+def rows_in(df, start=None, end=None, through=None):
+    dates = pd.to_datetime(df["Date"])
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates < pd.Timestamp(end)
+    if through is not None:
+        keep &= dates <= pd.Timestamp(through)
+    return df[keep]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_range_balances_match_a_recompute_of_the_rows_in_range(seed):
+    expenses, payments = random_ledger(seed)
+    index = balance_index(expenses, payments)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(20):
+        start, end = sorted(pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 31, 2), unit="D"))
+        expected = recomputed(rows_in(expenses, start, end), rows_in(payments, start, end))
+        assert index.balances_between(start, end) == expected  # to the cent
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_as_of_balances_match_a_recompute_of_the_rows_so_far(seed):
+    expenses, payments = random_ledger(seed)
+    index = balance_index(expenses, payments)
+
+    for day in pd.date_range("2023-12-31", "2024-01-31"):
+        expected = recomputed(rows_in(expenses, through=day), rows_in(payments, through=day))
+        assert index.balances_as_of(day) == expected
+
+
+def test_balance_history_matches_balances_as_of():
+    expenses, payments = random_ledger(7)
+    index = balance_index(expenses, payments)
+    days = list(pd.date_range("2024-01-01", "2024-01-30", freq="3D"))
+
+    history = index.balance_history(days)
+
+    for day, row in zip(days, history):
+        balances = index.balances_as_of(day)[0]
+        assert row.tolist() == [round(balances[m]["balance"] * 100) for m in MEMBERS_3]
+        assert row.sum() == 0
+
+
+def test_empty_range_has_no_balances():
+    index = balance_index(*random_ledger(0))
+    balances, total, _ = index.balances_between("2024-01-10", "2024-01-10")
+    assert total == 0
+    assert all(b["balance"] == 0 for b in balances.values())
@@ -0,0 +1,111 @@
+"""The vectorized balance engine against the original row-by-row loop."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from expense_core import EXPENSE_COLUMNS, MEMBERS, PAYMENT_COLUMNS, calculate_balances
+
+
+def calculate_balances_iterrows(expenses_df, payments_df):
+    """The original calculate_balances, kept here as the reference implementation."""
+    balances = {member: {"spent": 0.0, "share": 0.0, "balance": 0.0} for member in MEMBERS}
+
+    # Calculate total spent by each person
+    if not expenses_df.empty:
+        for _, row in expenses_df.iterrows():
+            buyer = row["Buyer"]
+            amount = float(row["Amount"])
+            if buyer in balances:
+                balances[buyer]["spent"] += amount
+
+    # Calculate total expenses and per-person share
+    total_expenses = sum(b["spent"] for b in balances.values())
+    per_person_share = total_expenses / len(MEMBERS)
+
+    for member in MEMBERS:
+        balances[member]["share"] = per_person_share
+        balances[member]["balance"] = balances[member]["spent"] - per_person_share
+
+    # Apply payments
+    if not payments_df.empty:
+        for _, row in payments_df.iterrows():
+            from_person = row["From"]
+            to_person = row["To"]
+            amount = float(row["Amount"])
+
+            if from_person in balances and to_person in balances:
+                balances[from_person]["balance"] += amount
+                balances[to_person]["balance"] -= amount
+
+    return balances, total_expenses, per_person_share
+
+
+def random_ledger(n_expenses, n_payments, seed=0):
+    """Expenses and payments over the roster plus a couple of names outside it."""
+    rng = np.random.default_rng(seed)
+    names = np.array(MEMBERS + ["Former Member", "Guest"], dtype=object)
+    expenses = pd.DataFrame({
+        "Date": "2024-01-15",
+        "Item": "Item",
+        "Buyer": names[rng.integers(0, len(names), n_expenses)],
+        "Quantity": 1.0,
+        "Unit Price": 0.0,
+        "Amount": np.round(rng.uniform(1, 1000, n_expenses), 2),
+        "Notes": "",
+    })
+    expenses["Unit Price"] = expenses["Amount"]
+    payments = pd.DataFrame({
+        "Date": "2024-01-20",
+        "From": names[rng.integers(0, len(names), n_payments)],
+        "To": names[rng.integers(0, len(names), n_payments)],
+        "Amount": np.round(rng.uniform(1, 500, n_payments), 2),
+        "Notes": "",
+    })
+    return expenses, payments
+
+
+def assert_same_balances(result, expected):
+    balances, total_expenses, per_person_share = result
+    expected_balances, expected_total, expected_share = expected
+    assert list(balances) == list(expected_balances)
+    assert total_expenses == pytest.approx(expected_total)
+    assert per_person_share == pytest.approx(expected_share)
+    for member, values in expected_balances.items():
+        for field in ("spent", "share", "balance"):
+            assert balances[member][field] == pytest.approx(values[field], abs=1e-6), (member, field)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_iterrows(seed):
+    expenses, payments = random_ledger(2000, 500, seed)
+    assert_same_balances(calculate_balances(expenses, payments), calculate_balances_iterrows(expenses, payments))
+
+
+def test_matches_iterrows_on_sheet_strings():
+    # Sheets hand back numbers as text when a cell is formatted as plain text
+    expenses, payments = random_ledger(300, 100)
+    expenses["Amount"] = expenses["Amount"].map(str)
+    payments["Amount"] = payments["Amount"].map(str)
+    assert_same_balances(calculate_balances(expenses, payments), calculate_balances_iterrows(expenses, payments))
+
+
+def test_matches_iterrows_on_empty_ledger():
+    expenses, payments = pd.DataFrame(columns=EXPENSE_COLUMNS), pd.DataFrame(columns=PAYMENT_COLUMNS)
+    assert_same_balances(calculate_balances(expenses, payments), calculate_balances_iterrows(expenses, payments))
+
+
+def test_balances_sum_to_zero():
+    expenses, payments = random_ledger(1000, 300, seed=3)
+    balances, _, _ = calculate_balances(expenses, payments)
+    assert sum(b["balance"] for b in balances.values()) == pytest.approx(0.0, abs=1e-6)
+
+
+@pytest.mark.parametrize("bad", ["abc", ""])
+def test_unparseable_amount_raises_like_iterrows(bad):
+    expenses, payments = random_ledger(50, 10)
+    expenses["Amount"] = expenses["Amount"].astype(object)
+    expenses.loc[7, "Amount"] = bad
+    with pytest.raises(ValueError):
+        calculate_balances_iterrows(expenses, payments)
+    with pytest.raises(ValueError, match="invalid Amount"):
+        calculate_balances(expenses, payments)
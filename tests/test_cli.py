@@ -0,0 +1,49 @@
+"""expense_cli: roster selection and reporting."""
+import json
+
+import pytest
+
+import expense_cli
+from expense_core import MEMBERS
+
+
+@pytest.fixture
+def expenses_csv(tmp_path):
+    path = tmp_path / "expenses.csv"
+    path.write_text(f"Buyer,Amount\n{MEMBERS[0]},110\nGuest,10\n", encoding="utf-8")
+    return str(path)
+
+
+def run_json(capsys, *argv):
+    assert expense_cli.main([*argv, "--json", "--quiet"]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+def test_roster_defaults_to_the_app_members(expenses_csv, capsys):
+    result = run_json(capsys, expenses_csv)
+    assert list(result["balances"]) == MEMBERS
+    assert result["per_person_share"] == pytest.approx(110 / len(MEMBERS))
+
+
+def test_discover_members_takes_the_roster_from_the_data(expenses_csv, capsys):
+    result = run_json(capsys, expenses_csv, "--discover-members")
+    assert sorted(result["balances"]) == sorted([MEMBERS[0], "Guest"])
+
+
+@pytest.mark.parametrize("roster", [["--members", " , "], ["--members-file", "EMPTY"]])
+def test_empty_roster_is_an_error(expenses_csv, tmp_path, roster):
+    empty = tmp_path / "roster.txt"
+    empty.write_text("\n", encoding="utf-8")
+    argv = [expenses_csv] + [str(empty) if arg == "EMPTY" else arg for arg in roster]
+    with pytest.raises(SystemExit, match="empty"):
+        expense_cli.main(argv)
+
+
+def test_unparseable_splits_are_reported(tmp_path, capsys):
+    path = tmp_path / "expenses.csv"
+    path.write_text(f"Buyer,Amount,Split\n{MEMBERS[0]},90,{MEMBERS[0]}; Nobody\n{MEMBERS[1]},30,\n",
+                    encoding="utf-8")
+    assert expense_cli.main([str(path), "--json", "--quiet"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out)["unparsed_splits"] == [f"{MEMBERS[0]}; Nobody"]
+    assert "1 Split value(s) do not parse" in err
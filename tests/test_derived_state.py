@@ -0,0 +1,43 @@
+"""Derived dashboard state cached per ledger version on a ledger shared by sessions."""
+import pandas as pd
+
+import group_expenses_app as app
+
+
+def frames(amount):
+    expenses = pd.DataFrame([["2024-01-15", "Bus", app.MEMBERS[0], 1.0, amount, amount, "", ""]],
+                            columns=app.EXPENSE_COLUMNS)
+    return expenses, pd.DataFrame(columns=app.PAYMENT_COLUMNS)
+
+
+def test_state_of_another_sessions_version_is_not_cached():
+    ledger = app.Ledger()
+    cache = app.DerivedStateCache()
+    old, new = frames(550.0), frames(990.0)
+    old_version, new_version = app.data_version("sheet", *old), app.data_version("sheet", *new)
+    ledger.sync(*old, old_version)
+    ledger.sync(*new, new_version)  # another session re-synced between this session's sync and lookup
+
+    def lookup(version):
+        return cache.get(version, lambda: app.compute_derived_state(ledger, app.MEMBERS, new[0]),
+                         keep=lambda state: state["version"] == version)
+
+    assert lookup(old_version)["total_expenses"] == 990.0
+    lookup(old_version)
+    assert cache.stats()["misses"] == 2  # the other version's state was not kept under this key
+
+    state = lookup(new_version)
+    assert lookup(new_version) is state
+    assert cache.stats()["hits"] == 1
+
+
+def test_unparseable_splits_are_listed_with_their_sheet_rows():
+    expenses, payments = frames(90.0)
+    expenses = pd.concat([expenses] * 3, ignore_index=True)
+    expenses[app.SPLIT_COLUMN] = ["", f"{app.MEMBERS[0]}; Nobody", f"{app.MEMBERS[1]}: -1"]
+    ledger = app.Ledger()
+    ledger.sync(expenses, payments, app.data_version("demo", expenses, payments))
+
+    state = app.compute_derived_state(ledger, app.MEMBERS, expenses)
+
+    assert state["unparsed_splits"] == [(3, f"{app.MEMBERS[0]}; Nobody"), (4, f"{app.MEMBERS[1]}: -1")]
@@ -0,0 +1,105 @@
+"""Report exports: written chunk by chunk to a file, temporary or kept in the on-disk export cache."""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import group_expenses_app as app
+from expense_core import EXCEL_AVAILABLE, MEMBERS
+
+
+@pytest.fixture
+def frames():
+    return app.generate_demo_data()
+
+
+@pytest.mark.parametrize("report", ["Expenses", "Payments", "Balances", "Settlement"])
+def test_csv_export_matches_the_report(frames, report):
+    expected = pd.concat(list(app.report_chunks(report, *frames, MEMBERS)), ignore_index=True)
+    with app.export_report(report, "CSV", *frames, MEMBERS) as f:
+        path = f.name
+        exported = pd.read_csv(io.BytesIO(f.read()))
+    assert not os.path.exists(path)
+    assert len(exported) == len(expected)
+    assert list(exported.columns) == list(expected.columns)
+
+
+def test_export_is_written_in_chunks(frames, monkeypatch):
+    expenses, payments = frames
+    monkeypatch.setattr(app, "report_chunks", lambda *args: (expenses.iloc[i:i + 2] for i in range(0, len(expenses), 2)))
+    with app.export_report("Expenses", "CSV", expenses, payments, MEMBERS) as f:
+        exported = pd.read_csv(f)
+    assert exported["Amount"].tolist() == expenses["Amount"].tolist()
+
+
+@pytest.mark.skipif(not EXCEL_AVAILABLE, reason="openpyxl is not installed")
+def test_excel_export(frames):
+    with app.export_report("Balances", "Excel", *frames, MEMBERS) as f:
+        exported = pd.read_excel(f, engine="openpyxl")
+    assert exported["Member"].tolist() == MEMBERS
+
+
+@pytest.fixture
+def export_cache(monkeypatch, tmp_path):
+    cache = app.ExportCache(str(tmp_path / "exports"), max_entries=3)
+    monkeypatch.setattr(app, "get_export_cache", lambda: cache)
+    return cache
+
+
+def counting_report_chunks(monkeypatch):
+    calls = []
+    report_chunks = app.report_chunks
+
+    def counted(*args):
+        calls.append(args[0])
+        return report_chunks(*args)
+    monkeypatch.setattr(app, "report_chunks", counted)
+    return calls
+
+
+def test_repeat_export_of_unchanged_data_reuses_the_file(frames, export_cache, monkeypatch):
+    calls = counting_report_chunks(monkeypatch)
+    with app.export_report("Expenses", "CSV", *frames, MEMBERS, version=("demo", 1)) as f:
+        first, path = f.read(), f.name
+    with app.export_report("Expenses", "CSV", *frames, MEMBERS, version=("demo", 1)) as f:
+        assert f.read() == first
+
+    assert calls == ["Expenses"]
+    assert os.path.exists(path)
+    assert export_cache.stats()["hits"] == 1
+
+
+def test_other_data_or_options_write_a_new_file(frames, export_cache, monkeypatch):
+    calls = counting_report_chunks(monkeypatch)
+    for version, member in [(("demo", 1), None), (("demo", 2), None), (("demo", 2), MEMBERS[0])]:
+        with app.export_report("Expenses", "CSV", *frames, MEMBERS, member=member, version=version):
+            pass
+    assert len(calls) == 3
+    assert len(export_cache) == 3
+
+
+def test_least_recently_used_files_are_deleted_beyond_the_caps(frames, export_cache):
+    paths = []
+    for i in range(4):
+        with app.export_report("Payments", "CSV", *frames, MEMBERS, version=("demo", i)) as f:
+            paths.append(f.name)
+    assert len(export_cache) == 3
+    assert [os.path.exists(path) for path in paths] == [False, True, True, True]
+
+    export_cache.max_bytes = os.path.getsize(paths[-1])
+    with app.export_report("Payments", "CSV", *frames, MEMBERS, version=("demo", 4)) as f:
+        pass
+    assert len(export_cache) == 1  # the newest file is kept even when it alone is over the cap
+    assert sorted(os.listdir(export_cache.directory)) == [os.path.basename(f.name)]
+
+
+def test_failed_export_leaves_nothing_behind(frames, export_cache, monkeypatch):
+    def failing(*args):
+        raise RuntimeError("boom")
+        yield
+    monkeypatch.setattr(app, "report_chunks", failing)
+    with pytest.raises(RuntimeError):
+        app.export_report("Expenses", "CSV", *frames, MEMBERS, version=("demo", 1))
+    assert len(export_cache) == 0
+    assert os.listdir(export_cache.directory) == []
@@ -0,0 +1,62 @@
+"""Group registry: per-group rosters and ledgers, kept for the most recently used groups."""
+import json
+
+import group_expenses_app as app
+
+FLAT = app.Group("flat", "Flat", ["Ann", "Ben"])
+TRIP = app.Group("trip", "Trip", ["Cat", "Dan", "Eve"])
+CLUB = app.Group("club", "Club", ["Fay", "Gus"])
+
+
+def test_least_recently_used_ledger_is_evicted():
+    registry = app.GroupRegistry([FLAT, TRIP, CLUB], max_active=2)
+    flat = registry.ledger("flat")
+    trip = registry.ledger("trip")
+    assert registry.ledger("flat") is flat  # now the most recently used
+
+    registry.ledger("club")
+
+    assert registry.active_count() == 2
+    assert registry.evictions == 1
+    assert registry.ledger("flat") is flat
+    assert registry.ledger("trip") is not trip  # evicted, so built afresh
+    assert registry.evictions == 2
+
+
+def test_evicted_group_keeps_its_config():
+    registry = app.GroupRegistry([FLAT, TRIP], max_active=1)
+    registry.ledger("flat")
+    registry.ledger("trip")
+    assert registry.get("flat") is FLAT
+    assert registry.is_member("flat", "Ann")
+
+
+def test_groups_do_not_share_state():
+    registry = app.GroupRegistry([FLAT, TRIP])
+    flat, trip = registry.ledger("flat"), registry.ledger("trip")
+
+    flat.apply_expense("Ann", 100)
+
+    assert flat.members == ["Ann", "Ben"]
+    assert trip.members == ["Cat", "Dan", "Eve"]
+    assert flat.balances()[1] == 100.0
+    assert trip.balances()[1] == 0.0
+    assert registry.is_member("trip", "Cat") and not registry.is_member("trip", "Ann")
+    assert not registry.is_member("nowhere", "Ann")
+    assert registry.get("nowhere") is None
+
+
+def test_groups_config_adds_to_the_default_group(tmp_path):
+    path = tmp_path / "groups.json"
+    path.write_text(json.dumps([
+        {"id": "trip", "name": "Trip", "members": TRIP.members, "sheet_id": "abc"},
+        {"id": app.DEFAULT_GROUP_ID, "members": ["Nobody"]},
+    ]))
+
+    groups = {group.id: group for group in app.load_groups(path)}
+
+    assert list(groups) == [app.DEFAULT_GROUP_ID, "trip"]
+    assert groups[app.DEFAULT_GROUP_ID].members == app.MEMBERS
+    assert groups["trip"].sheet_id == "abc"
+    assert groups["trip"].db_path == "expenses_trip.db"
+    assert [group.id for group in app.load_groups(tmp_path / "missing.json")] == [app.DEFAULT_GROUP_ID]
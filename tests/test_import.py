@@ -0,0 +1,68 @@
+"""Bulk import validation: required columns, derived Quantity/Unit Price and per-row errors."""
+import io
+
+import pandas as pd
+import pytest
+
+from expense_core import EXPENSE_COLUMNS, MEMBERS, read_import_file, validate_expense_import
+
+
+def import_frame(csv):
+    return read_import_file(io.StringIO(csv), "expenses.csv")
+
+
+def test_missing_required_column_is_an_error():
+    with pytest.raises(ValueError, match="Missing column.*Amount"):
+        validate_expense_import(import_frame(f"Date,Buyer\n2024-01-15,{MEMBERS[0]}\n"))
+
+
+def test_unit_price_is_derived_from_amount_and_quantity():
+    accepted, errors = validate_expense_import(import_frame(
+        "Date,Item,Buyer,Quantity,Amount\n"
+        f"2024-01-15,Lunch,{MEMBERS[0]},11,880\n"
+        f"2024-01-16,Bus,{MEMBERS[1]},1,550\n"
+    ))
+    assert errors.empty
+    assert list(accepted.columns) == EXPENSE_COLUMNS
+    assert accepted["Unit Price"].tolist() == [80.0, 550.0]
+    assert accepted["Quantity"].tolist() == [11.0, 1.0]
+
+
+def test_quantity_is_derived_from_amount_and_unit_price():
+    accepted, errors = validate_expense_import(import_frame(
+        f"Date,Buyer,Unit Price,Amount\n2024-01-15,{MEMBERS[0]},80,880\n"
+    ))
+    assert errors.empty
+    assert accepted["Quantity"].tolist() == [11.0]
+
+
+def test_without_quantity_and_unit_price_a_row_is_one_times_amount():
+    accepted, errors = validate_expense_import(import_frame(f"Date,Buyer,Amount\n2024-01-15,{MEMBERS[0]},1200\n"))
+    assert errors.empty
+    assert accepted[["Quantity", "Unit Price", "Amount"]].values.tolist() == [[1.0, 1200.0, 1200.0]]
+
+
+def test_rejected_rows_list_every_reason_with_file_row_numbers():
+    accepted, errors = validate_expense_import(import_frame(
+        "Date,Item,Buyer,Quantity,Unit Price,Amount,Split\n"
+        f"2024-01-15,Lunch,{MEMBERS[0]},11,80,880,\n"
+        f"2024-01-16,Tools,{MEMBERS[1]},3,400,1000,\n"
+        "not a date,Bus,Nobody,1,abc,abc,\n"
+        f"2024-01-18,Water,{MEMBERS[2]},2,10,20,Nobody; {MEMBERS[2]}\n"
+    ))
+    assert accepted["Item"].tolist() == ["Lunch"]
+    assert errors["Row"].tolist() == [3, 4, 5]
+    reasons = dict(zip(errors["Row"], errors["Errors"]))
+    assert reasons[3] == "Amount is not Quantity x Unit Price"
+    for reason in ["Date is missing", "Buyer is not a group member", "Amount must be a positive number",
+                   "Unit Price must be a positive number"]:
+        assert reason in reasons[4]
+    assert reasons[5].startswith("Split has a non-member")
+
+
+def test_accepted_split_text_is_canonical():
+    accepted, _ = validate_expense_import(pd.DataFrame({
+        "Date": ["2024-01-15"], "Buyer": [MEMBERS[0]], "Amount": ["90"],
+        "Split": [f"{MEMBERS[1]}: 1;  {MEMBERS[0]}: 2"],
+    }))
+    assert accepted["Split"].tolist() == [f"{MEMBERS[0]}: 2; {MEMBERS[1]}: 1"]
@@ -0,0 +1,152 @@
+"""Incremental ledger: deltas, confirmation against reloaded data, and rebuilds."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from expense_core import (
+    EXPENSE_COLUMNS,
+    MEMBERS,
+    PAYMENT_COLUMNS,
+    CompactLedger,
+    Ledger,
+    calculate_balances,
+    data_version,
+)
+
+
+def ledger_frames():
+    expenses = pd.DataFrame([
+        ["2024-01-15", "Transportation", MEMBERS[0], 1.0, 550.0, 550.0, "", ""],
+        ["2024-01-16", "Food", MEMBERS[1], 11.0, 80.0, 880.0, "", ""],
+        ["2024-01-17", "Equipment", MEMBERS[2], 3.0, 400.0, 1200.0, "", f"{MEMBERS[2]}; {MEMBERS[3]}"],
+    ], columns=EXPENSE_COLUMNS)
+    payments = pd.DataFrame([
+        ["2024-01-21", MEMBERS[1], MEMBERS[0], 100.0, ""],
+    ], columns=PAYMENT_COLUMNS)
+    return expenses, payments
+
+
+def synced(expenses, payments):
+    ledger = Ledger()
+    ledger.sync(expenses, payments, data_version("test", expenses, payments))
+    return ledger
+
+
+def assert_matches_frames(ledger, expenses, payments):
+    balances, total, _ = ledger.balances()
+    expected, expected_total, _ = calculate_balances(expenses, payments)
+    assert total == pytest.approx(expected_total)
+    for member in MEMBERS:
+        assert balances[member]["balance"] == pytest.approx(expected[member]["balance"], abs=0.01)
+
+
+def test_edit_in_place_rebuilds():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    edited = expenses.copy()
+    edited.loc[0, "Amount"] = 5550.0  # same row count, different content
+    ledger.sync(edited, payments, data_version("test", edited, payments))
+    assert ledger.rebuilds == 2
+    assert ledger.total == pytest.approx(7630.0)
+    assert_matches_frames(ledger, edited, payments)
+
+
+def test_applied_rows_are_confirmed_without_rebuild():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    split = f"{MEMBERS[0]}: 2; {MEMBERS[4]}: 1"
+    ledger.apply_expense(MEMBERS[5], 90.0, split=split)
+    ledger.apply_payment(MEMBERS[2], MEMBERS[0], 25.0)
+    expenses = pd.concat([expenses, pd.DataFrame(
+        [["2024-02-01", "Snacks", MEMBERS[5], 1.0, 90.0, 90.0, "", split]], columns=EXPENSE_COLUMNS)],
+        ignore_index=True)
+    payments = pd.concat([payments, pd.DataFrame(
+        [["2024-02-02", MEMBERS[2], MEMBERS[0], 25.0, ""]], columns=PAYMENT_COLUMNS)], ignore_index=True)
+    ledger.sync(expenses, payments, data_version("test", expenses, payments))
+    assert ledger.rebuilds == 1
+    assert ledger.version == data_version("test", expenses, payments)
+    assert_matches_frames(ledger, expenses, payments)
+
+
+def test_applied_rows_with_an_edit_rebuild():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    ledger.apply_expense(MEMBERS[5], 90.0)
+    expenses = pd.concat([expenses, pd.DataFrame(
+        [["2024-02-01", "Snacks", MEMBERS[5], 1.0, 90.0, 90.0, "", ""]], columns=EXPENSE_COLUMNS)],
+        ignore_index=True)
+    expenses.loc[1, "Buyer"] = MEMBERS[6]  # someone fixed an older row meanwhile
+    ledger.sync(expenses, payments, data_version("test", expenses, payments))
+    assert ledger.rebuilds == 2
+    assert_matches_frames(ledger, expenses, payments)
+
+
+def test_applied_row_missing_from_data_rebuilds():
+    # e.g. the write was dropped: the data is unchanged, so the delta must be undone
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    ledger.apply_expense(MEMBERS[5], 90.0)
+    ledger.sync(expenses, payments, data_version("test", expenses, payments))
+    assert ledger.rebuilds == 2
+    assert_matches_frames(ledger, expenses, payments)
+
+
+def test_fingerprint_sees_reordered_rows():
+    expenses, payments = ledger_frames()
+    swapped = expenses.iloc[[1, 0, 2]].reset_index(drop=True)
+    assert data_version("test", swapped, payments) != data_version("test", expenses, payments)
+
+
+def test_compact_ledger_follows_applied_rows():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    compact = ledger.compact(expenses, payments)
+    compact.recent("expenses")  # built before the appends, so they must extend it
+    split = f"{MEMBERS[0]}; {MEMBERS[4]}"
+    ledger.apply_expense(MEMBERS[5], 90.0, split=split, date="2024-01-16")
+    ledger.apply_payment(MEMBERS[2], MEMBERS[0], 25.0, date="2024-02-02")
+    expenses = pd.concat([expenses, pd.DataFrame(
+        [["2024-01-16", "Snacks", MEMBERS[5], 1.0, 90.0, 90.0, "", split]], columns=EXPENSE_COLUMNS)],
+        ignore_index=True)
+    payments = pd.concat([payments, pd.DataFrame(
+        [["2024-02-02", MEMBERS[2], MEMBERS[0], 25.0, ""]], columns=PAYMENT_COLUMNS)], ignore_index=True)
+    ledger.sync(expenses, payments, data_version("test", expenses, payments))
+
+    assert ledger.compact(expenses, payments) is compact
+    fresh = CompactLedger.from_frames(expenses, payments)
+    assert all(map(np.array_equal, compact.balance_cents(), fresh.balance_cents()))
+    assert compact.recent("expenses").page(0, 10) == fresh.recent("expenses").page(0, 10)
+
+
+def test_rebuild_drops_the_compact_ledger():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    compact = ledger.compact(expenses, payments)
+    edited = expenses.copy()
+    edited.loc[0, "Amount"] = 5550.0
+    ledger.sync(edited, payments, data_version("test", edited, payments))
+    rebuilt = ledger.compact(edited, payments)
+    assert rebuilt is not compact
+    assert rebuilt.balance_cents()[0].sum() == 763000
+
+
+def test_applied_row_without_a_date_drops_the_compact_ledger():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    compact = ledger.compact(expenses, payments)
+    ledger.apply_payment(MEMBERS[2], MEMBERS[0], 25.0)
+    payments = pd.concat([payments, pd.DataFrame(
+        [["2024-02-02", MEMBERS[2], MEMBERS[0], 25.0, ""]], columns=PAYMENT_COLUMNS)], ignore_index=True)
+    ledger.sync(expenses, payments, data_version("test", expenses, payments))
+    assert ledger.compact(expenses, payments) is not compact
+    assert ledger.compact(expenses, payments).n_payments == 2
+
+
+def test_snapshot_has_no_version_while_rows_await_a_sync():
+    expenses, payments = ledger_frames()
+    ledger = synced(expenses, payments)
+    assert ledger.snapshot() == (ledger.version, ledger.balances())
+    ledger.apply_expense(MEMBERS[5], 90.0)
+    version, balances = ledger.snapshot()
+    assert version is None
+    assert balances[1] == pytest.approx(2720.0)
@@ -0,0 +1,66 @@
+"""Two-way sync between the local SQLite database and a Google Sheet."""
+import pytest
+
+import group_expenses_app as app
+from expense_core import calculate_balances
+from fake_sheets import FakeSheetsServer
+
+LEGACY_COLUMNS = app.EXPENSE_COLUMNS[:app.EXPENSE_COLUMNS.index(app.SPLIT_COLUMN)]
+SPLIT = f"{app.MEMBERS[0]}; {app.MEMBERS[1]}"
+
+
+def spreadsheet(expenses, payments=()):
+    return FakeSheetsServer().create("sheet", {"Expenses": list(expenses), "Payments": [app.PAYMENT_COLUMNS, *payments]})
+
+
+def test_rows_missing_on_either_side_are_copied():
+    sheet = spreadsheet([app.EXPENSE_COLUMNS, ["2024-01-15", "Bus", app.MEMBERS[0], 1, 550, 550, "", ""]])
+    local = app.SQLiteBackend(":memory:")
+    local.append_expense(app.expense_row("2024-01-16", "Lunch", app.MEMBERS[1], 2, 45, 90, "", SPLIT))
+
+    assert app.sync_local_with_sheet(local, sheet) == {"Expenses": (1, 1, 0), "Payments": (0, 0, 0)}
+    assert local.read("Expenses")["Item"].tolist() == ["Lunch", "Bus"]
+    assert sheet.worksheet("Expenses").rows[-1][-1] == SPLIT
+    assert app.sync_local_with_sheet(local, sheet)["Expenses"] == (0, 0, 0)
+
+
+def test_split_expenses_are_not_pushed_to_a_sheet_without_a_split_column():
+    sheet = spreadsheet([LEGACY_COLUMNS])
+    local = app.SQLiteBackend(":memory:")
+    local.append_rows("Expenses", [
+        app.expense_row("2024-01-15", "Bus", app.MEMBERS[0], 1, 550, 550, ""),
+        app.expense_row("2024-01-16", "Lunch", app.MEMBERS[1], 2, 45, 90, "", SPLIT),
+    ])
+
+    assert app.sync_local_with_sheet(local, sheet)["Expenses"] == (0, 1, 1)
+    rows = sheet.worksheet("Expenses").rows
+    assert rows[1] == ["2024-01-15", "Bus", app.MEMBERS[0], "1", "550", "550", ""]
+    assert len(rows) == 2
+
+
+def test_sheet_rows_with_bad_numbers_are_not_pulled():
+    sheet = spreadsheet([
+        app.EXPENSE_COLUMNS,
+        ["2024-01-15", "Bus", app.MEMBERS[0], "", "", 550, "", ""],
+        ["2024-01-16", "Lunch", app.MEMBERS[1], 1, 90, "", "", ""],
+    ], [["2024-01-17", app.MEMBERS[1], app.MEMBERS[0], "ten", ""]])
+    local = app.SQLiteBackend(":memory:")
+
+    synced = app.sync_local_with_sheet(local, sheet)
+
+    assert synced == {"Expenses": (1, 0, 1), "Payments": (0, 0, 1)}
+    expenses = local.read("Expenses")
+    assert expenses[["Quantity", "Unit Price", "Amount"]].values.tolist() == [[0.0, 0.0, 550.0]]
+    assert calculate_balances(*local.load())[1] == 550.0
+
+
+def test_sqlite_rejects_a_non_numeric_amount():
+    local = app.SQLiteBackend(":memory:")
+    with pytest.raises(ValueError, match="Amount"):
+        local.append_rows("Payments", [["2024-01-17", app.MEMBERS[1], app.MEMBERS[0], "", ""]])
+    assert local.read("Payments").empty
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        app.StorageBackend()
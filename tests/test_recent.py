@@ -0,0 +1,36 @@
+"""RecentRows: newest-first row order against a full sort."""
+import numpy as np
+import pytest
+
+from expense_core import NO_DATE, RecentRows
+
+
+def newest_first(days):
+    """Positions by date descending, later rows first on the same date, undated rows last."""
+    days = np.asarray(days)
+    dated = np.where(days == NO_DATE, -(1 << 40), days)
+    return np.lexsort((-np.arange(len(days)), -dated)).tolist()
+
+
+@pytest.fixture
+def days():
+    rng = np.random.default_rng(0)
+    days = rng.integers(19000, 19100, 5000)
+    days[rng.random(len(days)) < 0.01] = NO_DATE
+    return days
+
+
+def test_pages_match_a_full_sort(days):
+    recent = RecentRows(days, keep=50)
+    expected = newest_first(days)
+    assert recent.page(0, 50) == expected[:50]
+    assert recent.page(40, 25) == expected[40:65]  # crosses the end of the kept head
+    assert recent.page(4990, 25) == expected[4990:]
+
+
+def test_appends_land_in_place(days):
+    recent = RecentRows(days[:4000], keep=50)
+    for day in days[4000:4100]:
+        recent.append(day)  # one row at a time, as the form callbacks add them
+    recent.extend(days[4100:])
+    assert recent.page(0, 60) == newest_first(days)[:60]
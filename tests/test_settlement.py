@@ -0,0 +1,53 @@
+"""Every settlement path produces the same plan from the same data."""
+import pandas as pd
+import pytest
+
+from expense_core import (
+    EXPENSE_COLUMNS,
+    MEMBERS,
+    PAYMENT_COLUMNS,
+    CompactLedger,
+    Ledger,
+    StreamingTotals,
+    calculate_settlement,
+    report_chunks,
+)
+
+GROUP = MEMBERS[:3]
+
+
+def one_cent_ledger():
+    """Balances of +1, 0 and -1 cent, which the dashboard treats as settled."""
+    expenses = pd.DataFrame([
+        ["2024-01-15", "Taxi", GROUP[0], 1.0, 33.35, 33.35, "", ""],
+        ["2024-01-15", "Snacks", GROUP[1], 1.0, 33.33, 33.33, "", ""],
+        ["2024-01-15", "Tickets", GROUP[2], 1.0, 33.32, 33.32, "", ""],
+        ["2024-01-16", "Dinner", GROUP[0], 1.0, 90.00, 90.00, "", f"{GROUP[0]}; {GROUP[1]}: 2"],
+    ], columns=EXPENSE_COLUMNS)
+    payments = pd.DataFrame([
+        ["2024-01-17", GROUP[1], GROUP[0], 60.0, ""],
+    ], columns=PAYMENT_COLUMNS)
+    return expenses, payments
+
+
+@pytest.mark.parametrize("mode", ["greedy", "exact"])
+def test_every_path_settles_alike(mode):
+    expenses, payments = one_cent_ledger()
+    ledger = Ledger(GROUP)
+    ledger.rebuild(expenses, payments, None)
+    dashboard = calculate_settlement(ledger.balances()[0], mode)
+
+    streaming = StreamingTotals(GROUP)
+    streaming.add_expenses(expenses)
+    streaming.add_payments(payments)
+    report = pd.concat(list(report_chunks("Settlement", expenses, payments, GROUP, mode=mode)))
+
+    assert dashboard == []
+    assert CompactLedger.from_frames(expenses, payments, GROUP).settlement(mode) == dashboard
+    assert streaming.settlement(mode) == dashboard
+    assert report.empty
+
+
+def test_sub_cent_balances_are_dropped():
+    balances = {m: {"balance": b} for m, b in zip(GROUP, [25.004, -0.01, -24.994])}
+    assert calculate_settlement(balances) == [{"from": GROUP[2], "to": GROUP[0], "amount": 24.99}]
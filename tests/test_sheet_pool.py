@@ -0,0 +1,93 @@
+"""Pooled Sheets client: one connection shared by sessions, reconnected on auth errors."""
+import threading
+
+import pytest
+
+import group_expenses_app as app
+from fake_sheets import FakeAPIError, FakeSheetsServer
+
+TABS = {
+    "Expenses": [app.EXPENSE_COLUMNS, ["2024-01-15", "Bus", app.MEMBERS[0], 1, 550, 550, ""]],
+    "Payments": [app.PAYMENT_COLUMNS],
+}
+
+
+def make_pool(server, probe_interval=3600.0):
+    spreadsheet = server.create("sheet", TABS)
+    scheduler = app.SheetRequestScheduler(sleep=lambda seconds: None)
+    pool = app.SheetClientPool("sheet", {}, connect=lambda: (None, spreadsheet), scheduler=scheduler,
+                               probe_interval=probe_interval)
+    return pool, spreadsheet
+
+
+def test_client_is_reused_across_sessions():
+    server = FakeSheetsServer()
+    pool, _ = make_pool(server)
+    handles = []
+
+    def session():
+        handles.append(pool.spreadsheet())
+
+    threads = [threading.Thread(target=session) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.connects == 1
+    assert all(handle is handles[0] for handle in handles)
+
+
+def test_worksheet_handles_are_resolved_once():
+    server = FakeSheetsServer()
+    pool, _ = make_pool(server)
+    registry = app.WorksheetHandles()
+
+    for _ in range(5):
+        sheet = pool.spreadsheet()
+        expenses = registry.get(sheet, "Expenses")
+        assert registry.get(sheet, "Payments") is not None
+        assert registry.get(sheet, "Expenses") is expenses
+
+    assert server.stats()["reads"] == 1  # a single worksheets() call
+
+
+def test_auth_error_on_a_call_reconnects():
+    server = FakeSheetsServer()
+    pool, _ = make_pool(server)
+    registry = app.WorksheetHandles()
+    sheet = pool.spreadsheet()
+    worksheet = registry.get(sheet, "Expenses")
+
+    server.fail_next(1, 401)
+    with pytest.raises(FakeAPIError):
+        worksheet.get_all_values()
+
+    reconnected = pool.spreadsheet()
+    assert pool.connects == 2
+    assert reconnected is not sheet
+    # The registry resolves fresh handles for the new connection
+    assert registry.get(reconnected, "Expenses").get_all_values()[1][2] == app.MEMBERS[0]
+
+
+def test_failed_health_probe_reconnects():
+    server = FakeSheetsServer()
+    pool, _ = make_pool(server, probe_interval=0.0)
+    pool.spreadsheet()
+
+    server.fail_next(1, 401)
+    pool.spreadsheet()
+
+    assert pool.connects == 2
+
+
+def test_server_errors_are_retried_without_reconnecting():
+    server = FakeSheetsServer()
+    pool, _ = make_pool(server)
+    worksheet = app.WorksheetHandles().get(pool.spreadsheet(), "Expenses")
+
+    server.fail_next(2, 503)
+    assert len(worksheet.get_all_values()) == 2
+
+    pool.spreadsheet()
+    assert pool.connects == 1
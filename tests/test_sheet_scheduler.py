@@ -0,0 +1,176 @@
+"""Sheets request scheduler: per-kind quotas, shared in-flight reads and retry backoff."""
+import threading
+import time
+
+import pytest
+
+import group_expenses_app as app
+from fake_sheets import FakeAPIError
+
+
+class FakeClock:
+    """Clock whose sleep() only moves time forward and records the wait."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(clock, **kwargs):
+    return app.SheetRequestScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def failing(*statuses, result="ok"):
+    """A call that fails with each of `statuses` in turn, then returns `result`."""
+    statuses = list(statuses)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if statuses:
+            raise FakeAPIError(statuses.pop(0), "failed")
+        return result
+    call.calls = calls
+    return call
+
+
+def test_calls_over_the_quota_wait_for_the_window():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, read_quota=3, window=10.0)
+
+    for _ in range(3):
+        scheduler.call("read", lambda: None)
+    assert clock.sleeps == []
+    assert scheduler.used("read") == 3
+
+    scheduler.call("read", lambda: None)
+    assert clock.sleeps == [10.0]
+    assert scheduler.used("read") == 1
+    assert scheduler.stats()["throttled"] == 1
+
+
+def test_reads_and_writes_have_separate_budgets():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, read_quota=1, write_quota=1, window=10.0)
+    scheduler.call("read", lambda: None)
+    scheduler.call("write", lambda: None)
+    assert clock.sleeps == []
+
+
+def test_quota_wait_longer_than_max_wait_raises():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, write_quota=2, window=60.0, max_wait=5.0)
+    scheduler.call("write", lambda: None)
+    scheduler.call("write", lambda: None)
+
+    with pytest.raises(app.SheetQuotaExceeded):
+        scheduler.call("write", lambda: None)
+    assert scheduler.stats()["writes"] == 2
+    assert clock.sleeps == []
+
+
+def test_overlapping_reads_with_the_same_key_share_one_request():
+    scheduler = app.SheetRequestScheduler()
+    release = threading.Event()
+    calls = []
+
+    def read():
+        calls.append(1)
+        release.wait(5)
+        return ["header"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.call("read", read, key=("sheet", "1:1"))))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [["header"]] * 8
+    assert scheduler.stats()["reads"] == 1
+    assert scheduler.stats()["coalesced"] == 7
+
+
+def test_reads_with_other_keys_and_writes_are_not_shared():
+    scheduler = app.SheetRequestScheduler()
+    scheduler.call("read", lambda: 1, key="a")
+    scheduler.call("read", lambda: 2, key="b")
+    scheduler.call("write", lambda: 3, key="a")
+    assert scheduler.stats() == {"reads": 2, "writes": 1, "coalesced": 0, "retries": 0, "throttled": 0,
+                                 "failures": 0}
+
+
+def test_transient_errors_are_retried_with_growing_backoff():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, backoff_base=1.0, backoff_max=60.0)
+    call = failing(503, 500)
+
+    assert scheduler.call("read", call) == "ok"
+
+    assert len(call.calls) == 3
+    assert scheduler.stats()["retries"] == 2
+    first, second = clock.sleeps
+    assert 0.5 <= first <= 1.5 and 1.0 <= second <= 3.0  # base * 2**attempt, jittered by +-50%
+
+
+def test_backoff_is_capped():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, backoff_base=1.0, backoff_max=2.0, max_retries=5)
+    scheduler.call("write", failing(503, 503, 503, 503))
+    assert max(clock.sleeps) <= 3.0
+
+
+def test_retries_give_up_after_max_retries():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=2)
+    call = failing(503, 503, 503, 503)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call("read", call)
+    assert len(call.calls) == 3
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_non_retryable_errors_are_raised_at_once():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    call = failing(400)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call("read", call)
+    assert len(call.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_429_holds_back_other_calls_of_that_kind():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, backoff_base=1.0)
+    other = []
+    backoff_sleep = clock.sleep
+
+    def sleep(seconds):
+        if not other:
+            # Other sessions call while the first one is backing off
+            other.append(scheduler.call("write", lambda: "write"))
+            other.append(scheduler.call("read", lambda: "read"))
+        backoff_sleep(seconds)
+    scheduler.sleep = sleep
+
+    assert scheduler.call("read", failing(429)) == "ok"
+
+    held_back, backoff = clock.sleeps  # the held-back read slept first, inside the backoff
+    assert other == ["write", "read"]
+    assert held_back == pytest.approx(backoff)  # the read waited out the pause; the write did not
@@ -0,0 +1,72 @@
+"""Snapshots: write/read round trips, and the backend's appends and cached copies."""
+import io
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import group_expenses_app as app  # noqa: E402
+from expense_core import read_snapshot, write_snapshot  # noqa: E402
+
+MEMBERS = app.MEMBERS[:3]
+EXPENSES = pd.DataFrame([
+    ["2024-01-15", "Bus", MEMBERS[1], 1.0, 550.0, 550.0, "", ""],
+    ["2024-01-16", "Lunch", "Guest", 2.0, 45.5, 91.0, "late", f"{MEMBERS[0]}: 2; {MEMBERS[1]}: 1"],
+    ["", "Tea", MEMBERS[0], 1.0, 0.1, 0.1, "", ""],
+], columns=app.EXPENSE_COLUMNS)
+PAYMENTS = pd.DataFrame([["2024-01-17", MEMBERS[2], MEMBERS[0], 100.25, "cash"]], columns=app.PAYMENT_COLUMNS)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+@pytest.mark.parametrize("to_file", [False, True])
+def test_snapshot_round_trip(tmp_path, fmt, to_file):
+    if to_file:
+        target = source = str(tmp_path / f"ledger.{fmt}")
+        write_snapshot(target, EXPENSES, PAYMENTS, MEMBERS, fmt=fmt)
+    else:
+        buffer = io.BytesIO()
+        write_snapshot(buffer, EXPENSES, PAYMENTS, MEMBERS, fmt=fmt)
+        source = buffer.getvalue()
+
+    snapshot = read_snapshot(source)
+    expenses, payments = snapshot.frames()
+
+    assert snapshot.members == MEMBERS
+    # Text comes back as categoricals; the values are what was written
+    pd.testing.assert_frame_equal(expenses.astype(object), EXPENSES.astype(object))
+    pd.testing.assert_frame_equal(payments.astype(object), PAYMENTS.astype(object))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = app.SnapshotCache()
+    monkeypatch.setattr(app, "get_snapshot_cache", lambda: cache)
+    return cache
+
+
+def test_appends_keep_one_cached_copy_per_file(tmp_path, cache):
+    path = str(tmp_path / "ledger.arrow")
+    expenses, payments = app.generate_demo_data()
+    app.save_snapshot(path, expenses, payments, app.MEMBERS)
+    backend = app.SnapshotBackend(path)
+
+    for i in range(5):
+        backend.append_rows("Expenses", [app.expense_row("2024-02-01", f"Item {i}", app.MEMBERS[0], 1, 10, 10, "")])
+        loaded_expenses, _ = backend.load()
+        assert len(loaded_expenses) == len(expenses) + i + 1
+
+    assert len(cache) == 1
+    assert cache.loads == 6  # the first read plus one per append
+
+
+def test_unchanged_file_is_not_reread(tmp_path, cache):
+    path = str(tmp_path / "ledger.arrow")
+    app.save_snapshot(path, *app.generate_demo_data(), app.MEMBERS)
+    backend = app.SnapshotBackend(path)
+
+    backend.load()
+    backend.load()
+    app.SnapshotBackend(path).load()
+
+    assert cache.loads == 1
@@ -0,0 +1,49 @@
+"""Splits on a Google Sheet whose Expenses tab may predate the Split column."""
+import pandas as pd
+import pytest
+import streamlit as st
+
+import group_expenses_app as app
+from fake_sheets import FakeSheetsServer
+
+LEGACY_COLUMNS = app.EXPENSE_COLUMNS[:app.EXPENSE_COLUMNS.index(app.SPLIT_COLUMN)]
+
+
+class FakeWriteQueue:
+    def __init__(self):
+        self.rows = []
+
+    def enqueue_rows(self, title, rows):
+        self.rows.extend(rows)
+
+
+@pytest.fixture
+def sheet_backend(monkeypatch):
+    # Outside a Streamlit runtime cache_resource does not keep the cache between calls
+    cache = app.WorksheetCache()
+    monkeypatch.setattr(app, "get_sheet_cache", lambda sheet_id: cache)
+
+    def make(header):
+        sheet = FakeSheetsServer().create("sheet", {"Expenses": [header], "Payments": [app.PAYMENT_COLUMNS]})
+        worksheet = sheet.worksheet("Expenses")
+        cache.get("Expenses", lambda previous: app._load_typed_worksheet(worksheet, previous))
+        return app.SheetBackend(sheet, FakeWriteQueue())
+    return make
+
+
+@pytest.mark.parametrize("header, supported", [(app.EXPENSE_COLUMNS, True), (LEGACY_COLUMNS, False)])
+def test_split_support_follows_the_header(sheet_backend, header, supported):
+    assert sheet_backend(header).supports_splits() is supported
+
+
+def test_split_import_into_legacy_sheet_is_rejected(sheet_backend):
+    backend = sheet_backend(LEGACY_COLUMNS)
+    ledger = app.Ledger()
+    accepted = pd.DataFrame([["2024-01-15", "Bus", app.MEMBERS[0], 1.0, 90.0, 90.0, "",
+                              f"{app.MEMBERS[0]}; {app.MEMBERS[1]}"]], columns=app.EXPENSE_COLUMNS)
+    st.session_state.expense_import = (None, accepted, None)
+
+    app.import_expenses("sheet", backend, ledger)
+
+    assert st.session_state.import_result[0] == "error"
+    assert backend.write_queue.rows == []
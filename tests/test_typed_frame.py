@@ -0,0 +1,98 @@
+"""Compact ledger dtypes: column coercion, bad cells and agreement with the raw frames."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from expense_core import (
+    EXPENSE_COLUMNS,
+    MEMBERS,
+    PAYMENT_COLUMNS,
+    append_typed,
+    calculate_balances,
+    typed_frame,
+)
+
+
+def expenses(*rows):
+    return pd.DataFrame([list(row) for row in rows], columns=EXPENSE_COLUMNS)
+
+
+def test_columns_get_compact_dtypes():
+    typed = typed_frame(expenses(
+        ["2024-01-15", "Bus", MEMBERS[1], 1, 550, "550", "", ""],
+        ["2024-01-16", "Bus", MEMBERS[0], "2", 45.5, 91, "late", f"{MEMBERS[0]}; {MEMBERS[1]}"],
+    ))
+
+    assert typed["Date"].dtype == "datetime64[ns]"
+    for column in ["Quantity", "Unit Price", "Amount"]:
+        assert typed[column].dtype == np.float64
+    assert typed["Amount"].tolist() == [550.0, 91.0]
+    assert list(typed["Buyer"].cat.categories) == MEMBERS  # the roster, in order
+    assert isinstance(typed["Item"].dtype, pd.CategoricalDtype)  # repeats, so worth a categorical
+    assert isinstance(typed["Split"].dtype, pd.CategoricalDtype)
+    assert typed["Notes"].dtype == object
+
+
+def test_payment_names_are_roster_categoricals():
+    payments = pd.DataFrame([["2024-01-17", MEMBERS[2], MEMBERS[0], "100", ""]], columns=PAYMENT_COLUMNS)
+    typed = typed_frame(payments)
+    assert list(typed["From"].cat.categories) == MEMBERS
+    assert list(typed["To"].cat.categories) == MEMBERS
+    assert typed["Amount"].tolist() == [100.0]
+
+
+def test_distinct_items_stay_strings():
+    typed = typed_frame(expenses(
+        ["2024-01-15", "Bus", MEMBERS[0], 1, 5, 5, "", ""],
+        ["2024-01-16", "Tea", MEMBERS[0], 1, 5, 5, "", ""],
+    ))
+    assert typed["Item"].dtype == object
+
+
+def test_bad_cells_become_missing_values_without_dropping_rows():
+    typed = typed_frame(expenses(
+        ["15/01/2024", "Bus", "Stranger", "two", "x", "1,000", None, "A; B"],
+        ["not a date", "Tea", 12345, "", 3.5, "", "n", ""],
+        ["", "Bus", MEMBERS[0], 2, "5", "10", "", ""],
+    ))
+
+    assert len(typed) == 3
+    assert typed["Date"].tolist()[0] == pd.Timestamp("2024-01-15")  # other date formats still parse
+    assert typed["Date"].iloc[1:].isna().all()
+    assert typed["Quantity"].isna().tolist() == [True, True, False]
+    assert typed["Amount"].isna().tolist() == [True, True, False]
+    assert typed["Unit Price"].tolist()[1:] == [3.5, 5.0]
+    # Names outside the roster are kept after it, numericised ones as text
+    assert list(typed["Buyer"].cat.categories) == MEMBERS + ["12345", "Stranger"]
+    assert typed["Buyer"].astype(str).tolist()[:2] == ["Stranger", "12345"]
+
+
+def test_bad_amount_is_still_rejected_by_the_balances():
+    raw = expenses(["2024-01-15", "Bus", MEMBERS[0], 1, 5, "abc", "", ""])
+    payments = pd.DataFrame(columns=PAYMENT_COLUMNS)
+    with pytest.raises(ValueError, match="invalid Amount"):
+        calculate_balances(typed_frame(raw), payments)
+
+
+def test_typed_frames_give_the_same_balances():
+    raw = expenses(
+        ["2024-01-15", "Bus", MEMBERS[1], 1, 550, 550, "", ""],
+        ["2024-01-16", "Lunch", MEMBERS[0], 2, 45, 90, "", f"{MEMBERS[0]}; {MEMBERS[1]}"],
+    )
+    payments = pd.DataFrame([["2024-01-17", MEMBERS[2], MEMBERS[0], 100, ""]], columns=PAYMENT_COLUMNS)
+    assert calculate_balances(typed_frame(raw), typed_frame(payments)) == calculate_balances(raw, payments)
+
+
+def test_typing_is_idempotent_and_handles_empty_frames():
+    typed = typed_frame(expenses(["2024-01-15", "Bus", MEMBERS[1], 1, 550, 550, "", ""]))
+    pd.testing.assert_frame_equal(typed_frame(typed), typed)
+    empty = typed_frame(pd.DataFrame(columns=EXPENSE_COLUMNS))
+    assert empty.empty and empty["Amount"].dtype == np.float64
+
+
+def test_appended_rows_keep_the_roster_first():
+    typed = typed_frame(expenses(["2024-01-15", "Bus", MEMBERS[1], 1, 550, 550, "", ""]))
+    added = typed_frame(expenses(["2024-01-16", "Tea", "Stranger", 1, 5, 5, "", ""]))
+    combined = append_typed(typed, added)
+    assert list(combined["Buyer"].cat.categories) == MEMBERS + ["Stranger"]
+    assert combined["Buyer"].astype(str).tolist() == [MEMBERS[1], "Stranger"]
@@ -0,0 +1,139 @@
+"""Worksheet cache: delta syncs, edit detection, fingerprints and stale serving against the fake sheet."""
+import pandas as pd
+import pytest
+
+import expense_core
+import group_expenses_app as app
+from fake_sheets import FakeSheetsServer
+
+
+def expense(i, buyer=0, amount=None):
+    amount = 10.0 * (i + 1) if amount is None else amount
+    return [f"2024-01-{i % 28 + 1:02d}", f"Item {i % 3}", app.MEMBERS[buyer], 1, amount, amount, "", ""]
+
+
+def setup(n_rows, ttl=0.0):
+    server = FakeSheetsServer()
+    sheet = server.create("sheet", {"Expenses": [app.EXPENSE_COLUMNS] + [expense(i) for i in range(n_rows)]})
+    worksheet = sheet.worksheet("Expenses")
+    cache = app.WorksheetCache(ttl=ttl, stale_retry=0.0)
+
+    def read():
+        return cache.get("Expenses", lambda previous: app._load_typed_worksheet(worksheet, previous))
+    return server, worksheet, cache, read
+
+
+def full_typed(worksheet):
+    return app._load_typed_worksheet(worksheet)[0]
+
+
+def test_delta_sync_appends_only_the_new_rows():
+    server, worksheet, cache, read = setup(5)
+    first = read()
+    worksheet.append_rows([expense(5, buyer=1), expense(6, buyer=2)])
+    reads = server.stats()["reads"]
+
+    df = read()
+
+    assert server.stats()["reads"] == reads + 1  # one batched request
+    assert cache.stats()["delta_syncs"] == 1
+    # Same values as a full load; Item may stay uncategorised, as it was when first cached
+    pd.testing.assert_frame_equal(df.astype(object), full_typed(worksheet).astype(object))
+    assert isinstance(df["Buyer"].dtype, pd.CategoricalDtype)
+    assert list(df["Buyer"].cat.categories[:len(app.MEMBERS)]) == app.MEMBERS
+    assert df.iloc[:5].equals(first)
+
+
+def test_unchanged_sync_returns_the_cached_frame():
+    _, _, cache, read = setup(5)
+    first = read()
+    assert read() is first
+    assert cache.stats()["delta_syncs"] == 1
+
+
+def test_fingerprint_is_recorded_with_each_load():
+    _, worksheet, cache, read = setup(5)
+    read()
+    worksheet.append_rows([expense(5, buyer=1)])
+    df = read()
+    assert cache.fingerprint("Expenses", df) == expense_core.frame_fingerprint(df, app.FINGERPRINT_EXPENSE_COLUMNS)
+    assert cache.fingerprint("Expenses", df.copy()) is None
+
+
+class PendingRows:
+    def __init__(self):
+        self.rows = {"Expenses": [], "Payments": []}
+
+    def pending_frame(self, title, columns):
+        return pd.DataFrame(self.rows[title], columns=columns)
+
+
+def test_rerun_on_unchanged_data_hashes_nothing(monkeypatch):
+    cache = app.WorksheetCache()
+    monkeypatch.setattr(app, "get_sheet_cache", lambda sheet_id: cache)
+    sheet = FakeSheetsServer().create("sheet", {
+        "Expenses": [app.EXPENSE_COLUMNS] + [expense(i) for i in range(5)], "Payments": [app.PAYMENT_COLUMNS],
+    })
+    queue = PendingRows()
+    backend = app.SheetBackend(sheet, queue)
+    backend.load()
+    hashed = []
+    rows_digest = expense_core._rows_digest
+    monkeypatch.setattr(expense_core, "_rows_digest", lambda df, *args: hashed.append(len(df)) or rows_digest(df, *args))
+
+    frames = backend.load()
+    version = backend.data_version("sheet", *frames)
+    assert hashed == []
+
+    queue.rows["Expenses"].append(expense(5, buyer=2))
+    frames = backend.load()
+    assert backend.data_version("sheet", *frames) != version
+    assert hashed == [1]  # only the pending row
+    assert backend.data_version("sheet", *frames) == app.data_version("sheet", *frames)
+
+
+def test_edit_to_a_middle_row_is_caught_on_the_next_sync():
+    _, worksheet, cache, read = setup(5)
+    read()
+    worksheet.rows[3][5] = "999"
+
+    df = read()
+
+    assert cache.stats()["full_reloads"] == 2
+    assert df["Amount"].iloc[2] == 999.0
+
+
+def test_large_sheets_are_verified_a_window_at_a_time(monkeypatch):
+    monkeypatch.setattr(app, "VERIFY_ROWS_PER_SYNC", 2)
+    _, worksheet, cache, read = setup(7)
+    read()
+    worksheet.rows[6][5] = "999"  # data row 5: in the third window
+
+    syncs = 0
+    while cache.stats()["full_reloads"] == 1:
+        read()
+        syncs += 1
+    assert syncs == 3
+    assert read()["Amount"].iloc[5] == 999.0
+
+
+def test_failed_reload_serves_the_stale_frame():
+    server, worksheet, cache, read = setup(3)
+    first = read()
+    server.fail_next(1)
+
+    assert read() is first
+    loaded_at, error = cache.staleness("Expenses")
+    assert "503" in error
+    assert cache.stats()["stale_serves"] == 1
+
+    worksheet.append_rows([expense(3)])
+    assert len(read()) == 4
+    assert cache.staleness("Expenses") is None
+
+
+def test_failed_first_load_raises_instead_of_returning_empty():
+    server, _, _, read = setup(3)
+    server.fail_next(1)
+    with pytest.raises(app.SheetUnavailableError):
+        read()
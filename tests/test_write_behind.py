@@ -0,0 +1,91 @@
+"""Write-behind queue: batched flushes, retries and pending rows against the fake sheet."""
+import time
+
+import group_expenses_app as app
+from fake_sheets import FakeSheetsServer
+
+
+def payment(i):
+    return ["2024-01-15", app.MEMBERS[i % 2], app.MEMBERS[2], 10 + i, ""]
+
+
+def setup(**kwargs):
+    server = FakeSheetsServer()
+    sheet = server.create("sheet", {"Payments": [app.PAYMENT_COLUMNS]})
+    handles = app.WorksheetHandles()
+    handles.get(sheet, "Payments")  # resolve the handle up front so injected failures hit the writes
+    cache = app.WorksheetCache()
+    queue = app.WriteBehindQueue(lambda: sheet, cache, handles, **kwargs)
+    return server, sheet.worksheet("Payments"), cache, queue
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the write-behind queue"
+        time.sleep(0.01)
+
+
+def written(worksheet):
+    return [int(row[3]) - 10 for row in worksheet.rows[1:]]
+
+
+def test_rows_are_flushed_in_submission_order_in_one_batch():
+    server, worksheet, cache, queue = setup(batch_size=100, flush_interval=0.2)
+    queue.enqueue_rows("Payments", [payment(i) for i in range(3)])
+    queue.enqueue("Payments", payment(3))
+    queue.enqueue("Payments", payment(4))
+
+    wait_for(lambda: queue.pending_count() == 0)
+
+    assert written(worksheet) == [0, 1, 2, 3, 4]
+    assert server.stats()["writes"] == 1
+    assert queue.flushes == 1
+    assert cache.version("Payments") == 1  # invalidated so the next read sees the rows
+
+
+def test_pending_rows_stay_visible_until_written():
+    _, worksheet, _, queue = setup(batch_size=3, flush_interval=60)
+    queue.enqueue_rows("Payments", [payment(0), payment(1)])
+    time.sleep(0.05)
+
+    pending = queue.pending_frame("Payments", app.PAYMENT_COLUMNS)
+    assert list(pending.columns) == app.PAYMENT_COLUMNS
+    assert pending["Amount"].tolist() == [10, 11]
+    assert written(worksheet) == []
+    assert queue.pending_frame("Expenses", app.EXPENSE_COLUMNS).empty
+
+    queue.enqueue("Payments", payment(2))  # reaches the batch size
+    wait_for(lambda: queue.pending_count() == 0)
+    assert written(worksheet) == [0, 1, 2]
+    assert queue.pending_frame("Payments", app.PAYMENT_COLUMNS).empty
+
+
+def test_transient_errors_are_retried_without_duplicating_rows(monkeypatch):
+    monkeypatch.setattr(app, "WRITE_BACKOFF_BASE", 0.01)
+    server, worksheet, _, queue = setup(batch_size=1, flush_interval=0.05)
+    server.fail_next(2, 429)
+    queue.enqueue_rows("Payments", [payment(0), payment(1)])
+
+    wait_for(lambda: queue.pending_count() == 0)
+
+    assert queue.retries == 2
+    assert written(worksheet) == [0, 1]
+    assert queue.failed_count() == 0
+
+
+def test_rows_that_keep_failing_are_kept_for_a_manual_retry(monkeypatch):
+    monkeypatch.setattr(app, "WRITE_BACKOFF_BASE", 0.01)
+    server, worksheet, _, queue = setup(batch_size=1, flush_interval=0.05, max_retries=1)
+    server.fail_next(2, 503)
+    queue.enqueue("Payments", payment(0))
+
+    wait_for(lambda: queue.failed_count() == 1)
+    assert queue.pending_count() == 0
+    assert written(worksheet) == []
+
+    queue.enqueue("Payments", payment(1))
+    wait_for(lambda: queue.pending_count() == 0)
+    queue.retry_failed()
+    wait_for(lambda: queue.pending_count() == 0 and queue.failed_count() == 0)
+    assert written(worksheet) == [1, 0]